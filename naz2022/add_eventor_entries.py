@@ -2,148 +2,268 @@
 
 import csv
 from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional
 import xml.etree.ElementTree as ET
 
 import typer
 
+from ingest import Source, load_sources, read_oe_entries
+from oe_entries import EntryTable
+from fuzzy_match import NameMatcher
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
 
-CSV_INPUT_ENCODING = 'ISO-8859-1'
-CSV_OUTPUT_ENCODING = 'ISO-8859-1'
 
 XML_INPUT_ENCODING = 'UTF8'
 XML_OUTPUT_ENCODING = 'UTF8'
 
-IOFID_FIELD = "Num3"
-SOLVNR_FIELD = "Datenbank Id"
-SICARD_FIELD = "Chipnr"
+# Column IDs of oe_columns, the OE export can be in any language
+IOFID_FIELD = "IOFID"
+SOLVNR_FIELD = "SOLVNR"
+SICARD_FIELD = "SICARD"
 INDEX_COLS = (SICARD_FIELD, SOLVNR_FIELD, IOFID_FIELD)
+NAME_FIELDS = ("FAMILY_NAME", "GIVEN_NAME", "BIRTH")
+NAT_FIELD = "NAT"
+SEX_FIELD = "SEX"
+
+# Similar names are only reported by default, an entry is skipped from FUZZY_THRESHOLD on
+FUZZY_THRESHOLD = 0.0
+FUZZY_REPORT_THRESHOLD = 0.9
+FUZZY_REPORT_COLUMNS = ("IOF ID", "Eventor Name", "Jg", "Matched Name", "Matched Jg", "Score", "Skipped")
+
+GENDER_BY_CLASS = {"Men": "M", "Women": "F"}
 
 
 ns = {'iof': 'http://www.orienteering.org/datastandard/3.0'}
 ET.register_namespace('', ns['iof'])
 
 
-def _make_name_key(row):
-    return (row["Nachname"], row["Vorname"], row["Jg"])
+class PersonEntry(NamedTuple):
+    iof_id: str
+    family_name: str
+    given_name: str
+    birth_year: str
+    control_card: str
+    class_name: str
+    organisation: str
+    country: str
+    fee: str
+    country_code: str = ""
 
-def _field_or_default(item, xml_path, default=""):
-    field = item.find(xml_path, ns)
-    if field is None:
-        return default
-    return field.text
 
-def main(
-    eventor_input_filename: Path=typer.Option(..., "--eventor-entries", help="File XML con iscrizioni Eventor"),
-    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
-    output_filename: Path=typer.Option(..., "--output", help="File CSV di output")
-    ):
-    
-    typer.echo(f"Reading entries from CSV file {oe_input_filename}")
-    with open(oe_input_filename, encoding=CSV_INPUT_ENCODING) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
-        
-        data = []
-        header_keys = None
-        data_by_index = {ix: {} for ix in INDEX_COLS}
-        data_by_name = {}
-        for i, row in enumerate(reader):
-            if not header_keys: header_keys = list(row.keys())
-            data.append(row)
-            
-            for ix in INDEX_COLS:
-                if row[ix] != "0" and row[ix] != "":
-                    data_by_index[ix][row[ix]] = i
-            name_key = _make_name_key(row)
-            if name_key in data_by_name:
-                print("Duplicate", name_key)
-                raise RuntimeError("Name key is not unique enough")
-            data_by_name[name_key] = i
+def _local_name(tag: str) -> str:
+    return tag.rpartition('}')[2]
 
+def _first_text(elem, *path: str) -> str:
+    """Text of the first descendant along `path` (local names), or empty."""
+    for name in path:
+        for child in elem:
+            if _local_name(child.tag) == name:
+                elem = child
+                break
+        else:
+            return ""
+    return elem.text or ""
 
+def _country_code(organisation) -> str:
+    for child in organisation:
+        if _local_name(child.tag) == "Country":
+            return child.get("code", "")
+    return ""
+
+def _person_entry(item) -> PersonEntry:
+    person = organisation = None
+    control_card = class_name = fee = ""
+    for child in item:
+        tag = _local_name(child.tag)
+        if tag == "Person":
+            person = child
+        elif tag == "Organisation":
+            organisation = child
+        elif tag == "ControlCard" and not control_card:
+            control_card = child.text or ""
+        elif tag == "Class" and not class_name:
+            class_name = _first_text(child, "Name")
+        elif tag == "AssignedFee" and not fee:
+            fee = _first_text(child, "Fee", "Amount")
+
+    return PersonEntry(
+        iof_id=_first_text(person, "Id") if person is not None else "",
+        family_name=_first_text(person, "Name", "Family") if person is not None else "",
+        given_name=_first_text(person, "Name", "Given") if person is not None else "",
+        birth_year=_first_text(person, "BirthDate").split('-')[0] if person is not None else "",
+        control_card=control_card,
+        class_name=class_name,
+        organisation=_first_text(organisation, "Name") if organisation is not None else "",
+        country=_first_text(organisation, "Country") if organisation is not None else "",
+        fee=fee,
+        country_code=_country_code(organisation) if organisation is not None else "",
+    )
+
+def iter_person_entries(eventor_input_filename: Path) -> Iterator[PersonEntry]:
+    """
+    Stream the PersonEntry elements of an IOF XML 3.0 EntryList.
+    Elements are cleared once read, so memory does not grow with the file.
+    """
+    with open(eventor_input_filename, 'rb') as xmlfile:
+        context = ET.iterparse(xmlfile, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "end" and _local_name(elem.tag) == "PersonEntry":
+                yield _person_entry(elem)
+                elem.clear()
+                root.clear()
+
+def read_person_entries(eventor_input_filename: Path) -> List[PersonEntry]:
     typer.echo(f"Reading entries from XML Eventor file {eventor_input_filename}")
-    with open(eventor_input_filename, encoding=XML_INPUT_ENCODING) as xmlfile:
-        root = ET.fromstring(xmlfile.read())
-    
+    return list(iter_person_entries(eventor_input_filename))
+
+def add_eventor_entries(data: EntryTable, eventor_input_filename: Path, *, entries: Optional[Iterable[PersonEntry]] = None, fuzzy_threshold: float = FUZZY_THRESHOLD, fuzzy_report_threshold: float = FUZZY_REPORT_THRESHOLD, fuzzy_report: Optional[List[tuple]] = None):
+    """
+    Append to `data` the Eventor entries not yet registered, read from the
+    file or given as `entries` (see read_person_entries).
+    Besides the exact IOF ID, SI-Card and name matches, the names are
+    compared fuzzily with the existing entries of the same gender: the
+    matches with a score of at least `fuzzy_report_threshold` are appended
+    to `fuzzy_report`, and the entries matching with a score of at least
+    `fuzzy_threshold` are skipped (0, the default, never skips). Returns the
+    number of Eventor entries, of added ones and of the ones skipped by
+    similar name.
+    """
+    thresholds = [t for t in (fuzzy_threshold, fuzzy_report_threshold if fuzzy_report is not None else 0) if t > 0]
+    matcher = None
+    if thresholds:
+        matcher = NameMatcher(data, *NAME_FIELDS, nat_field=NAT_FIELD, sex_field=SEX_FIELD)
+
+    if entries is None:
+        typer.echo(f"Reading entries from XML Eventor file {eventor_input_filename}")
+        entries = iter_person_entries(eventor_input_filename)
     total_eventor = 0
     total_added = 0
-    for item in root.findall('.//iof:PersonEntry', ns):
+    total_similar = 0
+    for entry in entries:
         total_eventor += 1
 
-        idField = item.find('iof:Person/iof:Id', ns)
-        familyNameField = item.find('iof:Person/iof:Name/iof:Family', ns)
-        givenNameField = item.find('iof:Person/iof:Name/iof:Given', ns)
-        birthdayField = item.find('iof:Person/iof:BirthDate', ns)
-        
-        ixIofId = idField.text
-        ixSicard = _field_or_default(item, "iof:ControlCard")
-        birthYear = birthdayField.text.split('-')[0]
-        ixNameKey = (familyNameField.text, givenNameField.text, birthYear)
-
-        if ixIofId in data_by_index[IOFID_FIELD]:
+        ixIofId = entry.iof_id
+        ixSicard = entry.control_card
+        birthYear = entry.birth_year
+        ixNameKey = (entry.family_name, entry.given_name, birthYear)
+
+        if data.find(IOFID_FIELD, ixIofId) is not None:
             typer.secho(f"Runner IOF {ixIofId} already found by IOF ID. Skipping.", fg=typer.colors.BLUE)
             continue
 
-        if ixSicard in data_by_index[SICARD_FIELD]:
+        if data.find(SICARD_FIELD, ixSicard) is not None:
             typer.secho(f"Runner IOF {ixIofId} already found by SI-Card. Skipping.", fg=typer.colors.BLUE)
             continue
 
-        if ixNameKey in data_by_name:
+        if data.find_name(ixNameKey) is not None:
             typer.secho(f"Runner IOF {ixIofId} already found by Name. Skipping.", fg=typer.colors.BLUE)
             continue
-        
+
+        if matcher:
+            gender = GENDER_BY_CLASS.get(entry.class_name, "")
+            match = matcher.best_match(entry.family_name, entry.given_name, birthYear, entry.country_code, min(thresholds), gender)
+            if match:
+                ix, score = match
+                skip = 0 < fuzzy_threshold <= score
+                matchedName = f"{data.get(ix, NAME_FIELDS[0])} {data.get(ix, NAME_FIELDS[1])}"
+                if fuzzy_report is not None and (skip or 0 < fuzzy_report_threshold <= score):
+                    fuzzy_report.append((ixIofId, f"{entry.family_name} {entry.given_name}", birthYear, matchedName, data.get(ix, NAME_FIELDS[2]), f"{score:.3f}", "1" if skip else "0"))
+                if skip:
+                    typer.secho(f"Runner IOF {ixIofId} {entry.family_name} {entry.given_name} already found by similar name {matchedName} (score {score:.2f}). Skipping.", fg=typer.colors.BLUE)
+                    total_similar += 1
+                    continue
+                typer.secho(f"Runner IOF {ixIofId} {entry.family_name} {entry.given_name} has a similar name to {matchedName} (score {score:.2f}). Adding anyway.", fg=typer.colors.YELLOW)
 
         typer.secho(f"Adding competitor IOF {ixIofId}", fg=typer.colors.YELLOW)
-        iofClassName = item.find("iof:Class/iof:Name", ns).text
+        iofClassName = entry.class_name
         if iofClassName == "Men":
             className = "HE"
-            gender = "M"
         elif iofClassName == "Women":
             className = "DE"
-            gender = "F"
         else:
             raise RuntimeError(f"Unknowen class name {iofClassName}")
+        gender = GENDER_BY_CLASS[iofClassName]
 
         row = {
-            "Chipnr": _field_or_default(item, "iof:ControlCard"),
-            "Datenbank Id": "",
-            "Nachname": _field_or_default(item, "iof:Person/iof:Name/iof:Family"),
-            "Vorname": _field_or_default(item, "iof:Person/iof:Name/iof:Given"),
-            "Jg": birthYear,
-            "Geschlecht": gender,
-            "Block": "",
-            "Club-Nr.": "",
-            "Abk": "",
-            "Ort": _field_or_default(item, "iof:Organisation/iof:Name"),
-            "Nat": _field_or_default(item, "iof:Organisation/iof:Country"),
-            # "Sitz": _field_or_default(item, "iof:Organisation/iof:Country"),
+            "SICARD": entry.control_card,
+            "SOLVNR": "",
+            "FAMILY_NAME": entry.family_name,
+            "GIVEN_NAME": entry.given_name,
+            "BIRTH": birthYear,
+            "SEX": gender,
+            "BLOCK": "",
+            "CLUB": "",
+            "CLUB_SHORT_NAME": "",
+            "CLUB_NAME": entry.organisation,
+            "NAT": entry.country,
+            # "Sitz": entry.country,
+            "CLASSNR": "",
+            "CLASS": className,
+            "CLASS_LONG": "",
+            "IOFID": ixIofId,
+            "RENTED": "0",
+            "FEE": entry.fee,
+        }
+        # Columns without ID, if the export has them
+        address = {
             "Region": "",
-            "Katnr": "",
-            "Kurz": className,
-            "Lang": "",
-            "Num3": ixIofId,
-            "Adr. Nachname": _field_or_default(item, "iof:Person/iof:Name/iof:Family"),
-            "Adr. Vorname": _field_or_default(item, "iof:Person/iof:Name/iof:Given"),
+            "Adr. Nachname": entry.family_name,
+            "Adr. Vorname": entry.given_name,
             "Straße": "",
             "PLZ": "",
             "Adr. Ort": "",
             "EMail": "",
-            "Gemietet": "0",
-            "Startgeld": _field_or_default(item, "iof:AssignedFee/iof:Fee/iof:Amount"),
             "Bezahlt": "0",
         }
-        data.append(row)
+        row.update((k, v) for k, v in address.items() if k in data)
+        ix = data.append(row)
+        if matcher:
+            matcher.add(ix)
         total_added += 1
-        
-    typer.echo(f"Writing output to {output_filename}")
-    with open(output_filename, 'w', encoding=CSV_OUTPUT_ENCODING) as csvfile:
-        writer = csv.DictWriter(csvfile, dialect='excel', delimiter=';', fieldnames=header_keys)
 
-        writer.writeheader()
-        writer.writerows(data)
+    return total_eventor, total_added, total_similar
+
+
+def main(
+    eventor_input_filename: Path=typer.Option(..., "--eventor-entries", help="File XML con iscrizioni Eventor"),
+    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
+    output_filename: Path=typer.Option(..., "--output", help="File CSV di output"),
+    fuzzy_threshold: float=typer.Option(FUZZY_THRESHOLD, help="Minimum score of a similar name to skip an entry, 0 never skips"),
+    fuzzy_report_threshold: float=typer.Option(FUZZY_REPORT_THRESHOLD, help="Minimum score of a similar name to report it"),
+    fuzzy_report_filename: Optional[Path]=typer.Option(None, "--fuzzy-report", help="CSV file with the entries with a similar name"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    with measure_run("add_eventor_entries", report_filename, profile, trace_memory) as report:
+        inputs = load_sources([
+            Source("oe_entries", read_oe_entries, (oe_input_filename, INDEX_COLS, NAME_FIELDS, True)),
+            Source("eventor_entries", read_person_entries, (eventor_input_filename,), process=True),
+        ], report)
+        data = inputs["oe_entries"]
+
+        fuzzy_report: List[tuple] = []
+        with report.stage("add_eventor_entries", rows_in=len(data)) as st:
+            total_eventor, total_added, total_similar = add_eventor_entries(data, eventor_input_filename, entries=inputs["eventor_entries"], fuzzy_threshold=fuzzy_threshold, fuzzy_report_threshold=fuzzy_report_threshold, fuzzy_report=fuzzy_report)
+            st.rows_out = len(data)
+            st.indexes = data.index_sizes()
+
+        if fuzzy_report_filename:
+            typer.echo(f"Writing similar names report to {fuzzy_report_filename}")
+            with open(fuzzy_report_filename, 'w', encoding='UTF8') as csvfile:
+                writer = csv.writer(csvfile, dialect='excel', delimiter=';')
+                writer.writerow(FUZZY_REPORT_COLUMNS)
+                writer.writerows(fuzzy_report)
+
+        typer.echo(f"Writing output to {output_filename}")
+        with report.stage("write_output", rows_in=len(data)):
+            data.write(output_filename)
 
-    typer.secho(f'Total Eventor entries: {total_eventor}', fg=typer.colors.GREEN)
-    typer.secho(f'Added new entries: {total_added}', fg=typer.colors.GREEN)
-    typer.secho(f'Total entries: {len(data)}', fg=typer.colors.GREEN)
+        typer.secho(f'Total Eventor entries: {total_eventor}', fg=typer.colors.GREEN)
+        typer.secho(f'Added new entries: {total_added}', fg=typer.colors.GREEN)
+        typer.secho(f'Similar names: {len(fuzzy_report)}, skipped: {total_similar}', fg=typer.colors.GREEN)
+        typer.secho(f'Total entries: {len(data)}', fg=typer.colors.GREEN)
 
 
 if __name__ == '__main__':
@@ -1,20 +1,29 @@
 #!/usr/bin/env python3
 
-import csv
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence
 
-import pandas as pd
 import typer
 
+import oe_columns.de
+from ingest import Source, load_sources, read_oe_entries
+from oe_entries import EntryTable
+from solv_db import SolvDB
+from late_ledger import LateEntriesLedger, row_hash
+from workbook import SheetRow, iter_sheet
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
 
-CSV_INPUT_ENCODING = 'ISO-8859-1'
-CSV_OUTPUT_ENCODING = 'ISO-8859-1'
 
-IOFID_FIELD = "Num3"
-SOLVNR_FIELD = "Datenbank Id"
-SICARD_FIELD = "Chipnr"
-START_REGION_FIELD = "Num1"
+# Column IDs of oe_columns, the OE export can be in any language
+IOFID_FIELD = "IOFID"
+SOLVNR_FIELD = "SOLVNR"
+SICARD_FIELD = "SICARD"
 INDEX_COLS = (SICARD_FIELD, SOLVNR_FIELD, IOFID_FIELD)
+# In the SOLV DB and the late entries sheet
+START_REGION_FIELD = "Num1"
+DONE_FIELD = "Eseguito"
+# Title row above the header of the late entries sheet
+SHEET_SKIPROWS = 1
 
 
 ENTRY_DB_FIELDS = (
@@ -45,6 +54,8 @@ ENTRY_DB_FIELDS = (
     # "Startgeld",
     # "Bezahlt",
 )
+# The SOLV DB columns are named as in the German OE export
+DB_COLUMN_IDS = {name: column_id for column_id, name in oe_columns.column_ids(oe_columns.de).items()}
 
 BLOCK_DEFAULT = 5
 BLOCKS_MAPPING = {
@@ -68,80 +79,152 @@ BLOCKS_MAPPING = {
     },
 }
 
-def main(
-    late_input_filename: Path=typer.Option(..., "--late-entries", help="File Excel late entries"),
-    sheet_name: str=typer.Option(..., help="Name of the worksheet to use"),
-    solv_input_filename: Path=typer.Option(..., "--solv-db", help="File CSV con DB SOLV"),
-    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
-    output_filename: Path=typer.Option(..., "--output", help="File CSV di output")
-    ):
-    
-    typer.echo(f"Reading entries from CSV file {oe_input_filename}")
-    with open(oe_input_filename, encoding=CSV_INPUT_ENCODING) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
-        
-        data = []
-        header_keys = None
-        data_by_index = {ix: {} for ix in INDEX_COLS}
-        for i, row in enumerate(reader):
-            if not header_keys: header_keys = list(row.keys())
-            data.append(row)
-            
-            for ix in INDEX_COLS:
-                if row[ix] != "0" and row[ix] != "":
-                    data_by_index[ix][row[ix]] = i
-
-    typer.echo(f"Reading SOLV DB from CSV file {solv_input_filename}")
-    with open(solv_input_filename, encoding=CSV_INPUT_ENCODING) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
-        
-        solv_db = {}
-        for i, row in enumerate(reader):
-            row["Chipnr"] = row["Chipnr SI"]
-            row["Geschlecht"] = row["G"]
-            solv_db[row[SOLVNR_FIELD]] = row
-
+def load_solv_db(solv_input_filename: Path) -> SolvDB:
+    typer.echo(f"Opening SOLV DB index for CSV file {solv_input_filename}")
+    return SolvDB.open(solv_input_filename)
+
+
+def entry_db_fields(data: EntryTable) -> Dict[str, str]:
+    """{SOLV DB column: OE column ID or name} of the ENTRY_DB_FIELDS in `data`."""
+    fields = {k: DB_COLUMN_IDS.get(k, k) for k in ENTRY_DB_FIELDS}
+    return {k: field for k, field in fields.items() if field in data}
+
+
+def _late_entry_row(entry, solv_db: SolvDB, sheet_name: str, db_fields: Dict[str, str]) -> Optional[dict]:
+    """OE row of a late entry, or None if the athlete is not in the SOLV DB."""
+    if not (entry["SOLV-nr"] and entry["SOLV-nr"] in solv_db):
+        return None
+
+    db_entry = solv_db[entry["SOLV-nr"]]
+    startRegion = db_entry[START_REGION_FIELD]
+    startBlock = BLOCKS_MAPPING[sheet_name].get(startRegion, BLOCK_DEFAULT)
+    row = {
+        field: db_entry[k]
+        for k, field in db_fields.items()
+    }
+    late_entry = {
+        "FEE": entry["Importo"],
+        "CLASS": entry["Cat"],
+        "BLOCK": str(startBlock),
+    }
+    if entry["SI-Card"] is not None:
+        late_entry[SICARD_FIELD] = entry["SI-Card"]
+    row = {
+        **row,
+        **late_entry
+    }
+    # Plain strings, as written in the CSV, so that the row can be kept in the ledger
+    return {k: v if isinstance(v, str) else str(v) for k, v in row.items()}
+
+
+def read_late_entries(late_input_filename: Path, sheet_name: str) -> List[SheetRow]:
     typer.echo(f"Reading Late entries from file {late_input_filename}")
-    late_data = pd.read_excel(late_input_filename, sheet_name=sheet_name, skiprows=1)
-    for _, entry in late_data.iterrows():
-        if not pd.isna(entry["Eseguito"]):
+    return list(iter_sheet(late_input_filename, sheet_name, skiprows=SHEET_SKIPROWS))
+
+
+def add_late_entries(data: EntryTable, solv_db: SolvDB, late_input_filename: Path, sheet_name: str, ledger: Optional[LateEntriesLedger] = None, entries: Optional[Sequence[SheetRow]] = None) -> List[dict]:
+    """
+    Append to `data` the late entries listed in the given worksheet, or the
+    `entries` already read from it (see read_late_entries).
+    With a `ledger`, the rows applied by a previous run are appended from
+    the ledger and only the new or modified rows are looked up. When the
+    SOLV DB changed since, all the rows are looked up again.
+    Returns the rows which were not in the ledger, or whose OE row changed.
+    """
+    if entries is None:
+        typer.echo(f"Reading Late entries from file {late_input_filename}")
+        entries = iter_sheet(late_input_filename, sheet_name, skiprows=SHEET_SKIPROWS)
+    stale = ledger is not None and ledger.check_solv_db(sheet_name, solv_db.digest())
+    if stale:
+        typer.secho("SOLV DB changed since the late entries ledger was written, looking up all the late entries again", fg=typer.colors.YELLOW)
+    new_rows = []
+    seen = []
+    db_fields = entry_db_fields(data)
+    for entry in entries:
+        if entry[DONE_FIELD] is not None:
             typer.secho(f"Athlete {entry['Cognome']} {entry['Nome']} already done", fg=typer.colors.YELLOW)
             continue
 
-        if entry["SOLV-nr"] and entry["SOLV-nr"] in solv_db:
-            typer.secho(f"Athlete {entry['SOLV-nr']} {entry['Cognome']} {entry['Nome']} found in SOLV DB", fg=typer.colors.GREEN)
-            db_entry = solv_db[entry["SOLV-nr"]]
-            startRegion = db_entry["Num1"]
-            startBlock = BLOCKS_MAPPING[sheet_name].get(startRegion, BLOCK_DEFAULT)
-            row = {
-                k: db_entry[k]
-                for k in ENTRY_DB_FIELDS
-            }
-            late_entry = {
-                "Startgeld": entry["Importo"],
-                "Kurz": entry["Cat"],
-                "Startgeld": entry["Importo"],
-                "Block": str(startBlock),
-            }
-            if not pd.isna(entry["SI-Card"]):
-                late_entry[SICARD_FIELD] = entry["SI-Card"]
-            row = {
-                **row,
-                **late_entry
-            }
-            data.append(row)
-        else:
+        applied = None
+        if ledger is not None:
+            h = row_hash(v for k, v in zip(entry.header, entry) if k != DONE_FIELD)
+            applied = ledger.applied(sheet_name, h)
+            if applied is not None and not stale:
+                seen.append(h)
+                data.append(applied)
+                continue
+
+        row = _late_entry_row(entry, solv_db, sheet_name, db_fields)
+        if row is None:
             typer.secho(f"Athlete {entry['Cognome']} {entry['Nome']} NOT FOUND", fg=typer.colors.RED)
+            continue
+
+        data.append(row)
+        # Already imported in OE as it is
+        if row != applied:
+            typer.secho(f"Athlete {entry['SOLV-nr']} {entry['Cognome']} {entry['Nome']} found in SOLV DB", fg=typer.colors.GREEN)
+            new_rows.append(row)
+        if ledger is not None:
+            seen.append(h)
+            ledger.record(sheet_name, h, row)
+
+    if ledger is not None:
+        dropped = ledger.prune(sheet_name, seen)
+        typer.secho(f"Late entries: {len(seen) - len(new_rows)} from ledger, {len(new_rows)} new or modified, {dropped} removed", fg=typer.colors.BLUE)
+    return new_rows
 
 
+def delta_filename_of(output_filename: Path) -> Path:
+    return output_filename.with_stem(f"{output_filename.stem}_delta")
 
-        
-    typer.echo(f"Writing output to {output_filename}")
-    with open(output_filename, 'w', encoding=CSV_OUTPUT_ENCODING) as csvfile:
-        writer = csv.DictWriter(csvfile, dialect='excel', delimiter=';', fieldnames=header_keys)
 
-        writer.writeheader()
-        writer.writerows(data)
+def write_delta(delta_filename: Path, data: EntryTable, new_rows: Sequence[dict]):
+    """The new late entries (see add_late_entries) as OE CSV with the header of `data`."""
+    delta = EntryTable(data.header_keys, index_cols=())
+    for row in new_rows:
+        delta.append(row)
+    typer.echo(f"Writing {len(delta)} new late entries to {delta_filename}")
+    delta.write(delta_filename)
+
+
+def main(
+    late_input_filename: Path=typer.Option(..., "--late-entries", help="File Excel late entries"),
+    sheet_name: str=typer.Option(..., help="Name of the worksheet to use"),
+    solv_input_filename: Path=typer.Option(..., "--solv-db", help="File CSV con DB SOLV"),
+    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
+    output_filename: Path=typer.Option(..., "--output", help="File CSV di output"),
+    ledger_filename: Optional[Path]=typer.Option(None, "--ledger", help="JSON ledger of the applied late entries, for incremental runs"),
+    delta_filename: Optional[Path]=typer.Option(None, "--delta-output", help="CSV file with only the new late entries. Default with --ledger: <output>_delta.csv"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    with measure_run("add_late_entries", report_filename, profile, trace_memory) as report:
+        inputs = load_sources([
+            Source("oe_entries", read_oe_entries, (oe_input_filename, INDEX_COLS)),
+            Source("solv_db", load_solv_db, (solv_input_filename,)),
+            Source("late_entries", read_late_entries, (late_input_filename, sheet_name), process=True),
+        ], report)
+        data = inputs["oe_entries"]
+
+        ledger = LateEntriesLedger(ledger_filename) if ledger_filename else None
+
+        with report.stage("add_late_entries", rows_in=len(data)) as st:
+            new_rows = add_late_entries(data, inputs["solv_db"], late_input_filename, sheet_name, ledger, inputs["late_entries"])
+            st.rows_out = len(data)
+            st.indexes = data.index_sizes()
+
+        typer.echo(f"Writing output to {output_filename}")
+        with report.stage("write_output", rows_in=len(data)):
+            data.write(output_filename)
+
+        if ledger is not None and delta_filename is None:
+            delta_filename = delta_filename_of(output_filename)
+        if delta_filename:
+            write_delta(delta_filename, data, new_rows)
+
+        if ledger is not None:
+            ledger.save()
 
 
 if __name__ == '__main__':
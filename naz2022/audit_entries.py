@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Check the consistency of any number of OE entry and start list exports.
+
+Every file is streamed once: the key columns of each row are appended to a
+few lists, and the rows are indexed by SI-card, IOF ID, SOLV number, start
+number and name key (family name, given name and birth year, normalized as
+in fuzzy_match.py). Only the values found in more than one row are then
+compared, so the audit is linear in the number of rows. The conflicts
+reported are
+
+- duplicate_sicard, duplicate_iofid, duplicate_solvnr, duplicate_startnr,
+  duplicate_name: the same value in two rows of the same file;
+- sicard_conflict, iofid_conflict, solvnr_conflict: the same value in
+  different files on athletes with different names (rented SI-cards
+  change hands between days and are not compared across files);
+- startnr_shared: the same start number given to different athletes in
+  different files;
+- startnr_mismatch: an athlete with different start numbers in different
+  files (athletes with the same name but different IOF ID or SOLV number
+  are told apart).
+
+Vacant places are ignored. Every conflicting row is reported with the row
+it conflicts with, and the issues are optionally written to a CSV file, or
+to a JSON file with the counts per check. The exit code is 1 if there are
+any, so the audit can gate the import of the files into OE.
+
+    python audit_entries.py 8naz_entries_final.csv 9naz_entries_final.csv --output audit.json
+"""
+
+import csv
+from dataclasses import asdict, astuple, dataclass
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import typer
+
+import oe_columns
+from fuzzy_match import normalize_name
+from identity import key_positions
+from oe_entries import CSV_INPUT_ENCODING, IOFID_FIELD, SICARD_FIELD, SOLVNR_FIELD, EntryTable
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+
+
+# Column IDs of oe_columns
+FAMILY_NAME_FIELD = "FAMILY_NAME"
+GIVEN_NAME_FIELD = "GIVEN_NAME"
+BIRTH_FIELD = "BIRTH"
+STARTNR_FIELD = "STARTNR"
+RENTED_FIELD = "RENTED"
+AUDIT_FIELDS = (SICARD_FIELD, IOFID_FIELD, SOLVNR_FIELD, STARTNR_FIELD, RENTED_FIELD, FAMILY_NAME_FIELD, GIVEN_NAME_FIELD, BIRTH_FIELD)
+
+# Checked on the same value in different files, by name of the value
+ID_CHECKS = {SICARD_FIELD: "SI-card", IOFID_FIELD: "IOF ID", SOLVNR_FIELD: "SOLV number"}
+CHECKS = (
+    "duplicate_sicard", "duplicate_iofid", "duplicate_solvnr", "duplicate_startnr", "duplicate_name",
+    "sicard_conflict", "iofid_conflict", "solvnr_conflict", "startnr_shared", "startnr_mismatch",
+)
+ISSUE_COLUMNS = ("Check", "Value", "File", "Line", "Startnr", "Name", "Detail")
+
+NameKey = Tuple[str, str, str]
+
+
+@dataclass
+class Issue:
+    check: str
+    value: str
+    file: str
+    line: int
+    startnr: str
+    name: str
+    detail: str
+
+
+def _has_value(value: str) -> bool:
+    return value != "" and value != "0"
+
+
+class EntryAudit:
+    """The key columns of the rows of all the files, with the indexes of the audit."""
+
+    def __init__(self):
+        self.files: List[Path] = []
+        self.file_names: List[str] = []
+        # One item per row
+        self.file: List[int] = []
+        self.line: List[int] = []
+        self.name: List[str] = []
+        self.name_key: List[NameKey] = []
+        self.rented: List[bool] = []
+        self.values: Dict[str, List[str]] = {k: [] for k in (*ID_CHECKS, STARTNR_FIELD)}
+        # {value: rows} of every field, and of the name keys
+        self.index: Dict[str, Dict[str, List[int]]] = {k: {} for k in self.values}
+        self.by_name: Dict[NameKey, List[int]] = {}
+        self._normalized: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.file)
+
+    def _normalize(self, name: str) -> str:
+        normalized = self._normalized.get(name)
+        if normalized is None:
+            normalized = self._normalized[name] = " ".join(normalize_name(name).split())
+        return normalized
+
+    def add_file(self, filename: Path, columns=None, encoding: str = CSV_INPUT_ENCODING) -> int:
+        """Add the rows of an OE CSV export, returns their number."""
+        with open(filename, encoding=encoding, newline='') as csvfile:
+            reader = csv.reader(csvfile, dialect='excel', delimiter=';')
+            header = next(reader)
+            rows = ((reader.line_num, values) for values in reader)
+            return self._add_rows(filename, filename.name, header, rows, columns)
+
+    def add_table(self, data: EntryTable, name: str, filename: Optional[Path] = None) -> int:
+        """Add the rows of an EntryTable already loaded, reported as file `name`. Returns their number."""
+        # Line 1 is the header
+        rows = enumerate(([str(value) for value in values] for values in zip(*data.columns)), start=2)
+        return self._add_rows(filename or Path(name), name, data.header_keys, rows, data.oe_columns)
+
+    def _add_rows(self, filename: Path, name: str, header: Sequence[str], rows: Iterable[Tuple[int, Sequence[str]]], columns=None) -> int:
+        ifile = len(self.files)
+        self.files.append(filename)
+        self.file_names.append(name)
+        columns = columns or oe_columns.detect(header)
+        vacancy_name = columns.VACANCY_NAME if columns is not None else None
+        pos = key_positions(header, AUDIT_FIELDS, columns)
+        if FAMILY_NAME_FIELD not in pos:
+            raise ValueError(f"{filename} is not an OE export, its header has no family name")
+        value_pos = [(pos.get(k), self.values[k], self.index[k]) for k in self.values]
+        name_pos = [pos.get(k) for k in (FAMILY_NAME_FIELD, GIVEN_NAME_FIELD, BIRTH_FIELD)]
+        rented_pos = pos.get(RENTED_FIELD)
+
+        n = 0
+        for line, values in rows:
+            if not values:
+                continue
+            if len(values) < len(header):
+                values = [*values, *([""] * (len(header) - len(values)))]
+            family_name, given_name, birth = (values[p] if p is not None else "" for p in name_pos)
+            if family_name == vacancy_name:
+                continue
+            i = len(self.file)
+            self.file.append(ifile)
+            self.line.append(line)
+            self.name.append(f"{family_name} {given_name} {birth}")
+            self.rented.append(rented_pos is not None and _has_value(values[rented_pos]))
+            for p, column, index in value_pos:
+                value = values[p] if p is not None else ""
+                column.append(value)
+                if _has_value(value):
+                    index.setdefault(value, []).append(i)
+            name_key = (self._normalize(family_name), self._normalize(given_name), birth)
+            self.name_key.append(name_key)
+            if family_name or given_name:
+                self.by_name.setdefault(name_key, []).append(i)
+            n += 1
+        return n
+
+    def _issue(self, check: str, value: str, i: int, detail: str) -> Issue:
+        return Issue(check, value, self.file_names[self.file[i]], self.line[i], self.values[STARTNR_FIELD][i], self.name[i], detail)
+
+    def _where(self, i: int) -> str:
+        return f"{self.name[i]} on line {self.line[i]} of {self.file_names[self.file[i]]}"
+
+    def _same_athlete(self, i: int, j: int) -> bool:
+        if self.name_key[i] != self.name_key[j]:
+            return False
+        # Namesakes with different IDs
+        for k in (IOFID_FIELD, SOLVNR_FIELD):
+            a, b = self.values[k][i], self.values[k][j]
+            if _has_value(a) and _has_value(b) and a != b:
+                return False
+        return True
+
+    def _check_value(self, field: str, what: str, duplicate: str, conflict: Optional[str]) -> List[Issue]:
+        """Rows sharing a value of `field`: in the same file, or in different files on different athletes."""
+        issues = []
+        for value, rows in self.index[field].items():
+            if len(rows) < 2:
+                continue
+            # First row of the value in every file
+            first: Dict[int, int] = {}
+            for i in rows:
+                ifile = self.file[i]
+                if ifile in first:
+                    issues.append(self._issue(duplicate, value, i, f"{what} {value} also given to {self._where(first[ifile])}"))
+                    continue
+                first[ifile] = i
+                if conflict is None or len(first) == 1:
+                    continue
+                ref = rows[0]
+                if field == SICARD_FIELD and (self.rented[i] or self.rented[ref]):
+                    continue
+                if self.name_key[i] != self.name_key[ref]:
+                    issues.append(self._issue(conflict, value, i, f"{what} {value} also given to {self._where(ref)}"))
+        return issues
+
+    def _check_names(self) -> List[Issue]:
+        """Names twice in a file, and athletes with different start numbers in different files."""
+        issues = []
+        startnr = self.values[STARTNR_FIELD]
+        for rows in self.by_name.values():
+            if len(rows) < 2:
+                continue
+            first: Dict[int, int] = {}
+            numbered: List[int] = []
+            for i in rows:
+                ifile = self.file[i]
+                if ifile in first:
+                    issues.append(self._issue("duplicate_name", "", i, f"same name and birth year as {self._where(first[ifile])}"))
+                    continue
+                first[ifile] = i
+                if not _has_value(startnr[i]):
+                    continue
+                for j in numbered:
+                    if self._same_athlete(i, j) and startnr[i] != startnr[j]:
+                        issues.append(self._issue("startnr_mismatch", startnr[i], i, f"start number {startnr[j]} for {self._where(j)}"))
+                        break
+                numbered.append(i)
+        return issues
+
+    def audit(self, checks: Sequence[str] = CHECKS) -> List[Issue]:
+        """The issues of the given CHECKS."""
+        checks = set(checks)
+        issues = []
+        for field, what in (*ID_CHECKS.items(), (STARTNR_FIELD, "start number")):
+            duplicate = f"duplicate_{field.lower()}"
+            conflict = "startnr_shared" if field == STARTNR_FIELD else f"{field.lower()}_conflict"
+            if duplicate in checks or conflict in checks:
+                issues += self._check_value(field, what, duplicate, conflict)
+        if checks & {"duplicate_name", "startnr_mismatch"}:
+            issues += self._check_names()
+        return [issue for issue in issues if issue.check in checks]
+
+
+def count_issues(issues: Sequence[Issue]) -> Dict[str, int]:
+    counts = dict.fromkeys(CHECKS, 0)
+    for issue in issues:
+        counts[issue.check] += 1
+    return counts
+
+
+def write_issues(output_filename: Path, issues: Sequence[Issue], audit: EntryAudit):
+    """The issues as CSV, or as JSON with the counts per check if the file name ends in .json."""
+    if output_filename.suffix.lower() == ".json":
+        with open(output_filename, "w", encoding="UTF8") as f:
+            json.dump({
+                "files": [str(filename) for filename in audit.files],
+                "rows": len(audit),
+                "counts": count_issues(issues),
+                "issues": [asdict(issue) for issue in issues],
+            }, f, indent=2, ensure_ascii=False)
+    else:
+        with open(output_filename, 'w', encoding='UTF8', newline='') as csvfile:
+            writer = csv.writer(csvfile, dialect='excel', delimiter=';')
+            writer.writerow(ISSUE_COLUMNS)
+            writer.writerows(astuple(issue) for issue in issues)
+
+
+def main(
+    oe_input_filenames: List[Path]=typer.Argument(..., help="CSV files with the OE entries or start lists"),
+    language: Optional[str]=typer.Option(None, help="Language of the OE exports (de, it). Default: detected from the header of each file"),
+    output_filename: Optional[Path]=typer.Option(None, "--output", help="CSV file with the issues, or JSON file if it ends in .json"),
+    quiet: bool=typer.Option(False, help="Only print the number of issues of every check"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    columns = oe_columns.load(language) if language else None
+    with measure_run("audit_entries", report_filename, profile, trace_memory) as report:
+        audit = EntryAudit()
+        for n, input_filename in enumerate(oe_input_filenames):
+            typer.echo(f"Reading entries from CSV file {input_filename}")
+            with report.stage(f"read/{n + 1}") as st:
+                st.rows_out = audit.add_file(input_filename, columns)
+
+        with report.stage("audit", rows_in=len(audit)) as st:
+            issues = audit.audit()
+            st.rows_out = len(issues)
+
+        if not quiet:
+            for issue in issues:
+                typer.secho(f"{issue.check:18} {issue.value:>10} {issue.file}:{issue.line} {issue.startnr:>5} {issue.name:30} {issue.detail}", fg=typer.colors.YELLOW)
+        for check, count in count_issues(issues).items():
+            if count:
+                typer.echo(f"{check:18} {count}")
+        if output_filename:
+            typer.echo(f"Writing issues to {output_filename}")
+            write_issues(output_filename, issues, audit)
+
+        if issues:
+            typer.secho(f"{len(issues)} issues found in {len(audit)} rows", fg=typer.colors.RED)
+            raise typer.Exit(1)
+        typer.secho(f"{len(audit)} rows of {len(audit.files)} files OK", fg=typer.colors.GREEN)
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the naz2022 tools on synthetic data (see synthetic_data.py).
+
+For every requested scale the inputs are generated, then
+
+- every script is run as it would be from the shell, measuring the wall
+  time and the peak RSS of the process;
+- every command of oe_tools.py is loaded in a new interpreter and the time
+  compared with the startup budget (oe_tools.STARTUP_BUDGET_S);
+- the main stages are run in-process, measuring the wall time and, with
+  --memory, the peak of the memory allocated by Python (tracemalloc slows
+  the stages down, so the timings are not comparable with and without it).
+
+    python benchmark.py --runners 1000 --runners 10000 --output bench.json
+"""
+
+import contextlib
+from dataclasses import asdict, dataclass
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import typer
+
+import oe_tools
+import synthetic_data
+
+
+TOOLS_DIR = Path(__file__).resolve().parent
+
+
+@dataclass
+class Result:
+    runners: int
+    kind: str
+    name: str
+    seconds: float
+    peak_mb: Optional[float]
+
+
+# The rusage of a child also counts the memory of the parent it was forked
+# from, so on Linux the script reports the high-water mark of its own RSS.
+PROC_STATUS = Path("/proc/self/status")
+PEAK_MARKER = "@@peak_rss_kb"
+_RUNNER = f"""
+import atexit, runpy, sys
+def _peak():
+    with open("{PROC_STATUS}") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                sys.stderr.write("\\n{PEAK_MARKER} " + line.split()[1] + "\\n")
+atexit.register(_peak)
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def _peak_rss_mb(ru_maxrss: int) -> float:
+    # kilobytes on Linux, bytes on macOS
+    return ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else ru_maxrss / 1024
+
+
+def run_script(args: List[str], env: dict) -> tuple:
+    """Run a tool in a new interpreter, returns (seconds, peak RSS of its main process in MB)."""
+    wrap = PROC_STATUS.exists() and args[0].endswith(".py")
+    cmd = [sys.executable, "-c", _RUNNER, *args] if wrap else [sys.executable, *args]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=TOOLS_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = proc.stderr.read().decode(errors="replace")
+    _, status, rusage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    proc.stderr.close()
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{stderr}")
+    peak = _peak_rss_mb(rusage.ru_maxrss)
+    for line in stderr.splitlines():
+        if line.startswith(PEAK_MARKER):
+            peak = int(line.split()[1]) / 1024
+    return seconds, peak
+
+
+def run_stage(fn: Callable[[], object], memory: bool = False) -> tuple:
+    """Run a stage in-process, returns (seconds, peak traced memory in MB or None)."""
+    peak = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - start
+        if memory:
+            peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+    return seconds, peak
+
+
+def run_startup() -> List[Result]:
+    results = []
+    for command in oe_tools.COMMANDS:
+        seconds, peak = run_script(["-c", f"import oe_tools; oe_tools.load_app({command!r})"], dict(os.environ))
+        results.append(Result(0, "startup", command, seconds, peak))
+        _report(results[-1])
+        if seconds > oe_tools.STARTUP_BUDGET_S:
+            typer.secho(f"{command} is over the startup budget of {oe_tools.STARTUP_BUDGET_S} s", fg=typer.colors.RED)
+    return results
+
+
+def script_runs(files: dict, out: Path) -> List[tuple]:
+    for name in ("day1", "day2"):
+        shutil.copy(files["oe_entries_de"], out / f"{name}.csv")
+    with open(files["solv_db"], encoding="ISO-8859-1") as f:
+        solvnr = f.readlines()[1].split(";")[0]
+    return [
+        ("add_eventor_entries", ["add_eventor_entries.py", "--oe-entries", files["oe_entries_de"], "--eventor-entries", files["eventor_entries"], "--output", out / "eventor.csv"]),
+        ("add_late_entries (new index)", ["add_late_entries.py", "--oe-entries", out / "eventor.csv", "--solv-db", files["solv_db"], "--late-entries", files["late_entries"], "--sheet-name", "Sabato", "--output", out / "late.csv"]),
+        ("add_late_entries", ["add_late_entries.py", "--oe-entries", out / "eventor.csv", "--solv-db", files["solv_db"], "--late-entries", files["late_entries"], "--sheet-name", "Sabato", "--output", out / "late.csv"]),
+        ("oe_tools solv-lookup", ["oe_tools.py", "solv-lookup", "--solv-db", files["solv_db"], "--solvnr", solvnr]),
+        ("fix_missing_iof", ["fix_missing_iof.py", "--oe-entries", out / "late.csv", "--missing-iof", files["missing_iof"], "--output", out / "ioffix.csv"]),
+        ("define_wre_start_blocks", ["define_wre_start_blocks.py", "--oe-entries", files["oe_entries_it"], "--men-ranking", files["ranking_MEN_F"], "--women-ranking", files["ranking_WOMEN_F"], "--output", out / "blocks.csv"]),
+        ("define_common_startnr", ["define_common_startnr.py", out / "day1.csv", out / "day2.csv"]),
+        ("export_startnr_for_print", ["export_startnr_for_print.py", "--oe-input", files["oe_startlist_1"], "--zero", "10:00:00", "--oe-input", files["oe_startlist_2"], "--zero", "09:00:00", "--output", out / "startnr.xlsx"]),
+        ("pipeline", ["pipeline.py", files["pipeline"], "--no-cache"]),
+        ("pipeline (new stage cache)", ["pipeline.py", files["pipeline"]]),
+        ("pipeline (cached stages)", ["pipeline.py", files["pipeline"]]),
+    ]
+
+
+def stage_runs(files: dict, out: Path) -> List[tuple]:
+    from oe_entries import EntryTable
+    from add_eventor_entries import INDEX_COLS, NAME_FIELDS, iter_person_entries
+    from fuzzy_match import NameMatcher
+    from solv_db import SolvDB, build_index
+    from define_wre_start_blocks import define_wre_start_blocks, load_ranking
+    from define_common_startnr import NAME_FIELDS as STARTNR_NAME_FIELDS, define_common_startnr
+
+    data_de = EntryTable.read(files["oe_entries_de"], INDEX_COLS, name_fields=NAME_FIELDS)
+    data_it = EntryTable.read(files["oe_entries_it"], ("SICARD",))
+    men = load_ranking(files["ranking_MEN_F"], "men")
+    women = load_ranking(files["ranking_WOMEN_F"], "women")
+    index_filename = out / "solv-index.sqlite"
+    build_index(files["solv_db"], index_filename)
+    solvnrs = [data_de.get(i, "SOLVNR") for i in range(min(len(data_de), 1000))]
+
+    def _lookup():
+        db = SolvDB(index_filename)
+        for solvnr in solvnrs:
+            db.get(solvnr)
+        db.close()
+
+    def _common_startnr():
+        tables = [EntryTable.read(files["oe_entries_de"], (), name_fields=STARTNR_NAME_FIELDS) for _ in range(2)]
+        define_common_startnr(tables)
+
+    return [
+        ("EntryTable.read", lambda: EntryTable.read(files["oe_entries_de"], INDEX_COLS, name_fields=NAME_FIELDS)),
+        ("EntryTable.write", lambda: data_de.write(out / "write.csv")),
+        ("iter_person_entries", lambda: sum(1 for _ in iter_person_entries(files["eventor_entries"]))),
+        ("solv_db.build_index", lambda: build_index(files["solv_db"], out / "solv-index-bench.sqlite")),
+        ("SolvDB 1000 lookups", _lookup),
+        ("NameMatcher", lambda: NameMatcher(data_de, *NAME_FIELDS, nat_field="NAT")),
+        ("define_wre_start_blocks", lambda: define_wre_start_blocks(data_it, men, women)),
+        ("define_common_startnr", _common_startnr),
+    ]
+
+
+def _report(result: Result):
+    peak = f"{result.peak_mb:9.1f} MB" if result.peak_mb is not None else ""
+    typer.echo(f"{result.runners:>8}  {result.kind:6}  {result.name:32} {result.seconds:8.3f} s {peak}".rstrip())
+
+
+def run_benchmark(runners: int, work_dir: Path, scripts: bool = True, stages: bool = True, memory: bool = False) -> List[Result]:
+    data_dir = work_dir / f"data_{runners}"
+    out = work_dir / f"out_{runners}"
+    out.mkdir(parents=True, exist_ok=True)
+    typer.secho(f"Generating data for {runners} runners in {data_dir}", fg=typer.colors.BLUE)
+    cwd = os.getcwd()
+    os.chdir(TOOLS_DIR)
+    try:
+        files = synthetic_data.generate(data_dir, runners)
+    finally:
+        os.chdir(cwd)
+
+    results = []
+    if scripts:
+        env = {**os.environ, "OE_TOOLS_CACHE": str(out / "cache")}
+        shutil.rmtree(out / "cache", ignore_errors=True)
+        for name, args in script_runs(files, out):
+            seconds, peak = run_script([str(a) for a in args], env)
+            results.append(Result(runners, "script", name, seconds, peak))
+            _report(results[-1])
+
+    if stages:
+        cwd = os.getcwd()
+        os.chdir(TOOLS_DIR)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                runs = stage_runs(files, out)
+            for name, fn in runs:
+                seconds, peak = run_stage(fn, memory)
+                results.append(Result(runners, "stage", name, seconds, peak))
+                _report(results[-1])
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def main(
+    runners: List[int]=typer.Option([1000, 10000], help="Number of runners, can be repeated"),
+    work_dir: Optional[Path]=typer.Option(None, help="Folder for the generated data and outputs. Default: a temporary folder"),
+    scripts: bool=typer.Option(True, help="Benchmark the scripts as separate processes"),
+    stages: bool=typer.Option(True, help="Benchmark the stages in-process"),
+    memory: bool=typer.Option(False, help="Trace the peak memory of the in-process stages"),
+    startup: bool=typer.Option(True, help="Check the startup time of the oe_tools.py commands"),
+    output_filename: Optional[Path]=typer.Option(None, "--output", help="JSON file with the results"),
+    ):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = (work_dir or Path(tmp_dir)).resolve()
+        results = run_startup() if startup else []
+        for n in runners:
+            results.extend(run_benchmark(n, work_dir, scripts, stages, memory))
+
+    if output_filename:
+        typer.echo(f"Writing results to {output_filename}")
+        with open(output_filename, 'w', encoding="UTF8") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=False, add_completion=False)
+    app.command()(main)
+    app()
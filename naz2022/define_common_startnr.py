@@ -1,54 +1,59 @@
 #!/usr/bin/env python3
+"""
+Assign a common start number to the athletes entered in several events.
+
+The athletes are recognized among the events by IOF ID, SOLV number and
+SI-card, else by name and birth year (see identity.py). The OE files are
+streamed twice, once to link the entries and once to write them with the
+start numbers, so only the keys and one record per athlete are kept in
+memory: any number of events (a multi-day event, a cup series) can be
+given.
+"""
 
 import csv
 from dataclasses import dataclass
 import math
 import random
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional
 
 import typer
 
+from identity import KEY_FIELDS, IdentityResolver, add_entries, iter_key_values, key_positions
+from oe_entries import CSV_OUTPUT_ENCODING, CSV_OUTPUT_ERRORS, EntryTable
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+
 
 CSV_INPUT_ENCODING = 'ISO-8859-1'
-CSV_OUTPUT_ENCODING = 'ISO-8859-1'
 
 CLASSES_FILE = "resources/solv-classes.csv"
 
-IOFID_FIELD = "Num3"
-SOLVNR_FIELD = "Datenbank Id"
-SICARD_FIELD = "Chipnr"
+# Columns of CLASSES_FILE
 CLASS_FIELD = "Kurz"
 CLASSNR_FIELD = "Katnr"
-BLOCK_FIELD = "Block"
-GIVEN_NAME_FIELD = "Vorname"
-FAMILY_NAME_FIELD = "Nachname"
-BIRTH_FIELD = "Jg"
-STARTNR_FIELD = "Stnr"
+
+# Column IDs of oe_columns, the OE files can be in any language
+IOFID_FIELD = "IOFID"
+SOLVNR_FIELD = "SOLVNR"
+SICARD_FIELD = "SICARD"
+GIVEN_NAME_FIELD = "GIVEN_NAME"
+FAMILY_NAME_FIELD = "FAMILY_NAME"
+BIRTH_FIELD = "BIRTH"
+STARTNR_FIELD = "STARTNR"
 INDEX_COLS = (SICARD_FIELD, SOLVNR_FIELD, IOFID_FIELD)
+NAME_FIELDS = (FAMILY_NAME_FIELD, GIVEN_NAME_FIELD, BIRTH_FIELD, "CLASS")
 
 ELITE_CLASSES = ("HE", "H20", "DE", "D20")
 
-NameTuple = Tuple[str, str, str]
-
 @dataclass
 class Run:
-    data: List[dict]
-    header_keys: List[str]
-    ix_by_name: Dict[NameTuple, int]
-    ix_by_field: Dict[str, Dict[str, int]]
     filename: Path
-
-def _make_name_key(row):
-    return (row[FAMILY_NAME_FIELD], row[GIVEN_NAME_FIELD], row[BIRTH_FIELD], row[CLASS_FIELD])
+    entries: int = 0
 
 def round_up_to_nearest_100(num):
     return math.ceil(num / 100) * 100
 
-def main(
-    oe_input_filenames: List[Path]=typer.Argument(..., help="File CSV con iscrizioni OE"),
-    ):
-    
+def load_classes():
     typer.echo(f"Reading classes metadata from CSV file {CLASSES_FILE}")
     with open(CLASSES_FILE, encoding=CSV_INPUT_ENCODING) as csvfile:
         reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
@@ -57,88 +62,132 @@ def main(
         for row in reader:
             classesRefs.append(row)
         classesRefs.sort(key=lambda x: int(x[CLASSNR_FIELD]))
+    return classesRefs
 
+def _table_key_values(data: EntryTable) -> Iterator[Dict[str, str]]:
+    fields = [k for k in KEY_FIELDS if k in data]
+    for values in zip(*(data.column(k) for k in fields)):
+        yield dict(zip(fields, values))
 
-    all_entries: Dict[NameTuple, Dict[int, int]] = {}
-    all_entries_per_class: Dict[str, Dict[NameTuple, Dict[int, int]]] = {}
-    runs: List[Run] = []
-    for irun, input_filename in enumerate(oe_input_filenames):
-        typer.echo(f"Reading entries from CSV file {input_filename}")
-        with open(input_filename, encoding=CSV_INPUT_ENCODING) as csvfile:
-            reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
-            
-            data = []
-            header_keys = None
-            data_by_name: Dict[NameTuple, int] = {}
-            data_by_index = {ix: {} for ix in INDEX_COLS}
-            for i, row in enumerate(reader):
-                if not header_keys: header_keys = list(row.keys())
-                data.append(row)
-                
-                for ix in INDEX_COLS:
-                    if row[ix] != "0" and row[ix] != "":
-                        data_by_index[ix][row[ix]] = i
-
-                name_key = _make_name_key(row)
-                if name_key in data_by_name:
-                    print("Duplicate", name_key)
-                    raise RuntimeError("Name key is not unique enough")
-                data_by_name[name_key] = i
-
-                all_entries.setdefault(name_key, {})[irun] = i
-
-                all_entries_per_class.setdefault(row[CLASS_FIELD], {})
-                all_entries_per_class[row[CLASS_FIELD]].setdefault(name_key, {})[irun] = i
+def _report_links(resolver: IdentityResolver, runs: List[Run]):
+    for irun, name in resolver.duplicates:
+        typer.secho(f"Duplicate in {runs[irun].filename.name}: {name}, given its own start number", fg=typer.colors.YELLOW)
+    for irun, key, other_key in resolver.conflicts:
+        typer.secho(f"Not linked in {runs[irun].filename.name}: {key} and {other_key} belong to different athletes", fg=typer.colors.YELLOW)
 
-        typer.secho(f"Number of enties {len(data)}", fg=typer.colors.BLUE)
-        runs.append(Run(data, header_keys, data_by_name, data_by_index, input_filename))
-
-    typer.secho(f"Total number of enties {len(all_entries)}", fg=typer.colors.BLUE)
+def assign_startnr(resolver: IdentityResolver) -> Dict[int, int]:
+    """Start number of every athlete (root of the resolver)."""
+    classesRefs = load_classes()
+    athletes_per_class = resolver.by_class()
 
     total_elite = 0
-    for className, entries in sorted(all_entries_per_class.items()):
+    for className, athletes in sorted(athletes_per_class.items()):
         if className in ELITE_CLASSES:
-            total_elite += len(entries)
-        typer.echo(f"{className}    {len(entries)}")
+            total_elite += len(athletes)
+        typer.echo(f"{className}    {len(athletes)}")
 
     starting_nr = round_up_to_nearest_100(total_elite)
     typer.echo(f"Number of elite {total_elite}, stating other classes with {starting_nr}")
-    
+
+    startnr_by_athlete: Dict[int, int] = {}
+
     # Elite start nr
     startnr = 1
     for className in ELITE_CLASSES:
-        flat_entries = list(all_entries_per_class[className].items())
-        random.shuffle(flat_entries)
-        entries = dict(flat_entries)
-        for i, (name_key, entry_ix) in enumerate(entries.items()):
-            for irun, ix in entry_ix.items():
-                runs[irun].data[ix][STARTNR_FIELD] = str(startnr)
+        athletes = list(athletes_per_class.get(className, ()))
+        random.shuffle(athletes)
+        for root in athletes:
+            startnr_by_athlete[root] = startnr
             startnr += 1
 
     # Others start nr
     startnr = starting_nr + 1
     for classRef in classesRefs:
         className = classRef[CLASS_FIELD]
-        if className in ELITE_CLASSES or className not in all_entries_per_class:
+        if className in ELITE_CLASSES or className not in athletes_per_class:
             continue
 
-        flat_entries = list(all_entries_per_class[className].items())
-        random.shuffle(flat_entries)
-        entries = dict(flat_entries)
-        for i, (name_key, entry_ix) in enumerate(entries.items()):
-            for irun, ix in entry_ix.items():
-                runs[irun].data[ix][STARTNR_FIELD] = str(startnr)
+        athletes = list(athletes_per_class[className])
+        random.shuffle(athletes)
+        for root in athletes:
+            startnr_by_athlete[root] = startnr
             startnr += 1
+    return startnr_by_athlete
+
+def define_common_startnr(tables: List[EntryTable]):
+    """
+    Assign the same start number to the athletes found in several of the
+    given entry tables (one per run).
+    """
+    resolver = IdentityResolver()
+    for irun, data in enumerate(tables):
+        add_entries(resolver, irun, _table_key_values(data))
+        typer.secho(f"Number of enties {len(data)}", fg=typer.colors.BLUE)
+    typer.secho(f"Total number of enties {len(resolver.athletes)}", fg=typer.colors.BLUE)
+    _report_links(resolver, [Run(Path(f"run {irun + 1}")) for irun in range(len(tables))])
+
+    startnr_by_athlete = assign_startnr(resolver)
+    for irun, data in enumerate(tables):
+        for i in range(len(data)):
+            startnr = startnr_by_athlete.get(resolver.athlete_of(irun, i))
+            if startnr is not None:
+                data.set(i, STARTNR_FIELD, str(startnr))
+
+def write_startnr(input_filename: Path, output_filename: Path, resolver: IdentityResolver, irun: int, startnr_by_athlete: Dict[int, int]) -> int:
+    """
+    Copy the OE CSV file of event `irun` setting the start numbers, row by
+    row, as EntryTable.write would write it. Returns the number of rows.
+    """
+    n = 0
+    with open(input_filename, encoding=CSV_INPUT_ENCODING, newline='') as infile, \
+            open(output_filename, 'w', encoding=CSV_OUTPUT_ENCODING, errors=CSV_OUTPUT_ERRORS) as outfile:
+        reader = csv.reader(infile, dialect='excel', delimiter=';')
+        writer = csv.writer(outfile, dialect='excel', delimiter=';')
+        header = next(reader)
+        writer.writerow(header)
+        startnr_pos = key_positions(header, (STARTNR_FIELD,))[STARTNR_FIELD]
+        for values in reader:
+            if not values:
+                continue
+            if len(values) < len(header):
+                values = [*values, *([""] * (len(header) - len(values)))]
+            startnr = startnr_by_athlete.get(resolver.athlete_of(irun, n))
+            if startnr is not None:
+                values[startnr_pos] = str(startnr)
+            writer.writerow(values)
+            n += 1
+    return n
 
 
-    for run in runs:
-        output_filename = run.filename.with_stem(f"{run.filename.stem}_startnr")
-        typer.echo(f"Writing output to {output_filename}")
-        with open(output_filename, 'w', encoding=CSV_OUTPUT_ENCODING) as csvfile:
-            writer = csv.DictWriter(csvfile, dialect='excel', delimiter=';', fieldnames=run.header_keys)
-
-            writer.writeheader()
-            writer.writerows(run.data)
+def main(
+    oe_input_filenames: List[Path]=typer.Argument(..., help="File CSV con iscrizioni OE"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    with measure_run("define_common_startnr", report_filename, profile, trace_memory) as report:
+        resolver = IdentityResolver()
+        runs: List[Run] = []
+        for irun, input_filename in enumerate(oe_input_filenames):
+            typer.echo(f"Reading entries from CSV file {input_filename}")
+            with report.stage(f"link_entries/{input_filename.stem}") as st:
+                run = Run(input_filename, add_entries(resolver, irun, iter_key_values(input_filename)))
+                st.rows_out = run.entries
+                st.indexes = {"keys": len(resolver.key_ids), "athletes": len(resolver.athletes)}
+            typer.secho(f"Number of enties {run.entries}", fg=typer.colors.BLUE)
+            runs.append(run)
+        typer.secho(f"Total number of enties {len(resolver.athletes)}", fg=typer.colors.BLUE)
+        _report_links(resolver, runs)
+
+        with report.stage("define_common_startnr", rows_in=len(resolver.athletes)) as st:
+            startnr_by_athlete = assign_startnr(resolver)
+            st.rows_out = len(startnr_by_athlete)
+
+        for irun, run in enumerate(runs):
+            output_filename = run.filename.with_stem(f"{run.filename.stem}_startnr")
+            typer.echo(f"Writing output to {output_filename}")
+            with report.stage(f"write_output/{run.filename.stem}", rows_in=run.entries) as st:
+                st.rows_out = write_startnr(run.filename, output_filename, resolver, irun, startnr_by_athlete)
 
 
 if __name__ == '__main__':
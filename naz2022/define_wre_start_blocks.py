@@ -1,120 +1,120 @@
 #!/usr/bin/env python3
 
 import csv
-import math
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 import typer
 
-import pandas as pd
-from rich.console import Console
-from rich.table import Table
+from ingest import Source, load_sources, read_oe_entries
+from oe_entries import EntryTable
+from iof_ranking import DEFAULT_STORE, RankingStore
+from start_blocks import ClassSeeding, RankingSource, assign_start_blocks
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
 
-console = Console()
-
-
-CSV_INPUT_ENCODING = 'ISO-8859-1'
-CSV_OUTPUT_ENCODING = 'ISO-8859-1'
+if TYPE_CHECKING:
+    import pandas as pd
 
 WRE_INPUT_ENCODING = 'UTF8'
 WRE_OUTPUT_ENCODING = 'UTF8'
 
-from oe_columns.it import *
-INDEX_COLS = (SICARD_FIELD, SOLVNR_FIELD, IOFID_FIELD)
+INDEX_COLS = ("SICARD", "SOLVNR", "IOFID")
 
 BLOCK_SIZE = 10
 MEN_CATEGORIES = ["H20", "HE"]
 WOMEN_CATEGORIES = ["D20", "DE"]
 
 
-def main(
-    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
-    men_ranking: Path=typer.Option(..., help="CSV con ranking maschile"),
-    women_ranking: Path=typer.Option(..., help="CSV con ranking femminile"),
-    output_filename: Path=typer.Option(..., "--output", help="File CSV di output")
-    ):
-    
-    typer.echo(f"Reading entries from CSV file {oe_input_filename}")
-    with open(oe_input_filename, encoding=CSV_INPUT_ENCODING) as csvfile:
+def load_ranking(ranking_filename: Path, label: str):
+    typer.echo(f"Reading {label} ranking from CSV file {ranking_filename}")
+    with open(ranking_filename, encoding=WRE_INPUT_ENCODING) as csvfile:
         reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
         
-        data = []
-        header_keys = None
-        data_by_index = {ix: {} for ix in INDEX_COLS}
+        ranking_by_iof = {}
         for i, row in enumerate(reader):
-            if not header_keys: header_keys = list(row.keys())
-            data.append(row)
-            
-            for ix in INDEX_COLS:
-                if row[ix] != "0" and row[ix] != "":
-                    data_by_index[ix][row[ix]] = i
-
-    typer.echo(f"Reading men ranking from CSV file {men_ranking}")
-    with open(men_ranking, encoding=WRE_INPUT_ENCODING) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
-        
-        men_ranking_by_iof = {}
-        for i, row in enumerate(reader):
-            men_ranking_by_iof[row["IOF ID"]] = int(row["WRS Position"])
+            ranking_by_iof[row["IOF ID"]] = int(row["WRS Position"])
+    return ranking_by_iof
+
+
+def load_store_rankings(data: EntryTable, ranking_store: Path, men_list: str, women_list: str, snapshot: Optional[str] = None):
+    """Ranks of the athletes in `data` from the ranking store, in one query per list."""
+    typer.echo(f"Reading {men_list} and {women_list} rankings from store {ranking_store}")
+    store = RankingStore(ranking_store)
+    iof_ids = set(data.column("IOFID"))
+    rankings = (store.ranks(men_list, iof_ids, snapshot), store.ranks(women_list, iof_ids, snapshot))
+    store.close()
+    return rankings
+
+
+def define_wre_start_blocks(data: EntryTable, men_ranking_by_iof, women_ranking_by_iof):
+    """
+    Assign the reverse-ranking start blocks of the elite classes in `data`.
+    Returns the report.
+    """
+    sources = {
+        "men": RankingSource(men_ranking_by_iof, "IOFID", is_iof=True),
+        "women": RankingSource(women_ranking_by_iof, "IOFID", is_iof=True),
+    }
+    seedings = {
+        **{className: ClassSeeding("men", BLOCK_SIZE) for className in MEN_CATEGORIES},
+        **{className: ClassSeeding("women", BLOCK_SIZE) for className in WOMEN_CATEGORIES},
+    }
+    return assign_start_blocks(data, seedings, sources)
+
+
+def wre_report_filename(output_filename: Path) -> Path:
+    return output_filename.with_stem(f"{output_filename.stem}_report").with_suffix(".xlsx")
+
+
+def write_report(df: "pd.DataFrame", output_filename: Path):
+    import pandas as pd
 
-    typer.echo(f"Reading women ranking from CSV file {women_ranking}")
-    with open(women_ranking, encoding=WRE_INPUT_ENCODING) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
-        
-        women_ranking_by_iof = {}
-        for i, row in enumerate(reader):
-            women_ranking_by_iof[row["IOF ID"]] = int(row["WRS Position"])
-
-
-    reportData = []
-    for classesList, ranking_by_iof in ((MEN_CATEGORIES, men_ranking_by_iof), (WOMEN_CATEGORIES, women_ranking_by_iof)):
-        for className in classesList:
-            typer.secho(f"Processing class {className}...", fg=typer.colors.BLUE)
-            classEntries = []
-            for i, row in enumerate(data):
-                if row[CLASS_FIELD] == className:
-                    worldRank = ranking_by_iof.get(row[IOFID_FIELD], 999999)
-                    classEntries.append({
-                        "ix": i,
-                        "iofId": row[IOFID_FIELD],
-                        "worldRank": worldRank,
-                        "block": 1,
-                    })
-            
-
-            maxBlock = math.ceil((len(classEntries) / BLOCK_SIZE)) * 2 + 1
-            currentBlock = maxBlock
-            classEntries.sort(key=lambda x: x["worldRank"])
-            for i, entry in enumerate(classEntries):
-                if i % BLOCK_SIZE == 0:
-                    currentBlock -= 2
-                entry["block"] = currentBlock
-                data[entry["ix"]][BLOCK_FIELD] = str(currentBlock)
-                data[entry["ix"]][IOFRANK_FIELD] = str(entry["worldRank"])
-                data[entry["ix"]][DBRANK_FIELD] = str(entry["worldRank"])
-                reportData.append({
-                    "Class": className,
-                    "IOF ID": str(entry["iofId"]),
-                    "Name": f"{data[entry['ix']][FAMILY_NAME_FIELD]} {data[entry['ix']][GIVEN_NAME_FIELD]}",
-                    "Rank": str(entry["worldRank"]),
-                    "StartBlock": str(currentBlock),
-                })
-
-            typer.secho(f"Class {className} finished with block {currentBlock} from max block {maxBlock} and {len(classEntries)} entries.", fg=typer.colors.GREEN)
-
-    df = pd.DataFrame(reportData)
     with pd.option_context('display.max_rows', None, 'display.max_columns', None):
         print(df)
-    report_filename = output_filename.with_stem(f"{output_filename.stem}_report").with_suffix(".xlsx")
-    typer.echo(f"Writing report to {report_filename}")
-    df.to_excel(report_filename, index=False)
+    filename = wre_report_filename(output_filename)
+    typer.echo(f"Writing report to {filename}")
+    df.to_excel(filename, index=False)
 
-    typer.echo(f"Writing output to {output_filename}")
-    with open(output_filename, 'w', encoding=CSV_OUTPUT_ENCODING) as csvfile:
-        writer = csv.DictWriter(csvfile, dialect='excel', delimiter=';', fieldnames=header_keys)
 
-        writer.writeheader()
-        writer.writerows(data)
+def main(
+    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
+    men_ranking: Optional[Path]=typer.Option(None, help="CSV con ranking maschile"),
+    women_ranking: Optional[Path]=typer.Option(None, help="CSV con ranking femminile"),
+    ranking_store: Path=typer.Option(DEFAULT_STORE, help="Ranking store, used when the CSV rankings are not given"),
+    men_list: str=typer.Option("MEN_F", help="Men list in the ranking store"),
+    women_list: str=typer.Option("WOMEN_F", help="Women list in the ranking store"),
+    snapshot: Optional[str]=typer.Option(None, help="Use the latest ranking snapshot up to this date (YYYY-MM-DD)"),
+    output_filename: Path=typer.Option(..., "--output", help="File CSV di output"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    with measure_run("define_wre_start_blocks", report_filename, profile, trace_memory) as report:
+        csv_rankings = bool(men_ranking and women_ranking)
+        inputs = load_sources([
+            Source("oe_entries", read_oe_entries, (oe_input_filename, INDEX_COLS)),
+            Source("men_ranking", load_ranking, (men_ranking, "men")) if csv_rankings else None,
+            Source("women_ranking", load_ranking, (women_ranking, "women")) if csv_rankings else None,
+        ], report)
+        data = inputs["oe_entries"]
+
+        if csv_rankings:
+            men_ranking_by_iof, women_ranking_by_iof = inputs["men_ranking"], inputs["women_ranking"]
+        else:
+            # The store is queried for the athletes of the entries only
+            with report.stage("load_rankings") as st:
+                men_ranking_by_iof, women_ranking_by_iof = load_store_rankings(data, ranking_store, men_list, women_list, snapshot)
+                st.rows_out = len(men_ranking_by_iof) + len(women_ranking_by_iof)
+
+        with report.stage("define_wre_start_blocks", rows_in=len(data)) as st:
+            df = define_wre_start_blocks(data, men_ranking_by_iof, women_ranking_by_iof)
+            st.rows_out = len(df)
+        with report.stage("write_report", rows_in=len(df)):
+            write_report(df, output_filename)
+
+        typer.echo(f"Writing output to {output_filename}")
+        with report.stage("write_output", rows_in=len(data)):
+            data.write(output_filename)
 
 
 if __name__ == '__main__':
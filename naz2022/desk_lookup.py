@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Lookup service of the SOLV DB for the registration desk.
+
+Serves type-ahead searches of the runners over HTTP/JSON on the local network,
+so that the desk laptops find the SOLV number (and the whole record of a late
+entry) from a few letters of the name, the club, the birth year or the SI-card:
+
+    python desk_lookup.py --solv-db data/solv-competitors.csv --host 0.0.0.0 --port 8022
+
+    GET /search?q=mull han 1985     runners matching every word of the query
+    GET /search?family=mull&year=1985&club=bern
+    GET /runner/<SOLV number>       one runner
+    GET /health                     number of runners and source file
+
+The words of `q` are matched as prefixes of the normalized name and club
+tokens (accents and umlaut spellings folded, see fuzzy_match.fold_name), a 4-digit
+word as birth year and a longer number as SI-card or SOLV number. A word
+matching no token as prefix falls back to the tokens sharing most of its
+trigrams, so that a typo still finds the runner. The index is built in
+memory once at startup and only read afterwards, the requests are served by
+one thread each. Every runner is returned with the ENTRY_DB_FIELDS of
+add_late_entries.py, keyed by the SOLV DB column names.
+
+The responses carry no CORS header, so a page of another site opened on a
+desk laptop cannot read the runners. A page of the desk served from another
+origin is allowed with `--allow-origin http://<host>:<port>`.
+"""
+
+from array import array
+from bisect import bisect_left
+import heapq
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import typer
+
+from add_late_entries import ENTRY_DB_FIELDS
+from fuzzy_match import fold_name
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+from solv_db import BIRTH_FIELD, FAMILY_NAME_FIELD, GIVEN_NAME_FIELD, SICARD_FIELD, SOLVNR_FIELD, SolvDB
+
+
+CLUB_FIELD = "Ort"
+SEARCH_LIMIT = 20
+MAX_LIMIT = 200
+# Dice coefficient of the trigrams of a misspelled word and of a token
+TRIGRAM_THRESHOLD = 0.6
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _TokenIndex:
+    """Sorted tokens with the runners of each one, searched by prefix or trigrams."""
+
+    def __init__(self, postings: Dict[str, List[int]]):
+        self.tokens = sorted(postings)
+        self.runners = [array("i", postings[t]) for t in self.tokens]
+        self._trigrams: Dict[str, List[int]] = {}
+        self._ntrigrams = array("i")
+        for k, token in enumerate(self.tokens):
+            trigrams = _trigrams(token)
+            self._ntrigrams.append(len(trigrams))
+            for trigram in trigrams:
+                self._trigrams.setdefault(trigram, []).append(k)
+
+    def prefix(self, prefix: str) -> range:
+        """Positions of the tokens starting with `prefix`."""
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + "\uffff", start)
+        return range(start, end)
+
+    def similar(self, word: str) -> List[int]:
+        """Positions of the tokens sharing most trigrams with `word`."""
+        trigrams = _trigrams(word)
+        shared: Dict[int, int] = {}
+        for trigram in trigrams:
+            for k in self._trigrams.get(trigram, ()):
+                shared[k] = shared.get(k, 0) + 1
+        return [
+            k for k, n in shared.items()
+            if 2 * n / (len(trigrams) + self._ntrigrams[k]) >= TRIGRAM_THRESHOLD
+        ]
+
+    def match(self, word: str) -> Tuple[Set[int], Set[int]]:
+        """Runners with a token starting with `word` (or similar to it), and those with `word` as whole token."""
+        positions = self.prefix(word)
+        if not positions and len(word) >= 3:
+            positions = self.similar(word)
+        found: Set[int] = set()
+        exact: Set[int] = set()
+        for k in positions:
+            found.update(self.runners[k])
+            if self.tokens[k] == word:
+                exact.update(self.runners[k])
+        return found, exact
+
+
+class RunnerIndex:
+    """In-memory search index over the runners of the SOLV DB."""
+
+    def __init__(self, rows: Iterable[dict]):
+        self.records: List[Tuple[str, ...]] = []
+        self._names: List[str] = []
+        self._years: List[str] = []
+        self._by_year: Dict[str, List[int]] = {}
+        self._by_solvnr: Dict[str, int] = {}
+        self._by_sicard: Dict[str, List[int]] = {}
+        name_postings: Dict[str, List[int]] = {}
+        club_postings: Dict[str, List[int]] = {}
+        family_postings: Dict[str, List[int]] = {}
+
+        for i, row in enumerate(rows):
+            self.records.append(tuple(row.get(k, "") for k in ENTRY_DB_FIELDS))
+            self._names.append(f"{fold_name(row[FAMILY_NAME_FIELD])} {fold_name(row[GIVEN_NAME_FIELD])}")
+            self._years.append(row[BIRTH_FIELD])
+            self._by_year.setdefault(row[BIRTH_FIELD], []).append(i)
+            # The last occurrence wins, as with SolvDB.get
+            self._by_solvnr[row[SOLVNR_FIELD]] = i
+            if row[SICARD_FIELD] not in ("", "0"):
+                self._by_sicard.setdefault(row[SICARD_FIELD], []).append(i)
+            family_tokens = set(fold_name(row[FAMILY_NAME_FIELD]).split())
+            for token in family_tokens:
+                family_postings.setdefault(token, []).append(i)
+            for token in family_tokens | set(fold_name(row[GIVEN_NAME_FIELD]).split()):
+                name_postings.setdefault(token, []).append(i)
+            for token in set(fold_name(row.get(CLUB_FIELD, "")).split()):
+                club_postings.setdefault(token, []).append(i)
+
+        self._name_index = _TokenIndex(name_postings)
+        self._family_index = _TokenIndex(family_postings)
+        self._club_index = _TokenIndex(club_postings)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def record(self, i: int) -> dict:
+        return dict(zip(ENTRY_DB_FIELDS, self.records[i]))
+
+    def get(self, solvnr: str) -> Optional[dict]:
+        i = self._by_solvnr.get(solvnr)
+        return None if i is None else self.record(i)
+
+    def _number(self, word: str) -> Set[int]:
+        found = set(self._by_sicard.get(word, ()))
+        i = self._by_solvnr.get(word)
+        if i is not None:
+            found.add(i)
+        return found
+
+    def search(
+        self,
+        query: str = "",
+        family_name: str = "",
+        given_name: str = "",
+        club: str = "",
+        birth_year: str = "",
+        sicard: str = "",
+        limit: int = SEARCH_LIMIT,
+    ) -> List[dict]:
+        """
+        Runners matching every word of `query` and every given field, the
+        runners matching more words exactly first, then by name.
+        """
+        # (candidates, exact matches) of every condition
+        conditions: List[Tuple[Set[int], Set[int]]] = []
+        for word in query.split():
+            if word.isdigit() and len(word) == 4:
+                found = set(self._by_year.get(word, ()))
+                conditions.append((found, found))
+            elif word.isdigit() or word in self._by_solvnr:
+                found = self._number(word)
+                conditions.append((found, found))
+            else:
+                for token in fold_name(word).split():
+                    name_found, name_exact = self._name_index.match(token)
+                    club_found, _ = self._club_index.match(token)
+                    conditions.append((name_found | club_found, name_exact))
+        for token in fold_name(family_name).split():
+            conditions.append(self._family_index.match(token))
+        for token in fold_name(given_name).split():
+            conditions.append(self._name_index.match(token))
+        for token in fold_name(club).split():
+            conditions.append(self._club_index.match(token))
+        if birth_year:
+            found = set(self._by_year.get(birth_year, ()))
+            conditions.append((found, found))
+        if sicard:
+            found = set(self._by_sicard.get(sicard, ()))
+            conditions.append((found, found))
+        if not conditions:
+            return []
+
+        conditions.sort(key=lambda c: len(c[0]))
+        runners = set(conditions[0][0])
+        for found, _ in conditions[1:]:
+            runners &= found
+            if not runners:
+                return []
+        ranked = heapq.nsmallest(limit, runners, key=lambda i: (-sum(i in exact for _, exact in conditions), self._names[i], self._years[i]))
+        return [self.record(i) for i in ranked]
+
+
+class DeskHandler(BaseHTTPRequestHandler):
+    """JSON API over the RunnerIndex of the server."""
+
+    server_version = "naz2022-desk-lookup"
+
+    def _send_json(self, status: int, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("UTF8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.allow_origin:
+            self.send_header("Access-Control-Allow-Origin", self.server.allow_origin)
+            self.send_header("Vary", "Origin")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        index: RunnerIndex = self.server.index
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/search":
+            try:
+                limit = min(int(params.get("limit", SEARCH_LIMIT)), MAX_LIMIT)
+            except ValueError:
+                self._send_json(400, {"error": "limit must be a number"})
+                return
+            runners = index.search(
+                params.get("q", ""),
+                family_name=params.get("family", ""),
+                given_name=params.get("given", ""),
+                club=params.get("club", ""),
+                birth_year=params.get("year", ""),
+                sicard=params.get("sicard", ""),
+                limit=limit,
+            )
+            self._send_json(200, {"count": len(runners), "runners": runners})
+        elif url.path.startswith("/runner/"):
+            runner = index.get(unquote(url.path[len("/runner/"):]))
+            if runner is None:
+                self._send_json(404, {"error": "runner not found"})
+            else:
+                self._send_json(200, runner)
+        elif url.path == "/health":
+            self._send_json(200, {"runners": len(index), "solv_db": str(self.server.solv_input_filename)})
+        else:
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(index: RunnerIndex, host: str, port: int, solv_input_filename: Optional[Path] = None, verbose: bool = False, allow_origin: Optional[str] = None) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), DeskHandler)
+    server.daemon_threads = True
+    server.index = index
+    server.solv_input_filename = solv_input_filename
+    server.verbose = verbose
+    server.allow_origin = allow_origin
+    return server
+
+
+def main(
+    solv_input_filename: Path=typer.Option(..., "--solv-db", help="File CSV con DB SOLV"),
+    host: str=typer.Option("127.0.0.1", help="Address to listen on, 0.0.0.0 to serve the other desk laptops"),
+    port: int=typer.Option(8022, help="Port to listen on"),
+    verbose: bool=typer.Option(False, help="Log every request"),
+    allow_origin: Optional[str]=typer.Option(None, help="Origin of a web page allowed to query the service (CORS), e.g. http://desk1:8080. Default: none"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    """Serve the SOLV DB lookups of the registration desk."""
+    # The report covers the startup, the server runs until stopped
+    with measure_run("desk_lookup", report_filename, profile, trace_memory) as report:
+        typer.echo(f"Opening SOLV DB index for CSV file {solv_input_filename}")
+        with report.stage("build_search_index") as st:
+            db = SolvDB.open(solv_input_filename)
+            index = RunnerIndex(db.rows())
+            db.close()
+            st.rows_out = len(index)
+
+    server = make_server(index, host, port, solv_input_filename, verbose, allow_origin)
+    typer.secho(f"Serving {len(index)} runners on http://{host}:{port}/search?q=..., Ctrl-C to stop", fg=typer.colors.GREEN)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        typer.echo("Stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Draw the start lists of all the classes, instead of drawing them in OE.
+
+Reads the OE entries (with the start blocks of define_wre_start_blocks.py or
+start_blocks.py) and writes the same CSV with the start time of every runner,
+ready to be imported in OE. The classes are described by a JSON file:
+
+    {
+        "capacity": 6,
+        "default": {"start": "START 1", "interval": 1},
+        "classes": {
+            "HE": {"start": "START 1", "course": "1", "interval": 2, "first_start": "00:30:00"},
+            "H20": {"start": "START 1", "course": "1", "interval": 2},
+            "HAK": {"start": "START 2"}
+        }
+    }
+
+Classes missing from "classes" use "default"; a class without "course" has
+its own course. Intervals are in minutes.
+
+The draw is done in two steps:
+
+- order within each class: by block (lower blocks first, so the best WRE
+  block starts last), randomly within a block, with no two consecutive
+  runners of the same club whenever the club sizes allow it;
+- start times: the classes, longest first, get the earliest first start
+  from which all their starters fit, with at most one starter per minute on
+  each course (classes sharing a course are interleaved) and at most
+  `capacity` starters per minute at each start.
+
+With `--keep-drawn`, the runners which already have a start time (e.g. in the
+start list exported from OE before adding the late entries) keep it, and the
+others (the late entries) take the free minutes of their class within the
+time range of their block: after the drawn runners of the lower blocks and
+before those of the higher blocks, so the block order is kept. When the
+range of a block is full, its late entries start after the last drawn runner
+and are reported.
+"""
+
+from dataclasses import dataclass, field
+import json
+import random
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import typer
+
+import oe_columns
+from oe_entries import EntryTable
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+START_CAPACITY = 6
+DEFAULT_INTERVAL = 1
+
+# Column IDs of oe_columns
+CLASS_FIELD = "CLASS"
+BLOCK_FIELD = "BLOCK"
+FAMILY_NAME_FIELD = "FAMILY_NAME"
+CLUB_FIELD = "CLUB"
+START_FIELD = "START"
+
+
+@dataclass
+class ClassDraw:
+    name: str
+    start: str
+    course: str
+    interval: int
+    first_start: int
+    # Rows to draw, in start order once ordered
+    rows: List[int] = field(default_factory=list)
+    # Rows keeping their start time, with --keep-drawn
+    fixed: List[int] = field(default_factory=list)
+    # Start minute of each of `rows`
+    times: List[int] = field(default_factory=list)
+    # Late entries which found no free minute in the time range of their block
+    out_of_block: List[int] = field(default_factory=list)
+
+
+def _minutes(value: str) -> int:
+    parts = value.split(":")
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+def _start_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def _block(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
+def load_config(config_filename: Optional[Path]) -> dict:
+    if not config_filename:
+        return {}
+    with open(config_filename, encoding="UTF8") as f:
+        return json.load(f)
+
+
+def make_classes(data: EntryTable, config: dict, keep_drawn: bool = False) -> Dict[str, ClassDraw]:
+    """Runners to draw grouped by class, in the order of the OE file."""
+    default = config.get("default", {})
+    class_configs = config.get("classes", {})
+    starts = data.column(START_FIELD) if keep_drawn else None
+
+    classes: Dict[str, ClassDraw] = {}
+    for i, class_name in enumerate(data.column(CLASS_FIELD)):
+        if not class_name:
+            continue
+        cls = classes.get(class_name)
+        if cls is None:
+            cfg = {**default, **class_configs.get(class_name, {})}
+            cls = classes[class_name] = ClassDraw(
+                class_name,
+                start=cfg.get("start", ""),
+                course=cfg.get("course", class_name),
+                interval=int(cfg.get("interval", DEFAULT_INTERVAL)),
+                first_start=_minutes(cfg.get("first_start", "00:00:00")),
+            )
+        if starts is not None and starts[i]:
+            cls.fixed.append(i)
+        else:
+            cls.rows.append(i)
+    return classes
+
+
+def order_class(rows: List[int], blocks: List[int], clubs: List[Optional[str]], rng: random.Random, prev_club: Optional[str] = None) -> List[int]:
+    """
+    Start order of the runners of a class: by block, then at each position a
+    random runner among those not of the previous runner's club. A club
+    having more than half of the remaining runners is taken first, so that
+    its runners can still be separated. Runners without a club (`None`)
+    never clash.
+    """
+    by_block: Dict[int, List[int]] = {}
+    for i in rows:
+        by_block.setdefault(blocks[i], []).append(i)
+
+    order = []
+    for block in sorted(by_block):
+        by_club: Dict[Optional[str], List[int]] = {}
+        for i in by_block[block]:
+            by_club.setdefault(clubs[i], []).append(i)
+        for runners in by_club.values():
+            rng.shuffle(runners)
+
+        remaining = len(by_block[block])
+        while remaining:
+            largest = max((c for c in by_club if c is not None), key=lambda c: len(by_club[c]), default=None)
+            if largest is not None and largest != prev_club and 2 * len(by_club[largest]) > remaining:
+                club = largest
+            else:
+                eligible = [c for c in by_club if c is None or c != prev_club] or list(by_club)
+                pick = rng.randrange(sum(len(by_club[c]) for c in eligible))
+                for club in eligible:
+                    if pick < len(by_club[club]):
+                        break
+                    pick -= len(by_club[club])
+            order.append(by_club[club].pop())
+            if not by_club[club]:
+                del by_club[club]
+            prev_club = club
+            remaining -= 1
+    return order
+
+
+class StartGrid:
+    """Starters per minute at each start and occupied minutes of each course."""
+
+    def __init__(self, horizon: int, capacity: int):
+        self.horizon = horizon
+        self.capacity = capacity
+        self.starters: Dict[str, "np.ndarray"] = {}
+        self.busy: Dict[str, "np.ndarray"] = {}
+
+    def _starters(self, start: str) -> "np.ndarray":
+        import numpy as np
+
+        if start not in self.starters:
+            self.starters[start] = np.zeros(self.horizon, dtype=np.int32)
+        return self.starters[start]
+
+    def _busy(self, course: str) -> "np.ndarray":
+        import numpy as np
+
+        if course not in self.busy:
+            self.busy[course] = np.zeros(self.horizon, dtype=bool)
+        return self.busy[course]
+
+    def blocked(self, cls: ClassDraw) -> "np.ndarray":
+        """Minutes at which a runner of the class cannot start."""
+        return (self._starters(cls.start) >= self.capacity) | self._busy(cls.course)
+
+    def take(self, cls: ClassDraw, minutes):
+        import numpy as np
+
+        minutes = np.asarray(minutes, dtype=np.int64)
+        np.add.at(self._starters(cls.start), minutes, 1)
+        self._busy(cls.course)[minutes] = True
+
+    def first_fit(self, cls: ClassDraw, n: int, not_before: int) -> int:
+        """Earliest minute from which `n` starters fit at the interval of the class."""
+        import numpy as np
+
+        d = cls.interval
+        blocked = np.concatenate((self.blocked(cls), np.zeros(n * d, dtype=bool)))
+        conflicts = np.zeros(self.horizon, dtype=np.int32)
+        for k in range(n):
+            conflicts += blocked[k * d:k * d + self.horizon]
+        return not_before + int(np.flatnonzero(conflicts[not_before:] == 0)[0])
+
+
+def place_late_entries(cls: ClassDraw, blocks: List[int], fixed_times: Dict[int, int], blocked: "np.ndarray"):
+    """
+    Start times of the late entries `cls.rows` (ordered) of a class with drawn
+    runners: the earliest free minutes on the grid of the class after the
+    drawn runners of the lower blocks and before those of the higher blocks.
+    """
+    base = min(fixed_times[i] for i in cls.fixed)
+    last = max(fixed_times[i] for i in cls.fixed)
+    taken = set()
+    t = base
+    for i in cls.rows:
+        lower = [fixed_times[j] for j in cls.fixed if blocks[j] < blocks[i]]
+        higher = [fixed_times[j] for j in cls.fixed if blocks[j] > blocks[i]]
+        t = max(t, max(lower) + cls.interval if lower else base)
+        end = min(higher) if higher else len(blocked)
+        while t < end and (blocked[t] or t in taken):
+            t += cls.interval
+        if t >= end:
+            # Range of the block full: after all the drawn runners
+            cls.out_of_block.append(i)
+            t = max([last, *taken]) + cls.interval
+            while blocked[t]:
+                t += cls.interval
+        cls.times.append(t)
+        taken.add(t)
+        t += cls.interval
+
+
+def draw(data: EntryTable, classes: Dict[str, ClassDraw], capacity: int = START_CAPACITY, seed: Optional[int] = None) -> int:
+    """
+    Order the runners of every class and set their start time in `data`.
+    Returns the number of consecutive runners of the same club left.
+    """
+    rng = random.Random(seed)
+    blocks = [_block(b) for b in data.column(BLOCK_FIELD)]
+    vacant = data.column(FAMILY_NAME_FIELD)
+    club_column = data.column(CLUB_FIELD) if CLUB_FIELD in data else [""] * len(data)
+    clubs = [
+        None if club in ("", "0") or name == data.vacancy_name else club
+        for club, name in zip(club_column, vacant)
+    ]
+    starts = data.column(START_FIELD)
+
+    fixed_times = {i: _minutes(starts[i]) for cls in classes.values() for i in cls.fixed}
+    # Every blocked minute has a starter, so all fit before this
+    horizon = max([cls.first_start for cls in classes.values()] + list(fixed_times.values()) + [0]) + 1
+    horizon += len(data) * max([cls.interval for cls in classes.values()] + [1])
+    grid = StartGrid(horizon, capacity)
+    for cls in classes.values():
+        if cls.fixed:
+            grid.take(cls, [fixed_times[i] for i in cls.fixed])
+
+    same_club = 0
+    for cls in sorted(classes.values(), key=lambda c: (-len(c.rows) * c.interval, c.name)):
+        if not cls.rows:
+            continue
+        if cls.fixed:
+            last = max(cls.fixed, key=fixed_times.__getitem__)
+            cls.rows = order_class(cls.rows, blocks, clubs, rng, prev_club=clubs[last])
+            place_late_entries(cls, blocks, fixed_times, grid.blocked(cls))
+        else:
+            cls.rows = order_class(cls.rows, blocks, clubs, rng)
+            first = grid.first_fit(cls, len(cls.rows), cls.first_start)
+            cls.times = [first + k * cls.interval for k in range(len(cls.rows))]
+        grid.take(cls, cls.times)
+
+        for i, t in zip(cls.rows, cls.times):
+            data.set(i, START_FIELD, _start_time(t))
+        times = {**fixed_times, **dict(zip(cls.rows, cls.times))}
+        order = sorted(cls.fixed + cls.rows, key=times.__getitem__)
+        same_club += sum(1 for a, b in zip(order, order[1:]) if clubs[a] is not None and clubs[a] == clubs[b])
+    return same_club
+
+
+def print_summary(classes: Dict[str, ClassDraw], data: EntryTable):
+    starts = data.column(START_FIELD)
+    for cls in sorted(classes.values(), key=lambda c: c.name):
+        times = sorted(starts[i] for i in cls.rows + cls.fixed)
+        if times:
+            typer.echo(f"Class {cls.name:6} {cls.start:8} {len(times):4} starters  {times[0]} - {times[-1]}  every {cls.interval} min")
+
+
+def main(
+    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
+    config_filename: Optional[Path]=typer.Option(None, "--config", help="JSON file with start, course, interval and first start of the classes"),
+    language: Optional[str]=typer.Option(None, help="Language of the OE export (de, it). Default: detected from the header"),
+    capacity: Optional[int]=typer.Option(None, help="Maximum number of starters per minute at a start. Default: from the config, else 6"),
+    keep_drawn: bool=typer.Option(False, help="Keep the start time of the runners which have one, draw only the others"),
+    seed: Optional[int]=typer.Option(None, help="Seed of the random draw, to repeat it"),
+    output_filename: Path=typer.Option(..., "--output", help="File CSV di output"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    config = load_config(config_filename)
+    with measure_run("draw_startlist", report_filename, profile, trace_memory) as report:
+        typer.echo(f"Reading entries from CSV file {oe_input_filename}")
+        with report.stage("read_oe_entries") as st:
+            data = EntryTable.read(oe_input_filename, index_cols=(), columns=oe_columns.load(language) if language else None)
+            st.rows_out = len(data)
+
+        with report.stage("draw", rows_in=len(data)) as st:
+            classes = make_classes(data, config, keep_drawn)
+            same_club = draw(data, classes, capacity or config.get("capacity", START_CAPACITY), seed)
+            st.rows_out = sum(len(cls.rows) for cls in classes.values())
+        print_summary(classes, data)
+        typer.secho(f"Drew {st.rows_out} runners in {len(classes)} classes", fg=typer.colors.GREEN)
+        if same_club:
+            typer.secho(f"{same_club} consecutive starters of the same club could not be separated", fg=typer.colors.YELLOW)
+        for cls in sorted(classes.values(), key=lambda c: c.name):
+            if cls.out_of_block:
+                typer.secho(f"Class {cls.name}: no free minute in the range of their block for {len(cls.out_of_block)} late entries, they start after the drawn runners", fg=typer.colors.YELLOW)
+
+        typer.echo(f"Writing output to {output_filename}")
+        with report.stage("write_output", rows_in=len(data)):
+            data.write(output_filename)
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
@@ -1,35 +1,36 @@
 #!/usr/bin/env python3
 
-import csv
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import datetime
-import pandas as pd
+import json
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterator, List, Optional, Set
 
 import typer
 
-
-CSV_INPUT_ENCODING = 'ISO-8859-1'
-CSV_OUTPUT_ENCODING = 'ISO-8859-1'
-
-CLASSES_FILE = "resources/solv-classes.csv"
-
-from oe_columns.it import *
+from oe_entries import EntryTable
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+from workbook import write_sheet
+
+
+# Column IDs of oe_columns, the runs can be exported in any language
+SICARD_FIELD = "SICARD"
+SOLVNR_FIELD = "SOLVNR"
+IOFID_FIELD = "IOFID"
+STARTNR_FIELD = "STARTNR"
+START_FIELD = "START"
+CLASS_FIELD = "CLASS"
+FAMILY_NAME_FIELD = "FAMILY_NAME"
+GIVEN_NAME_FIELD = "GIVEN_NAME"
+BIRTH_FIELD = "BIRTH"
 INDEX_COLS = (SICARD_FIELD, SOLVNR_FIELD, IOFID_FIELD, STARTNR_FIELD)
+NAME_FIELDS = (FAMILY_NAME_FIELD, GIVEN_NAME_FIELD, BIRTH_FIELD, CLASS_FIELD)
 
-OUTPUT_COLUMNS = (
-    "Startnummer",
-    "Vorname",
-    "Nachname",
-    "Start (Sabato)",
-    "Kategorie (Sabato)",
-    "Startzeit (Sabato)",
-    "Start (Domenica)",
-    "Kategorie (Domenica)",
-    "Startzeit (Domenica)",
-)
+# Columns of every run, after the start number and name
+RUN_COLUMNS = ("Start ({})", "Kategorie ({})", "Startzeit ({})")
+RUN_LABELS = ("Sabato", "Domenica")
 
+# Start of each class, by run. Runs without a mapping have an empty start
 START_MAPPING = {
     0: {
         "HE": "START 1",
@@ -133,124 +134,111 @@ START_MAPPING = {
     },
 }
 
-NameTuple = Tuple[str, str, str]
-
 @dataclass
 class Run:
-    data: List[dict]
-    header_keys: List[str]
-    ix_by_name: Dict[NameTuple, int]
-    ix_by_field: Dict[str, Dict[str, int]]
+    data: EntryTable
     filename: Path
-    zero_time: str
+    label: str = ""
+    start_mapping: Dict[str, str] = field(default_factory=dict)
 
-def _make_name_key(row):
-    return (row[FAMILY_NAME_FIELD], row[GIVEN_NAME_FIELD], row[BIRTH_FIELD], row[CLASS_FIELD])
 
-
-def load_run(input_filename: Path, zero_time: str):
+def load_run(input_filename: Path, zero_time: str, label: str = "", start_mapping: Optional[Dict[str, str]] = None):
     splits = zero_time.split(':')
     time_offset = datetime.timedelta(hours=int(splits[0]), minutes=int(splits[1]))
 
     typer.echo(f"Reading entries from CSV file {input_filename}")
 
-    with open(input_filename, encoding=CSV_INPUT_ENCODING) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
-        
-        data = []
-        header_keys = None
-        data_by_name: Dict[NameTuple, int] = {}
-        data_by_index = {ix: {} for ix in INDEX_COLS}
-        for i, row in enumerate(reader):
-            if not header_keys: header_keys = list(row.keys())
-
-            start_time = datetime.datetime.strptime(row[START_FIELD], '%H:%M:%S')
-            row[START_FIELD] = (time_offset + start_time).strftime('%H:%M')
-            data.append(row)
-            
-            for ix in INDEX_COLS:
-                if row[ix] != "0" and row[ix] != "":
-                    data_by_index[ix][row[ix]] = i
-
-            if row[FAMILY_NAME_FIELD] != VACANCY_NAME:
-                name_key = _make_name_key(row)
-                if name_key in data_by_name:
-                    print("Duplicate", name_key)
-                    raise RuntimeError("Name key is not unique enough")
-                data_by_name[name_key] = i
-
-    return Run(data, header_keys, data_by_name, data_by_index, zero_time, input_filename)
-
-def main(
-    oe_input_filename_1: Path=typer.Option(..., "--oe-input-1", help="CSV file with OE start list for run 1"),
-    zero_time_1: str=typer.Option(..., "--zero-1", help="Zero time for run 1"),
-
-    oe_input_filename_2: Path=typer.Option(..., "--oe-input-2", help="CSV file with OE start list for run 2"),
-    zero_time_2: str=typer.Option(..., "--zero-2", help="Zero time for run 2"),
-
-    output_filename: Path=typer.Option(..., "--output", help="Excel output file")
-    ):
-    
-    runs: List[Run] = []
-    runs.append(load_run(oe_input_filename_1, zero_time_1))
-    runs.append(load_run(oe_input_filename_2, zero_time_2))
-    
-    all_startnr: Set[str] = {
-        *runs[0].ix_by_field[STARTNR_FIELD].keys(),
-        *runs[1].ix_by_field[STARTNR_FIELD].keys(),
-    }
-
-    # "Startnummer",
-    # "Vorname",
-    # "Nachname",
-    # "Start (Sabato)",
-    # "Kategorie (Sabato)",
-    # "Startzeit (Sabato)",
-    # "Start (Domenica)",
-    # "Kategorie (Domenica)",
-    # "Startzeit (Domenica)",
-    output_data = []
-    for startnr in sorted(all_startnr, key=lambda x: int(x)):
-        entry = None
-
-        sa_data = ("", "", "")
-        if startnr in runs[0].ix_by_field[STARTNR_FIELD]:
-            entry = runs[0].data[runs[0].ix_by_field[STARTNR_FIELD][startnr]]
-            sa_data = (
-                START_MAPPING[0][entry[CLASS_FIELD]],
-                entry[CLASS_FIELD],
-                entry[START_FIELD],
-            )
-
-        do_data = ("", "", "")
-        if startnr in runs[1].ix_by_field[STARTNR_FIELD]:
-            entry = runs[1].data[runs[1].ix_by_field[STARTNR_FIELD][startnr]]
-            do_data = (
-                START_MAPPING[1][entry[CLASS_FIELD]],
-                entry[CLASS_FIELD],
-                entry[START_FIELD],
-            )
-        
-        if entry[FAMILY_NAME_FIELD] == VACANCY_NAME:
+    data = EntryTable.read(input_filename, INDEX_COLS, name_fields=NAME_FIELDS, unique_names=True)
+
+    start_times = data.column(START_FIELD)
+    for i, start in enumerate(start_times):
+        start_time = datetime.datetime.strptime(start, '%H:%M:%S')
+        start_times[i] = (time_offset + start_time).strftime('%H:%M')
+
+    return Run(data, input_filename, label, start_mapping or {})
+
+
+def output_columns(runs: List[Run]) -> List[str]:
+    return ["Startnummer", "Vorname", "Nachname", *(c.format(run.label) for run in runs for c in RUN_COLUMNS)]
+
+
+def merge_runs(runs: List[Run]) -> Iterator[list]:
+    """
+    One row per start number, with the start, class and start time of each
+    run; the name is taken from the last run with the start number.
+    """
+    all_startnr: Set[str] = set()
+    for run in runs:
+        all_startnr.update(run.data.ix_by_field[run.data.field_name(STARTNR_FIELD)])
+
+    columns = [
+        (run.data.ix_by_field[run.data.field_name(STARTNR_FIELD)], run.data.column(CLASS_FIELD), run.data.column(START_FIELD), run.start_mapping)
+        for run in runs
+    ]
+    vacancy_names = [run.data.vacancy_name for run in runs]
+    family_names = [run.data.column(FAMILY_NAME_FIELD) for run in runs]
+    given_names = [run.data.column(GIVEN_NAME_FIELD) for run in runs]
+
+    for startnr in sorted(all_startnr, key=int):
+        row = [startnr, "", ""]
+        last = None
+        for r, (by_startnr, classes, starts, start_mapping) in enumerate(columns):
+            ix = by_startnr.get(startnr)
+            if ix is None:
+                row.extend(("", "", ""))
+                continue
+            last = (r, ix)
+            class_name = classes[ix]
+            row.extend((start_mapping.get(class_name, ""), class_name, starts[ix]))
+
+        r, ix = last
+        if family_names[r][ix] == vacancy_names[r]:
             continue
+        row[1] = given_names[r][ix]
+        row[2] = family_names[r][ix]
+        yield row
 
-        output_data.append([
-            startnr,
-            entry[GIVEN_NAME_FIELD],
-            entry[FAMILY_NAME_FIELD],
-            *sa_data,
-            *do_data,
-        ])
-    df = pd.DataFrame(output_data, columns=OUTPUT_COLUMNS)
 
+def load_start_mapping(mapping_filename: Path) -> Dict[str, str]:
+    """Start of each class, from a JSON object {"HE": "START 1", ...}."""
+    with open(mapping_filename, encoding="UTF8") as f:
+        return json.load(f)
 
 
-    typer.echo(f"Writing report to {output_filename}")
-    df.to_excel(output_filename, index=False)
+def main(
+    oe_input_filenames: List[Path]=typer.Option(..., "--oe-input", help="CSV file with the OE start list of a run, repeat for every run"),
+    zero_times: List[str]=typer.Option(..., "--zero", help="Zero time of each run, in the order of --oe-input"),
+    labels: List[str]=typer.Option([], "--label", help="Name of each run in the column headers. Default: Sabato, Domenica, Run 3, ..."),
+    start_mappings: List[Path]=typer.Option([], "--start-mapping", help="JSON file with the start of each class, for each run. Default: the Naz 2022 starts"),
+    output_filename: Path=typer.Option(..., "--output", help="Excel output file"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    if len(zero_times) != len(oe_input_filenames):
+        typer.secho("Give one --zero for each --oe-input", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    for option, values in (("--label", labels), ("--start-mapping", start_mappings)):
+        if values and len(values) != len(oe_input_filenames):
+            typer.secho(f"Give one {option} for each --oe-input", fg=typer.colors.RED)
+            raise typer.Exit(1)
+
+    with measure_run("export_startnr_for_print", report_filename, profile, trace_memory) as report:
+        runs: List[Run] = []
+        for n, (input_filename, zero_time) in enumerate(zip(oe_input_filenames, zero_times)):
+            label = labels[n] if labels else (RUN_LABELS[n] if n < len(RUN_LABELS) else f"Run {n + 1}")
+            start_mapping = load_start_mapping(start_mappings[n]) if start_mappings else START_MAPPING.get(n)
+            with report.stage(f"load_run/{n + 1}") as st:
+                runs.append(load_run(input_filename, zero_time, label, start_mapping))
+                st.rows_out = len(runs[-1].data)
+                st.indexes = runs[-1].data.index_sizes()
+
+        typer.echo(f"Writing report to {output_filename}")
+        with report.stage("write_output", rows_in=sum(len(run.data) for run in runs)) as st:
+            st.rows_out = write_sheet(output_filename, output_columns(runs), merge_runs(runs))
 
 
 if __name__ == '__main__':
     app = typer.Typer(no_args_is_help=True, add_completion=False)
     app.command()(main)
     app()
-
@@ -1,66 +1,75 @@
 #!/usr/bin/env python3
 
-import csv
 from pathlib import Path
+from typing import List, Optional, Sequence
 
-import pandas as pd
 import typer
 
+from ingest import Source, load_sources, read_oe_entries
+from oe_entries import EntryTable
+from workbook import SheetRow, iter_sheet
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
 
-CSV_INPUT_ENCODING = 'ISO-8859-1'
-CSV_OUTPUT_ENCODING = 'ISO-8859-1'
-
-IOFID_FIELD = "Num3"
-SOLVNR_FIELD = "Datenbank Id"
-SICARD_FIELD = "Chipnr"
-GO2OLID_FIELD = "ID"
+# Column IDs of oe_columns, the OE export can be in any language
+IOFID_FIELD = "IOFID"
+SOLVNR_FIELD = "SOLVNR"
+SICARD_FIELD = "SICARD"
+GO2OLID_FIELD = "GO2OLID"
 INDEX_COLS = (SICARD_FIELD, SOLVNR_FIELD, IOFID_FIELD, GO2OLID_FIELD)
 
 
-def main(
-    missing_iof_input_filename: Path=typer.Option(..., "--missing-iof", help="File Excel with manual matches for IOF ID"),
-    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
-    output_filename: Path=typer.Option(..., "--output", help="File CSV di output")
-    ):
-    
-    typer.echo(f"Reading entries from CSV file {oe_input_filename}")
-    with open(oe_input_filename, encoding=CSV_INPUT_ENCODING) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
-        
-        data = []
-        header_keys = None
-        data_by_index = {ix: {} for ix in INDEX_COLS}
-        for i, row in enumerate(reader):
-            if not header_keys: header_keys = list(row.keys())
-            data.append(row)
-            
-            for ix in INDEX_COLS:
-                if row[ix] != "0" and row[ix] != "":
-                    data_by_index[ix][row[ix]] = i
-
+def read_missing_iof(missing_iof_input_filename: Path) -> List[SheetRow]:
     typer.echo(f"Reading IOF mapping from file {missing_iof_input_filename}")
-    late_data = pd.read_excel(missing_iof_input_filename, skiprows=2)
-    for _, entry in late_data.iterrows():
-        if not pd.isna(entry["IOF ID"]) and not entry["IOF ID"] == "NA":
+    return list(iter_sheet(missing_iof_input_filename, skiprows=2))
+
+
+def fix_missing_iof(data: EntryTable, missing_iof_input_filename: Path, entries: Optional[Sequence[SheetRow]] = None):
+    """
+    Set the IOF ID of the entries listed in the manual matches file, or
+    given as its `entries` (see read_missing_iof).
+    """
+    if entries is None:
+        typer.echo(f"Reading IOF mapping from file {missing_iof_input_filename}")
+        entries = iter_sheet(missing_iof_input_filename, skiprows=2)
+    for entry in entries:
+        # "NA" (no IOF ID found) is read as None
+        if entry["IOF ID"] is not None:
             typer.secho(f"Matching IOF ID {entry['IOF ID']} for {entry['Nachname']} {entry['Vorname']}", fg=typer.colors.GREEN)
             exportId = str(entry["Export-ID"])
             # print("Export-ID",exportId)
-            if not exportId in data_by_index[GO2OLID_FIELD]:
+            ix = data.find(GO2OLID_FIELD, exportId)
+            if ix is None:
                 typer.secho(f"Athlete {entry['Nachname']} {entry['Vorname']} NOT FOUND", fg=typer.colors.RED)
                 continue
-            # print("ix", data_by_index[GO2OLID_FIELD][exportId])
-            # print(data[data_by_index[GO2OLID_FIELD][exportId]])
-            data[data_by_index[GO2OLID_FIELD][exportId]][IOFID_FIELD] = "{0:d}".format(int(entry["IOF ID"]))
+            # print("ix", ix)
+            # print(data.row(ix))
+            data.set(ix, IOFID_FIELD, "{0:d}".format(int(entry["IOF ID"])))
         else:
             typer.secho(f"Athlete {entry['Nachname']} {entry['Vorname']} NOT FOUND", fg=typer.colors.RED)
 
-        
-    typer.echo(f"Writing output to {output_filename}")
-    with open(output_filename, 'w', encoding=CSV_OUTPUT_ENCODING) as csvfile:
-        writer = csv.DictWriter(csvfile, dialect='excel', delimiter=';', fieldnames=header_keys)
 
-        writer.writeheader()
-        writer.writerows(data)
+def main(
+    missing_iof_input_filename: Path=typer.Option(..., "--missing-iof", help="File Excel with manual matches for IOF ID"),
+    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
+    output_filename: Path=typer.Option(..., "--output", help="File CSV di output"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    with measure_run("fix_missing_iof", report_filename, profile, trace_memory) as report:
+        inputs = load_sources([
+            Source("oe_entries", read_oe_entries, (oe_input_filename, INDEX_COLS)),
+            Source("missing_iof", read_missing_iof, (missing_iof_input_filename,), process=True),
+        ], report)
+        data = inputs["oe_entries"]
+
+        with report.stage("fix_missing_iof", rows_in=len(data)) as st:
+            fix_missing_iof(data, missing_iof_input_filename, inputs["missing_iof"])
+            st.rows_out = len(data)
+
+        typer.echo(f"Writing output to {output_filename}")
+        with report.stage("write_output", rows_in=len(data)):
+            data.write(output_filename)
 
 
 if __name__ == '__main__':
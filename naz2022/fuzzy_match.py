@@ -0,0 +1,107 @@
+"""
+Fuzzy matching of athletes by name, birth year, gender and nationality.
+
+Names are normalized (umlauts spelled "ae"/"oe"/"ue", other accents folded,
+case and punctuation removed) and split in tokens, so that "Müller Hans",
+"Mueller Hans" and "Hans Mueller" compare equal, while "Michael" and
+"Michal" stay different names. Candidates are only looked up in a blocking
+index keyed by (birth year, first letters of a name token): each athlete is
+compared with a handful of rows sharing a block, never with the whole file,
+and only with the rows of the same gender when both are known.
+"""
+
+from difflib import SequenceMatcher
+import re
+import unicodedata
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from oe_entries import EntryTable
+
+
+BLOCK_PREFIX = 3
+NATIONALITY_PENALTY = 0.1
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_UMLAUT_SPELLING_RE = re.compile(r"([aou])e")
+_NON_LETTERS_RE = re.compile(r"[^a-z ]+")
+
+
+def normalize_name(name: str) -> str:
+    name = (name or "").lower().translate(_UMLAUTS)
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return _NON_LETTERS_RE.sub(" ", name.replace("-", " "))
+
+
+def fold_name(name: str) -> str:
+    """
+    Looser normalize_name for searching, "ae"/"oe"/"ue" also folded to the
+    vowel: "Muller" finds "Müller", but "Michael" also finds "Michal".
+    """
+    return _UMLAUT_SPELLING_RE.sub(r"\1", normalize_name(name))
+
+
+def name_tokens(family_name: str, given_name: str) -> Tuple[str, ...]:
+    return tuple(sorted((*normalize_name(family_name).split(), *normalize_name(given_name).split())))
+
+
+def block_keys(tokens: Tuple[str, ...], birth_year: str):
+    return {(birth_year, t[:BLOCK_PREFIX]) for t in tokens}
+
+
+def match_score(tokens_a: Tuple[str, ...], tokens_b: Tuple[str, ...], nat_a: str = "", nat_b: str = "") -> float:
+    """Similarity in [0, 1] of two token-sorted names, lowered if the nationality differs."""
+    score = SequenceMatcher(None, " ".join(tokens_a), " ".join(tokens_b)).ratio()
+    if nat_a and nat_b and nat_a != nat_b:
+        score -= NATIONALITY_PENALTY
+    return score
+
+
+class NameMatcher:
+    """Blocking index over the athletes of an EntryTable."""
+
+    def __init__(self, data: EntryTable, family_field: str, given_field: str, birth_field: str, nat_field: Optional[str] = None, sex_field: Optional[str] = None):
+        self.data = data
+        self.family_field = family_field
+        self.given_field = given_field
+        self.birth_field = birth_field
+        self.nat_field = nat_field if nat_field in data else None
+        self._family_names = data.column(family_field)
+        self._given_names = data.column(given_field)
+        self._birth_years = data.column(birth_field)
+        self._nats = data.column(self.nat_field) if self.nat_field else None
+        self.sex_field = sex_field if sex_field in data else None
+        self._sexes = data.column(self.sex_field) if self.sex_field else None
+
+        self._tokens: Dict[int, Tuple[str, ...]] = {}
+        self._blocks: Dict[Tuple[str, str], List[int]] = {}
+        for i in range(len(data)):
+            self.add(i)
+
+    def add(self, i: int):
+        """Index row `i` of the table, e.g. after it was appended."""
+        tokens = name_tokens(self._family_names[i], self._given_names[i])
+        self._tokens[i] = tokens
+        for key in block_keys(tokens, self._birth_years[i]):
+            self._blocks.setdefault(key, []).append(i)
+
+    def candidates(self, tokens: Tuple[str, ...], birth_year: str) -> Iterator[int]:
+        seen = set()
+        for key in block_keys(tokens, birth_year):
+            for i in self._blocks.get(key, ()):
+                if i not in seen:
+                    seen.add(i)
+                    yield i
+
+    def best_match(self, family_name: str, given_name: str, birth_year: str, nat: str = "", threshold: float = 0.0, sex: str = "") -> Optional[Tuple[int, float]]:
+        """Best (row, score) with a score of at least `threshold`, if any, among the rows of gender `sex`."""
+        tokens = name_tokens(family_name, given_name)
+        best = None
+        for i in self.candidates(tokens, birth_year):
+            if sex and self._sexes is not None and self._sexes[i] and self._sexes[i] != sex:
+                continue
+            row_nat = self._nats[i] if self._nats is not None else ""
+            score = match_score(tokens, self._tokens[i], nat, row_nat)
+            if score >= threshold and (best is None or score > best[1]):
+                best = (i, score)
+        return best
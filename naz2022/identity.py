@@ -0,0 +1,233 @@
+"""
+Identity of the athletes across the entries of several events.
+
+The entries of every event are linked by the identifiers they share: IOF ID,
+SOLV number and SI-card (rented cards excluded, they change hands between
+days), falling back to the name key (family name, given name, birth year).
+All the keys of an entry are merged in a union-find, so that e.g. an athlete
+entered with the SI-card only in one event and with the SOLV number only in
+another is still recognized through the event where both are given.
+
+Two entries of the same event, or with a different IOF ID or SOLV number,
+are never merged: a union which would put them in the same athlete is
+refused and reported as a conflict (e.g. two siblings sharing an SI-card).
+An entry is linked by its strongest key not already taken by another entry
+of the same event, such a shared key is then no longer used for linking in
+any event, and an entry whose keys are all taken (the same athlete entered
+twice) is reported as a duplicate and made an athlete of its own: two
+entries of an event are never given the same athlete. Only the keys,
+one small record per athlete and the athlete of every entry are kept, the
+entries themselves are streamed. The fields are column IDs of oe_columns,
+so the events can be exported in different languages.
+"""
+
+import csv
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import oe_columns
+from oe_entries import CSV_INPUT_ENCODING, IOFID_FIELD, SICARD_FIELD, SOLVNR_FIELD
+
+
+FAMILY_NAME_FIELD = "FAMILY_NAME"
+GIVEN_NAME_FIELD = "GIVEN_NAME"
+BIRTH_FIELD = "BIRTH"
+CLASS_FIELD = "CLASS"
+RENTED_FIELD = "RENTED"
+
+# Strongest first
+ID_FIELDS = (IOFID_FIELD, SOLVNR_FIELD, SICARD_FIELD)
+NAME_KEY_FIELDS = (FAMILY_NAME_FIELD, GIVEN_NAME_FIELD, BIRTH_FIELD)
+KEY_FIELDS = (*ID_FIELDS, *NAME_KEY_FIELDS, CLASS_FIELD, RENTED_FIELD)
+# An athlete has at most one of each
+UNIQUE_ID_FIELDS = (IOFID_FIELD, SOLVNR_FIELD)
+
+Key = Tuple[str, ...]
+
+
+@dataclass
+class Athlete:
+    """Link record of an athlete: the events entered and the class of the first one."""
+    class_name: str
+    name: str
+    runs: int = 0  # bit mask of the events
+    ids: Dict[str, str] = field(default_factory=dict)  # of UNIQUE_ID_FIELDS
+
+    def clashes(self, runs: int, ids: Dict[str, str]) -> bool:
+        """Whether these runs and ids cannot be of the same athlete."""
+        return bool(self.runs & runs) or any(self.ids.get(k, v) != v for k, v in ids.items())
+
+    def run_list(self) -> List[int]:
+        return [irun for irun in range(self.runs.bit_length()) if self.runs >> irun & 1]
+
+
+def _has_value(value: Optional[str]) -> bool:
+    return value is not None and value != "" and value != "0"
+
+
+def entry_keys(values: Dict[str, str]) -> List[Key]:
+    """Keys of an entry given as {field: value}, strongest first."""
+    keys = []
+    for field in ID_FIELDS:
+        value = values.get(field)
+        if field == SICARD_FIELD and _has_value(values.get(RENTED_FIELD)):
+            continue
+        if _has_value(value):
+            keys.append((field, value))
+    name_key = tuple(values.get(field) or "" for field in NAME_KEY_FIELDS)
+    if any(name_key):
+        keys.append(("name", *name_key))
+    return keys
+
+
+class IdentityResolver:
+    """Union-find over the keys of the entries, with an Athlete record per set."""
+
+    def __init__(self):
+        self.key_ids: Dict[Key, int] = {}
+        self.parent: List[int] = []
+        self.size: List[int] = []
+        self.athletes: Dict[int, Athlete] = {}
+        self.conflicts: List[Tuple[int, Key, Key]] = []
+        self.duplicates: List[Tuple[int, str]] = []
+        # Keys of two entries of the same event, not used for linking
+        self.shared: Set[int] = set()
+        # Key id of the athlete of every entry, by event; -1 without keys
+        self.entries: List[List[int]] = []
+
+    def _key_id(self, key: Key) -> int:
+        k = self.key_ids.get(key)
+        if k is None:
+            k = self.key_ids[key] = len(self.parent)
+            self.parent.append(k)
+            self.size.append(1)
+        return k
+
+    def find(self, k: int) -> int:
+        parent = self.parent
+        root = k
+        while parent[root] != root:
+            root = parent[root]
+        while parent[k] != root:
+            parent[k], k = root, parent[k]
+        return root
+
+    def _union(self, a: int, b: int) -> int:
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        athlete_b = self.athletes.pop(b, None)
+        if athlete_b is not None:
+            athlete_a = self.athletes.get(a)
+            if athlete_a is None:
+                self.athletes[a] = athlete_b
+            else:
+                athlete_a.runs |= athlete_b.runs
+                athlete_a.ids.update(athlete_b.ids)
+        return a
+
+    def add(self, irun: int, keys: Sequence[Key], class_name: str, name: str) -> Optional[int]:
+        """
+        Link entry `len(self.entries[irun])` of event `irun` by its keys.
+        Returns the root of its athlete. The entry is linked by its strongest
+        key whose athlete is not already in the event (and has the same IOF
+        ID and SOLV number). The keys it shares with another entry of the
+        event are reported as conflicts and no longer used for linking; an
+        entry whose keys are all taken is a duplicate: it is reported and
+        given an athlete of its own.
+        """
+        while len(self.entries) <= irun:
+            self.entries.append([])
+        if not keys:
+            self.entries[irun].append(-1)
+            return None
+        bit = 1 << irun
+        ids = {key[0]: key[1] for key in keys if key[0] in UNIQUE_ID_FIELDS}
+        root, athlete, taken = None, None, []
+        for key in keys:
+            k = self._key_id(key)
+            if k in self.shared:
+                continue
+            other = self.find(k)
+            other_athlete = self.athletes.get(other)
+            if other_athlete is None or not other_athlete.clashes(bit, ids):
+                root, root_key, athlete = other, key, other_athlete
+                break
+            if other_athlete.runs & bit:
+                taken.append((k, key))
+        if root is None:
+            self.duplicates.append((irun, name))
+            root = self._key_id(("entry", str(len(self.parent))))
+            self.athletes[root] = Athlete(class_name, name, bit)
+            self.entries[irun].append(root)
+            return root
+        for k, key in taken:
+            self.shared.add(k)
+            self.conflicts.append((irun, root_key, key))
+
+        for key in keys:
+            k = self._key_id(key)
+            other = self.find(k)
+            if other == root or k in self.shared:
+                continue
+            other_athlete = self.athletes.get(other)
+            if other_athlete is not None and other_athlete.clashes(
+                    bit | (athlete.runs if athlete else 0), {**ids, **(athlete.ids if athlete else {})}):
+                self.conflicts.append((irun, root_key, key))
+                continue
+            root = self._union(root, other)
+            athlete = self.athletes.get(root)
+        if athlete is None:
+            athlete = self.athletes[root] = Athlete(class_name, name)
+        athlete.runs |= bit
+        athlete.ids.update(ids)
+        self.entries[irun].append(root)
+        return root
+
+    def athlete_of(self, irun: int, i: int) -> Optional[int]:
+        """Root of the athlete of entry `i` of event `irun`."""
+        k = self.entries[irun][i]
+        return None if k < 0 else self.find(k)
+
+    def by_class(self) -> Dict[str, List[int]]:
+        """Athletes (roots) by class."""
+        classes: Dict[str, List[int]] = {}
+        for root, athlete in self.athletes.items():
+            classes.setdefault(athlete.class_name, []).append(root)
+        return classes
+
+
+def key_positions(header: Sequence[str], fields: Sequence[str] = KEY_FIELDS, columns: Optional[ModuleType] = None) -> Dict[str, int]:
+    """
+    {field: position} of the given fields (column IDs or names) found in an
+    OE header, in the language `columns` or detected from the header.
+    """
+    columns = columns or oe_columns.detect(header)
+    names = oe_columns.column_ids(columns) if columns is not None else {}
+    # As csv.DictReader, a repeated column name is its last occurrence
+    pos_by_name = {k: i for i, k in enumerate(header)}
+    return {k: pos_by_name[names.get(k, k)] for k in fields if names.get(k, k) in pos_by_name}
+
+
+def iter_key_values(filename: Path, fields: Sequence[str] = KEY_FIELDS, encoding: str = CSV_INPUT_ENCODING) -> Iterator[Dict[str, str]]:
+    """{field: value} of the given fields for every row of an OE CSV file."""
+    with open(filename, encoding=encoding, newline='') as csvfile:
+        reader = csv.reader(csvfile, dialect='excel', delimiter=';')
+        pos = key_positions(next(reader), fields)
+        for values in reader:
+            if not values:
+                continue
+            yield {k: values[p] if p < len(values) else "" for k, p in pos.items()}
+
+
+def add_entries(resolver: IdentityResolver, irun: int, rows: Iterable[Dict[str, str]]) -> int:
+    """Add the entries of an event, returns their number."""
+    n = 0
+    for values in rows:
+        name = f"{values.get(FAMILY_NAME_FIELD, '')} {values.get(GIVEN_NAME_FIELD, '')} {values.get(BIRTH_FIELD, '')}"
+        resolver.add(irun, entry_keys(values), values.get(CLASS_FIELD, ""), name)
+        n += 1
+    return n
@@ -0,0 +1,117 @@
+"""
+Concurrent loading of the inputs of a run.
+
+The inputs of a tool (OE export, SOLV DB, late entries workbook, rankings)
+are independent until they are combined, and on the cloud-synced data
+folder (DATA_ROOT of prepare_entries.sh) most of the time reading them is
+spent waiting for the files. A tool declares its inputs as `Source`s, and
+`load_sources` loads them all at once: the sources mostly waiting for the
+file (CSV files, the SOLV DB index) in a thread pool, those parsing XML or
+Excel in Python (bound by the CPU, so threads would only take turns) in a
+process pool, their result being pickled back. Without another CPU to
+parse them, or in a worker process of a pool already (`processes=False`,
+as the per-event workers of pipeline.py, whose pool uses the CPUs), they
+are loaded in the threads as well. The results are
+returned by source name as built by the loaders (EntryTable with its
+indexes, SolvDB, rankings by IOF ID, rows of a sheet, ...).
+
+Every source is measured as a `load_<name>` stage of the report, in the
+worker process for the process sources. The sources loaded in the threads
+share the CPU time and memory of the process, their stages only have their
+wall time. When a source is selected with
+`--profile` or `--trace-memory` (which measure the whole process), the
+sources are loaded one after the other instead.
+"""
+
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import typer
+
+from oe_entries import INDEX_COLS, EntryTable
+from run_report import RunReport, Stage
+
+
+MAX_THREADS = 8
+
+
+@dataclass
+class Source:
+    name: str
+    # Module-level function for the process sources, so that it can be pickled
+    load: Callable[..., Any]
+    args: Tuple = ()
+    # Parsing bound by the CPU (XML, Excel): loaded in a worker process
+    process: bool = False
+
+
+def read_oe_entries(filename: Path, index_cols: Sequence[str] = INDEX_COLS, name_fields: Optional[Sequence[str]] = None, unique_names: bool = False) -> EntryTable:
+    typer.echo(f"Reading entries from CSV file {filename}")
+    return EntryTable.read(filename, index_cols, name_fields=name_fields, unique_names=unique_names)
+
+
+def _load(source: Source, report: RunReport, prefix: str = "", concurrent: bool = False) -> Any:
+    with report.stage(f"{prefix}load_{source.name}", concurrent=concurrent) as st:
+        result = source.load(*source.args)
+        if hasattr(result, "__len__"):
+            st.rows_out = len(result)
+        if isinstance(result, EntryTable):
+            st.indexes = result.index_sizes()
+    return result
+
+
+def _load_in_process(source: Source, prefix: str) -> Tuple[Any, List[Stage]]:
+    report = RunReport("ingest")
+    result = _load(source, report, prefix)
+    return result, report.stages
+
+
+def _measured(report: RunReport, sources: Sequence[Source], prefix: str) -> bool:
+    return any(
+        pattern and fnmatchcase(f"{prefix}load_{source.name}", pattern)
+        for source in sources
+        for pattern in (report.profile, report.trace_memory)
+    )
+
+
+def load_sources(sources: Sequence[Source], report: Optional[RunReport] = None, concurrent: bool = True, prefix: str = "", processes: bool = True) -> Dict[str, Any]:
+    """
+    {name: result} of the sources (None items are skipped), loaded
+    concurrently unless `concurrent` is False. Without `processes`, no
+    process pool is started, all the sources are loaded in threads. The
+    stages are named `<prefix>load_<name>`.
+    """
+    report = report or RunReport("ingest")
+    sources = [source for source in sources if source is not None]
+    if not concurrent or len(sources) < 2 or _measured(report, sources, prefix):
+        return {source.name: _load(source, report, prefix) for source in sources}
+
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    # The main process is busy with the threads, the processes only help on the other CPUs
+    processes = min(sum(source.process for source in sources), (os.cpu_count() or 1) - 1) if processes else 0
+    process_sources = [source for source in sources if source.process and processes > 0]
+    thread_sources = [source for source in sources if source not in process_sources]
+    futures = {}
+    process_pool = ProcessPoolExecutor(processes) if process_sources else None
+    try:
+        with ThreadPoolExecutor(min(len(thread_sources), MAX_THREADS) or 1) as thread_pool:
+            # The workers start parsing while the threads read
+            for source in process_sources:
+                futures[source.name] = process_pool.submit(_load_in_process, source, prefix)
+            for source in thread_sources:
+                futures[source.name] = thread_pool.submit(_load, source, report, prefix, True)
+            results = {}
+            for source in sources:
+                if source in process_sources:
+                    results[source.name], stages = futures[source.name].result()
+                    report.extend(stages)
+                else:
+                    results[source.name] = futures[source.name].result()
+    finally:
+        if process_pool is not None:
+            process_pool.shutdown(cancel_futures=True)
+    return results
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Store of IOF World Ranking lists.
+
+Every ranking CSV downloaded from the IOF site is ingested once as a
+snapshot of a list (e.g. MEN_F for men forest) at a given date. The lists
+are kept in a single SQLite file indexed by (list, snapshot, IOF ID), and
+the rank of a whole batch of IOF IDs is fetched with one query.
+
+Add the new ranking files with:
+
+    python iof_ranking.py add data/iof_ranking_MEN_F_18-08-2022.csv data/iof_ranking_WOMEN_F_18-08-2022.csv
+"""
+
+import csv
+import datetime
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import typer
+
+from solv_db import CACHE_DIR
+
+
+WRE_INPUT_ENCODING = 'UTF8'
+
+DEFAULT_STORE = CACHE_DIR / "iof-rankings.sqlite"
+
+IOFID_FIELD = "IOF ID"
+POSITION_FIELD = "WRS Position"
+POINTS_FIELD = "WRS Points"
+
+# e.g. iof_ranking_MEN_F_18-08-2022.csv
+RANKING_FILENAME_RE = re.compile(r"iof_ranking_(?P<list>[A-Z]+_[A-Z]+)_(?P<date>\d{2}-\d{2}-\d{4})")
+
+UNRANKED = 999999
+
+_BATCH_SIZE = 500
+
+
+def parse_ranking_filename(ranking_filename: Path) -> Tuple[Optional[str], Optional[str]]:
+    """List name and ISO snapshot date encoded in an IOF ranking file name."""
+    m = RANKING_FILENAME_RE.search(Path(ranking_filename).stem)
+    if not m:
+        return None, None
+    snapshot = datetime.datetime.strptime(m.group("date"), "%d-%m-%Y").date().isoformat()
+    return m.group("list"), snapshot
+
+
+class RankingStore:
+
+    def __init__(self, store_filename: Path = DEFAULT_STORE):
+        self.store_filename = Path(store_filename)
+        self.store_filename.parent.mkdir(parents=True, exist_ok=True)
+        self._con = sqlite3.connect(self.store_filename, check_same_thread=False)
+        self._con.executescript("""
+            CREATE TABLE IF NOT EXISTS ranking (
+                list TEXT NOT NULL,
+                snapshot TEXT NOT NULL,
+                iof_id TEXT NOT NULL,
+                position INTEGER,
+                points REAL,
+                PRIMARY KEY (list, snapshot, iof_id)
+            ) WITHOUT ROWID;
+        """)
+
+    def close(self):
+        self._con.close()
+
+    def add_snapshot(self, ranking_filename: Path, list_name: Optional[str] = None, snapshot: Optional[str] = None) -> Tuple[str, str, int]:
+        """
+        Ingest an IOF ranking CSV, replacing the same list and snapshot if
+        already present. List name and date default to the ones in the file
+        name. Returns (list, snapshot, number of athletes).
+        """
+        parsed_list, parsed_snapshot = parse_ranking_filename(ranking_filename)
+        list_name = list_name or parsed_list
+        snapshot = snapshot or parsed_snapshot
+        if not list_name or not snapshot:
+            raise ValueError(f"Cannot guess list and date from {ranking_filename}, please specify them")
+
+        with open(ranking_filename, encoding=WRE_INPUT_ENCODING) as csvfile:
+            reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
+            rows = [
+                (list_name, snapshot, row[IOFID_FIELD], int(row[POSITION_FIELD]), float(row[POINTS_FIELD] or 0) if POINTS_FIELD in row else None)
+                for row in reader
+            ]
+        with self._con:
+            self._con.execute("DELETE FROM ranking WHERE list = ? AND snapshot = ?", (list_name, snapshot))
+            self._con.executemany("INSERT OR REPLACE INTO ranking VALUES (?, ?, ?, ?, ?)", rows)
+        return list_name, snapshot, len(rows)
+
+    def snapshots(self, list_name: Optional[str] = None) -> List[Tuple[str, str, int]]:
+        """(list, snapshot, number of athletes), sorted by list and date."""
+        query = "SELECT list, snapshot, COUNT(*) FROM ranking"
+        params: tuple = ()
+        if list_name:
+            query += " WHERE list = ?"
+            params = (list_name,)
+        return self._con.execute(query + " GROUP BY list, snapshot ORDER BY list, snapshot", params).fetchall()
+
+    def latest_snapshot(self, list_name: str, on_or_before: Optional[str] = None) -> Optional[str]:
+        query = "SELECT MAX(snapshot) FROM ranking WHERE list = ?"
+        params: tuple = (list_name,)
+        if on_or_before:
+            query += " AND snapshot <= ?"
+            params = (list_name, on_or_before)
+        return self._con.execute(query, params).fetchone()[0]
+
+    def ranks(self, list_name: str, iof_ids: Iterable[str], snapshot: Optional[str] = None) -> Dict[str, int]:
+        """
+        WRS position of the given IOF IDs in a list. The latest snapshot is
+        used, or the latest one not after `snapshot`. Unranked athletes are
+        not in the result.
+        """
+        snapshot = self.latest_snapshot(list_name, snapshot)
+        if snapshot is None:
+            raise KeyError(f"No snapshot of the ranking list {list_name}")
+
+        ids = [i for i in set(iof_ids) if i]
+        ranks: Dict[str, int] = {}
+        for start in range(0, len(ids), _BATCH_SIZE):
+            batch = ids[start:start + _BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            ranks.update(self._con.execute(
+                f"SELECT iof_id, position FROM ranking WHERE list = ? AND snapshot = ? AND iof_id IN ({placeholders})",
+                (list_name, snapshot, *batch),
+            ))
+        return ranks
+
+
+def add(
+    ranking_filenames: List[Path]=typer.Argument(..., help="IOF ranking CSV files"),
+    list_name: Optional[str]=typer.Option(None, "--list", help="Ranking list, e.g. MEN_F. Default: from the file name"),
+    snapshot: Optional[str]=typer.Option(None, "--date", help="Snapshot date YYYY-MM-DD. Default: from the file name"),
+    store_filename: Path=typer.Option(DEFAULT_STORE, "--store", help="Ranking store file"),
+    ):
+    store = RankingStore(store_filename)
+    for ranking_filename in ranking_filenames:
+        typer.echo(f"Reading ranking from CSV file {ranking_filename}")
+        list_name_added, snapshot_added, count = store.add_snapshot(ranking_filename, list_name, snapshot)
+        typer.secho(f"Added {count} athletes to {list_name_added} at {snapshot_added}", fg=typer.colors.GREEN)
+
+
+def show(
+    list_name: Optional[str]=typer.Option(None, "--list", help="Only show this ranking list"),
+    store_filename: Path=typer.Option(DEFAULT_STORE, "--store", help="Ranking store file"),
+    ):
+    store = RankingStore(store_filename)
+    for list_name, snapshot, count in store.snapshots(list_name):
+        typer.echo(f"{list_name}    {snapshot}    {count}")
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(add)
+    app.command()(show)
+    app()
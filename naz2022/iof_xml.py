@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Export the OE entries as IOF XML 3.0 EntryList or StartList.
+
+The CSV files are limited to ISO-8859-1 (see oe_entries.py), the XML files
+are UTF-8. The pipeline writes the entry list from its tables, which keep
+every name as read from Eventor; written from an OE export, the names are
+those of the CSV file. The files can be imported in OE and uploaded to
+Eventor. OE only knows the birth year, which BirthDate (a full date) cannot
+hold, so it is left out.
+
+The documents are written entry by entry, the values escaped into string
+templates, without building an ElementTree (or going through a SAX
+generator, which is several times slower): memory does not grow with the
+number of entries, the start list only keeps the row numbers to group them
+by class.
+
+    python iof_xml.py entry-list --oe-entries 8naz_entries_final_startnr.csv --event "8. Nationaler OL" --output 8naz_entries.xml
+    python iof_xml.py start-list --oe-input 8Naz_Liste_di_partenza.csv --event "8. Nationaler OL" \\
+        --date 2022-08-27 --zero 12:00:00 --output 8naz_startlist.xml
+"""
+
+import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO
+from xml.sax.saxutils import escape, quoteattr
+
+import typer
+
+import oe_columns
+from oe_entries import EntryTable
+from add_eventor_entries import ns
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+
+
+IOF_VERSION = "3.0"
+# Name in the XML declaration, which the parsers understand
+XML_ENCODING = "UTF-8"
+CREATOR = "naz2022 oe tools"
+INDENT = "  "
+
+
+def _has_value(value: str) -> bool:
+    return value != "" and value != "0"
+
+
+def _is_date(value: str) -> bool:
+    try:
+        return len(value) == 10 and datetime.date.fromisoformat(value) is not None
+    except ValueError:
+        return False
+
+
+def _text(tag: str, text: str, indent: str, attrs: str = "") -> str:
+    return f"{indent}<{tag}{attrs}>{escape(text)}</{tag}>\n"
+
+
+class EntryWriter:
+    """XML fragments of the rows of an OE table, each element on its own line."""
+
+    def __init__(self, data: EntryTable):
+        self.vacancy_name = data.vacancy_name
+
+        def _col(field: str) -> list:
+            return data.column(field) if field in data else [""] * len(data)
+
+        self.family_name = _col("FAMILY_NAME")
+        self.given_name = _col("GIVEN_NAME")
+        self.birth = _col("BIRTH")
+        self.sex = _col("SEX")
+        self.iof_id = _col("IOFID")
+        self.solvnr = _col("SOLVNR")
+        self.sicard = _col("SICARD")
+        self.club = _col("CLUB")
+        self.club_name = _col("CLUB_NAME")
+        self.club_short_name = _col("CLUB_SHORT_NAME")
+        self.nat = _col("NAT")
+        self.class_name = _col("CLASS")
+        self.startnr = _col("STARTNR")
+        self.start = _col("START")
+
+    def is_vacant(self, i: int) -> bool:
+        return self.family_name[i] == self.vacancy_name
+
+    def person(self, i: int, indent: str) -> List[str]:
+        inner = indent + INDENT
+        sex = self.sex[i]
+        parts = [f'{indent}<Person sex="{sex}">\n' if sex in ("M", "F") else f"{indent}<Person>\n"]
+        if _has_value(self.iof_id[i]):
+            parts.append(_text("Id", self.iof_id[i], inner, ' type="IOF"'))
+        if _has_value(self.solvnr[i]):
+            parts.append(_text("Id", self.solvnr[i], inner, ' type="SOLV"'))
+        parts += [
+            f"{inner}<Name>\n",
+            _text("Family", self.family_name[i], inner + INDENT),
+            _text("Given", self.given_name[i], inner + INDENT),
+            f"{inner}</Name>\n",
+        ]
+        if _is_date(self.birth[i]):
+            parts.append(_text("BirthDate", self.birth[i], inner))
+        parts.append(f"{indent}</Person>\n")
+        return parts
+
+    def organisation(self, i: int, indent: str) -> List[str]:
+        club, club_name, short_name, nat = self.club[i], self.club_name[i], self.club_short_name[i], self.nat[i]
+        if not (club_name or _has_value(club)):
+            return []
+        inner = indent + INDENT
+        parts = [f"{indent}<Organisation>\n"]
+        if _has_value(club):
+            parts.append(_text("Id", club, inner))
+        if club_name:
+            parts.append(_text("Name", club_name, inner))
+        if short_name:
+            parts.append(_text("ShortName", short_name, inner))
+        if nat:
+            parts.append(_text("Country", nat, inner, f" code={quoteattr(nat)}" if len(nat) == 3 else ""))
+        parts.append(f"{indent}</Organisation>\n")
+        return parts
+
+    def control_card(self, i: int, indent: str) -> List[str]:
+        if not _has_value(self.sicard[i]):
+            return []
+        return [_text("ControlCard", self.sicard[i], indent, ' punchingSystem="SI"')]
+
+
+def _class(name: str, indent: str) -> str:
+    return f"{indent}<Class>\n{_text('Name', name, indent + INDENT)}{indent}</Class>\n"
+
+
+def _start_document(f: TextIO, root: str, event_name: str, date: Optional[str] = None):
+    create_time = datetime.datetime.now().astimezone().isoformat(timespec="seconds")
+    f.write(f'<?xml version="1.0" encoding="{XML_ENCODING}"?>\n')
+    f.write(f'<{root} xmlns={quoteattr(ns["iof"])} iofVersion="{IOF_VERSION}" createTime="{create_time}" creator={quoteattr(CREATOR)}>\n')
+    f.write(f"{INDENT}<Event>\n{_text('Name', event_name, INDENT * 2)}")
+    if date:
+        f.write(f"{INDENT * 2}<StartTime>\n{_text('Date', date, INDENT * 3)}{INDENT * 2}</StartTime>\n")
+    f.write(f"{INDENT}</Event>\n")
+
+
+def write_entry_list(output_filename: Path, data: EntryTable, event_name: str) -> int:
+    """Write the entries as IOF XML EntryList. Returns the number of entries."""
+    rows = EntryWriter(data)
+    indent = INDENT * 2
+    count = 0
+    with open(output_filename, "w", encoding=XML_ENCODING) as f:
+        _start_document(f, "EntryList", event_name)
+        for i in range(len(data)):
+            if rows.is_vacant(i):
+                continue
+            f.write("".join([
+                f"{INDENT}<PersonEntry>\n",
+                *rows.person(i, indent),
+                *rows.organisation(i, indent),
+                *rows.control_card(i, indent),
+                _class(rows.class_name[i], indent),
+                f"{INDENT}</PersonEntry>\n",
+            ]))
+            count += 1
+        f.write("</EntryList>\n")
+    return count
+
+
+def _duration(value: str) -> datetime.timedelta:
+    """HH:MM or HH:MM:SS, as OE writes the start times, as a timedelta."""
+    parts = value.split(":")
+    if not 2 <= len(parts) <= 3:
+        raise ValueError(f"Expected HH:MM or HH:MM:SS, got {value!r}")
+    h, m, s = (int(x) for x in (parts + ["0"])[:3])
+    return datetime.timedelta(hours=h, minutes=m, seconds=s)
+
+
+def _start_time(date: str, zero: datetime.timedelta, relative: str, utc_offset: str) -> str:
+    start = datetime.datetime.fromisoformat(date) + zero + _duration(relative)
+    return start.isoformat() + utc_offset
+
+
+def write_start_list(output_filename: Path, data: EntryTable, event_name: str, date: str, zero_time: str, utc_offset: str = "") -> int:
+    """
+    Write the start list as IOF XML StartList, by class in the order of the
+    OE file, by start time within a class. Returns the number of starters.
+    """
+    zero = _duration(zero_time)
+
+    rows = EntryWriter(data)
+    by_class: Dict[str, List[int]] = {}
+    for i, class_name in enumerate(rows.class_name):
+        if not rows.is_vacant(i):
+            by_class.setdefault(class_name, []).append(i)
+
+    indent = INDENT * 3
+    count = 0
+    with open(output_filename, "w", encoding=XML_ENCODING) as f:
+        _start_document(f, "StartList", event_name, date)
+        for class_name, class_rows in by_class.items():
+            class_rows.sort(key=lambda i: (rows.start[i] == "", rows.start[i]))
+            f.write(f"{INDENT}<ClassStart>\n{_class(class_name, INDENT * 2)}")
+            for i in class_rows:
+                parts = [f"{INDENT * 2}<PersonStart>\n", *rows.person(i, indent), *rows.organisation(i, indent), f"{indent}<Start>\n"]
+                if _has_value(rows.startnr[i]):
+                    parts.append(_text("BibNumber", rows.startnr[i], indent + INDENT))
+                if rows.start[i]:
+                    parts.append(_text("StartTime", _start_time(date, zero, rows.start[i], utc_offset), indent + INDENT))
+                parts += rows.control_card(i, indent + INDENT)
+                parts += [f"{indent}</Start>\n", f"{INDENT * 2}</PersonStart>\n"]
+                f.write("".join(parts))
+                count += 1
+            f.write(f"{INDENT}</ClassStart>\n")
+        f.write("</StartList>\n")
+    return count
+
+
+def entry_list(
+    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
+    event_name: str=typer.Option(..., "--event", help="Name of the event"),
+    language: Optional[str]=typer.Option(None, help="Language of the OE export (de, it). Default: detected from the header"),
+    output_filename: Path=typer.Option(..., "--output", help="IOF XML file"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    """Write the OE entries as IOF XML 3.0 EntryList."""
+    with measure_run("iof_xml", report_filename, profile, trace_memory) as report:
+        typer.echo(f"Reading entries from CSV file {oe_input_filename}")
+        with report.stage("read_oe_entries") as st:
+            data = EntryTable.read(oe_input_filename, index_cols=(), columns=oe_columns.load(language) if language else None)
+            st.rows_out = len(data)
+
+        typer.echo(f"Writing entry list to {output_filename}")
+        with report.stage("write_entry_list", rows_in=len(data)) as st:
+            st.rows_out = write_entry_list(output_filename, data, event_name)
+        typer.secho(f"Wrote {st.rows_out} entries", fg=typer.colors.GREEN)
+
+
+def start_list(
+    oe_input_filename: Path=typer.Option(..., "--oe-input", help="CSV file with the OE start list"),
+    event_name: str=typer.Option(..., "--event", help="Name of the event"),
+    date: str=typer.Option(..., help="Date of the event, YYYY-MM-DD"),
+    zero_time: str=typer.Option(..., "--zero", help="Zero time, the start times of OE being relative to it"),
+    utc_offset: str=typer.Option("", help="UTC offset of the start times, e.g. +02:00. Default: local time"),
+    language: Optional[str]=typer.Option(None, help="Language of the OE export (de, it). Default: detected from the header"),
+    output_filename: Path=typer.Option(..., "--output", help="IOF XML file"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    """Write the OE start list as IOF XML 3.0 StartList."""
+    try:
+        _duration(zero_time)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--zero")
+    with measure_run("iof_xml", report_filename, profile, trace_memory) as report:
+        typer.echo(f"Reading start list from CSV file {oe_input_filename}")
+        with report.stage("read_oe_entries") as st:
+            data = EntryTable.read(oe_input_filename, index_cols=(), columns=oe_columns.load(language) if language else None)
+            st.rows_out = len(data)
+
+        typer.echo(f"Writing start list to {output_filename}")
+        with report.stage("write_start_list", rows_in=len(data)) as st:
+            st.rows_out = write_start_list(output_filename, data, event_name, date, zero_time, utc_offset)
+        typer.secho(f"Wrote {st.rows_out} starters", fg=typer.colors.GREEN)
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(entry_list)
+    app.command()(start_list)
+    app()
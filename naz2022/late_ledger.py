@@ -0,0 +1,76 @@
+"""
+Ledger of the late entries already applied to the OE entries.
+
+Each row of the late entries sheet is identified by a hash of its content.
+The ledger keeps, per sheet, the OE row generated for every applied hash:
+on the next run the rows already in the ledger are re-appended as they are
+and only new or modified sheet rows have to be processed. Rows removed from
+the sheet (or modified, i.e. with a new hash) are dropped from the ledger.
+The OE rows are built from the SOLV DB: when the content hash of the SOLV DB
+changes, the rows of the sheet are kept but looked up again, and only those
+whose OE row changed count as new.
+"""
+
+import hashlib
+import json
+import math
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+LEDGER_VERSION = 2
+
+
+def _plain(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value)
+
+
+def row_hash(values: Iterable) -> str:
+    """Content hash of a sheet row, given as its cell values."""
+    return hashlib.sha1(json.dumps([_plain(v) for v in values], ensure_ascii=False).encode()).hexdigest()
+
+
+class LateEntriesLedger:
+
+    def __init__(self, ledger_filename: Path):
+        self.ledger_filename = Path(ledger_filename)
+        self.sheets: Dict[str, Dict[str, dict]] = {}
+        # Content hash of the SOLV DB the rows of every sheet were built from
+        self.solv_db: Dict[str, str] = {}
+        if self.ledger_filename.exists():
+            with open(self.ledger_filename, encoding="UTF8") as f:
+                raw = json.load(f)
+            if raw.get("version") == LEDGER_VERSION:
+                self.sheets = raw["sheets"]
+                self.solv_db = raw["solv_db"]
+
+    def check_solv_db(self, sheet_name: str, digest: str) -> bool:
+        """Whether the rows of the sheet were built from another SOLV DB, and must be looked up again."""
+        stale = self.solv_db.get(sheet_name) != digest and bool(self.sheets.get(sheet_name))
+        self.solv_db[sheet_name] = digest
+        return stale
+
+    def applied(self, sheet_name: str, h: str) -> Optional[dict]:
+        """The OE row generated for the sheet row with hash `h`, if already applied."""
+        return self.sheets.get(sheet_name, {}).get(h)
+
+    def record(self, sheet_name: str, h: str, row: dict):
+        self.sheets.setdefault(sheet_name, {})[h] = row
+
+    def prune(self, sheet_name: str, seen: Iterable[str]) -> int:
+        """Forget the rows no longer in the sheet. Returns how many were dropped."""
+        seen = set(seen)
+        applied = self.sheets.get(sheet_name, {})
+        stale = [h for h in applied if h not in seen]
+        for h in stale:
+            del applied[h]
+        return len(stale)
+
+    def save(self):
+        tmp_filename = self.ledger_filename.with_suffix(".tmp")
+        with open(tmp_filename, "w", encoding="UTF8") as f:
+            json.dump({"version": LEDGER_VERSION, "solv_db": self.solv_db, "sheets": self.sheets}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_filename, self.ledger_filename)
@@ -0,0 +1,55 @@
+"""
+Column names of the OE exports, by language.
+
+Each language module names the columns used by the tools `<ID>_FIELD`, e.g.
+SICARD_FIELD is "Chipnr" in German and "Chip" in Italian: <ID> ("SICARD") is
+the canonical ID of the column. The language of an export is detected from
+its header with `detect`, and EntryTable accepts the IDs wherever a column
+name is expected, so the tools address the columns by ID and can process
+exports of different languages in the same run.
+"""
+
+import importlib
+from types import ModuleType
+from typing import Dict, Optional, Sequence
+
+
+LANGUAGES = ("de", "it")
+
+# Named differently in every language, so that the header tells the language
+DETECT_IDS = ("FAMILY_NAME", "CLASS")
+
+
+def load(language: str) -> ModuleType:
+    return importlib.import_module(f"{__name__}.{language}")
+
+
+def language(columns: ModuleType) -> str:
+    """Code of a language module, as given to `load`."""
+    return columns.__name__.rpartition(".")[2]
+
+
+def column_ids(columns: ModuleType) -> Dict[str, str]:
+    """{ID: column name} of a language module."""
+    return {k[:-len("_FIELD")]: v for k, v in vars(columns).items() if k.endswith("_FIELD")}
+
+
+def detect(header: Sequence[str]) -> Optional[ModuleType]:
+    """Language module of an OE export from its header, None if not an OE export."""
+    header = set(header)
+    best, best_count = None, 0
+    for language in LANGUAGES:
+        columns = load(language)
+        ids = column_ids(columns)
+        if not all(ids[k] in header for k in DETECT_IDS):
+            continue
+        count = sum(name in header for name in ids.values())
+        if count > best_count:
+            best, best_count = columns, count
+    return best
+
+
+def translation(source: ModuleType, target: ModuleType) -> Dict[str, str]:
+    """{column name in `source`: column name in `target`} of the columns with an ID."""
+    target_ids = column_ids(target)
+    return {name: target_ids[k] for k, name in column_ids(source).items() if k in target_ids}
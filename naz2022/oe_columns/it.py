@@ -11,5 +11,17 @@ FAMILY_NAME_FIELD = "Cognome"
 BIRTH_FIELD = "An."
 STARTNR_FIELD = "Pett"
 START_FIELD = "Partenza"
+CLUB_FIELD = "Club-Nr."
 
-VACANCY_NAME = "Vacante"
\ No newline at end of file
+# Same name in the German and Italian exports
+SEX_FIELD = "Geschlecht"
+CLUB_NAME_FIELD = "Ort"
+CLUB_SHORT_NAME_FIELD = "Abk"
+NAT_FIELD = "Nat"
+CLASS_LONG_FIELD = "Lang"
+START_REGION_FIELD = "Num1"
+RENTED_FIELD = "Gemietet"
+FEE_FIELD = "Startgeld"
+GO2OLID_FIELD = "ID"
+
+VACANCY_NAME = "Vacante"
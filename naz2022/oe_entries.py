@@ -0,0 +1,280 @@
+"""
+Column-wise storage of the OE entry / start list CSV files.
+
+All the tools were reading the OE export with a csv.DictReader, keeping one
+dict per row and building the same `data_by_index` lookup tables. The
+`EntryTable` keeps one list per column (values interned, so the many repeated
+"0", class names and clubs are shared) and maintains the hash indexes while
+loading, in a single pass over the file.
+
+The language of the export is detected from the header (see oe_columns), and
+the columns can also be addressed by their canonical ID, e.g. "SICARD" for
+"Chipnr" or "Chip".
+
+The CSV files of OE are ISO-8859-1, but the entries from Eventor can have
+any name: the letters missing in ISO-8859-1 are written without their
+accent ("Dvořák" as "Dvorák"), the other characters as "?". The table
+itself keeps the names as they were given (see iof_xml.py).
+"""
+
+import codecs
+import csv
+import sys
+import unicodedata
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import oe_columns
+
+
+CSV_INPUT_ENCODING = 'ISO-8859-1'
+CSV_OUTPUT_ENCODING = 'ISO-8859-1'
+# Error handler of the characters missing in CSV_OUTPUT_ENCODING
+CSV_OUTPUT_ERRORS = 'oe_fold'
+
+# Column IDs of oe_columns
+IOFID_FIELD = "IOFID"
+SOLVNR_FIELD = "SOLVNR"
+SICARD_FIELD = "SICARD"
+INDEX_COLS = (SICARD_FIELD, SOLVNR_FIELD, IOFID_FIELD)
+
+NameKey = Tuple[str, ...]
+
+_intern = sys.intern
+
+
+def _fold_unencodable(error: UnicodeEncodeError) -> Tuple[str, int]:
+    folded = []
+    for c in error.object[error.start:error.end]:
+        base = "".join(b for b in unicodedata.normalize("NFKD", c) if not unicodedata.combining(b))
+        try:
+            folded.append(base.encode(error.encoding).decode(error.encoding) if base else "?")
+        except UnicodeEncodeError:
+            folded.append("?")
+    return "".join(folded), error.end
+
+codecs.register_error(CSV_OUTPUT_ERRORS, _fold_unencodable)
+
+
+def _is_index_value(value) -> bool:
+    return value != "0" and value != "" and value is not None
+
+
+class EntryTable:
+    """
+    OE entries stored column-wise.
+
+    Columns are kept by position, so the file is written back with exactly
+    the header it was read with. Fields are addressed by name or by column
+    ID of `oe_columns` (the language module given or detected from the
+    header); as with csv.DictReader, a repeated header name refers to its
+    last occurrence.
+
+    `ix_by_field` maps each of `index_cols` (by name) to {value: row},
+    ignoring the empty and "0" values used by OE for missing data. When
+    `name_fields` is given, `ix_by_name` maps the tuple of those fields to
+    the row. Rows whose first name field equals `vacancy_name` (by default
+    the VACANCY_NAME of the language) are not indexed by name.
+    """
+
+    def __init__(
+        self,
+        header_keys: Sequence[str],
+        index_cols: Sequence[str] = INDEX_COLS,
+        name_fields: Optional[Sequence[str]] = None,
+        vacancy_name: Optional[str] = None,
+        columns: Optional[ModuleType] = None,
+    ):
+        self.header_keys: List[str] = list(header_keys)
+        self.columns: List[list] = [[] for _ in self.header_keys]
+        self._field_pos: Dict[str, int] = {k: i for i, k in enumerate(self.header_keys)}
+
+        # Column IDs, resolved once to the names (and positions) of this header.
+        # The language is kept by code, a module cannot be pickled to the workers
+        columns = columns or oe_columns.detect(self.header_keys)
+        self.language: Optional[str] = oe_columns.language(columns) if columns is not None else None
+        self._names: Dict[str, str] = {}
+        if columns is not None:
+            for column_id, name in oe_columns.column_ids(columns).items():
+                if name in self._field_pos and column_id not in self._field_pos:
+                    self._names[column_id] = name
+                    self._field_pos[column_id] = self._field_pos[name]
+            if vacancy_name is None:
+                vacancy_name = columns.VACANCY_NAME
+
+        self.index_cols = tuple(self.field_name(k) for k in index_cols)
+        self.name_fields = tuple(self.field_name(k) for k in name_fields) if name_fields else None
+        self.vacancy_name = vacancy_name
+        for field in (*self.index_cols, *(self.name_fields or ())):
+            self.field_pos(field)
+
+        self.ix_by_field: Dict[str, Dict[str, int]] = {ix: {} for ix in self.index_cols}
+        self.ix_by_name: Dict[NameKey, int] = {}
+        self._nrows = 0
+
+    @classmethod
+    def read(
+        cls,
+        filename: Path,
+        index_cols: Sequence[str] = INDEX_COLS,
+        name_fields: Optional[Sequence[str]] = None,
+        vacancy_name: Optional[str] = None,
+        unique_names: bool = False,
+        encoding: str = CSV_INPUT_ENCODING,
+        columns: Optional[ModuleType] = None,
+    ) -> "EntryTable":
+        """
+        Load an OE CSV export. With `unique_names`, a RuntimeError is raised
+        when two rows share the same name key.
+        """
+        with open(filename, encoding=encoding, newline='') as csvfile:
+            reader = csv.reader(csvfile, dialect='excel', delimiter=';')
+            table = cls(next(reader), index_cols, name_fields, vacancy_name, columns)
+            table.extend(reader, unique_names=unique_names)
+        return table
+
+    def extend(self, rows: Iterable[Sequence[str]], unique_names: bool = False):
+        """Append positional rows, as returned by csv.reader."""
+        columns = self.columns
+        ncols = len(columns)
+        index_pos = [(self._field_pos[ix], self.ix_by_field[ix]) for ix in self.index_cols]
+        name_pos = [self._field_pos[k] for k in self.name_fields] if self.name_fields else None
+
+        i = self._nrows
+        for values in rows:
+            if not values:
+                continue
+            if len(values) < ncols:
+                values = [*values, *([""] * (ncols - len(values)))]
+            for col, value in zip(columns, values):
+                col.append(_intern(value))
+
+            for pos, index in index_pos:
+                value = values[pos]
+                if value != "0" and value != "":
+                    index[value] = i
+            if name_pos is not None and values[name_pos[0]] != self.vacancy_name:
+                name_key = tuple(values[p] for p in name_pos)
+                if unique_names and name_key in self.ix_by_name:
+                    print("Duplicate", name_key)
+                    raise RuntimeError("Name key is not unique enough")
+                self.ix_by_name[name_key] = i
+            i += 1
+        self._nrows = i
+
+    def copy(self) -> "EntryTable":
+        """Independent copy of the table and its indexes, without parsing the file again."""
+        table = object.__new__(type(self))
+        table.__dict__.update(self.__dict__)
+        table.columns = [list(col) for col in self.columns]
+        table.ix_by_field = {ix: dict(index) for ix, index in self.ix_by_field.items()}
+        table.ix_by_name = dict(self.ix_by_name)
+        return table
+
+    @property
+    def oe_columns(self) -> Optional[ModuleType]:
+        """Language module of the export, None if its header is not detected."""
+        return oe_columns.load(self.language) if self.language is not None else None
+
+    def __len__(self) -> int:
+        return self._nrows
+
+    def __contains__(self, field: str) -> bool:
+        return field in self._field_pos
+
+    def field_name(self, field: str) -> str:
+        """Name in the header of a column given by name or ID."""
+        return self._names.get(field, field)
+
+    def field_pos(self, field: str) -> int:
+        try:
+            return self._field_pos[field]
+        except KeyError:
+            raise KeyError(f"Column {field!r} not found in the OE file") from None
+
+    def column(self, field: str) -> list:
+        """The (live) list of values of a column."""
+        return self.columns[self.field_pos(field)]
+
+    def get(self, i: int, field: str):
+        return self.columns[self.field_pos(field)][i]
+
+    def set(self, i: int, field: str, value):
+        field = self.field_name(field)
+        col = self.columns[self.field_pos(field)]
+        old_value = col[i]
+        old_name_key = self.name_key(i) if self.name_fields and field in self.name_fields else None
+        col[i] = _intern(value) if isinstance(value, str) else value
+
+        if field in self.ix_by_field:
+            index = self.ix_by_field[field]
+            if index.get(old_value) == i:
+                del index[old_value]
+            if _is_index_value(value):
+                index[value] = i
+        if old_name_key is not None:
+            if self.ix_by_name.get(old_name_key) == i:
+                del self.ix_by_name[old_name_key]
+            self._index_name(i)
+
+    def name_key(self, i: int) -> NameKey:
+        return tuple(self.get(i, k) for k in self.name_fields)
+
+    def _index_name(self, i: int):
+        name_key = self.name_key(i)
+        if name_key[0] != self.vacancy_name:
+            self.ix_by_name[name_key] = i
+
+    def find(self, field: str, value) -> Optional[int]:
+        """Row with the given value in one of the `index_cols`, if any."""
+        return self.ix_by_field[self.field_name(field)].get(value)
+
+    def find_name(self, name_key: NameKey) -> Optional[int]:
+        return self.ix_by_name.get(name_key)
+
+    def index_sizes(self) -> Dict[str, int]:
+        """Number of keys of every index, the name index as "name"."""
+        sizes = {field: len(ix) for field, ix in self.ix_by_field.items()}
+        if self.name_fields:
+            sizes["name"] = len(self.ix_by_name)
+        return sizes
+
+    def row(self, i: int) -> dict:
+        return {k: self.columns[self._field_pos[k]][i] for k in self.header_keys}
+
+    def rows(self) -> Iterator[dict]:
+        for i in range(self._nrows):
+            yield self.row(i)
+
+    def append(self, row: dict) -> int:
+        """
+        Append a row given as dict, by column name or ID. Missing fields are
+        left empty; unknown fields raise a ValueError, as csv.DictWriter would.
+        """
+        wrong_fields = [k for k in row if k not in self._field_pos]
+        if wrong_fields:
+            raise ValueError("dict contains fields not in fieldnames: " + ", ".join(repr(x) for x in wrong_fields))
+
+        values = [""] * len(self.columns)
+        for k, value in row.items():
+            values[self._field_pos[k]] = value
+        i = self._nrows
+        for col, value in zip(self.columns, values):
+            col.append(_intern(value) if isinstance(value, str) else value)
+        self._nrows += 1
+
+        for ix, index in self.ix_by_field.items():
+            value = values[self._field_pos[ix]]
+            if _is_index_value(value):
+                index[value] = i
+        if self.name_fields:
+            self._index_name(i)
+        return i
+
+    def write(self, filename: Path, encoding: str = CSV_OUTPUT_ENCODING):
+        with open(filename, 'w', encoding=encoding, errors=CSV_OUTPUT_ERRORS) as csvfile:
+            writer = csv.writer(csvfile, dialect='excel', delimiter=';')
+
+            writer.writerow(self.header_keys)
+            writer.writerows(zip(*self.columns))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Single entry point for all the naz2022 tools.
+
+    python oe_tools.py add-eventor-entries --oe-entries ... --eventor-entries ... --output ...
+    python oe_tools.py solv-lookup --solv-db solv-competitors.csv --sicard 1234567
+
+Each subcommand is the `main` of the matching script, with the same options.
+Only the module of the requested subcommand is imported, and the modules
+import pandas/NumPy inside the functions which need them, so a lookup or a
+`--help` does not pay for the heavy imports. `STARTUP_BUDGET_S` is the time
+allowed for starting the interpreter and loading a command, checked by
+benchmark.py.
+"""
+
+import importlib
+import sys
+from typing import Dict, Tuple
+
+
+STARTUP_BUDGET_S = 0.25
+
+# command: (module, typer commands, help)
+COMMANDS: Dict[str, Tuple[str, Tuple[str, ...], str]] = {
+    "add-eventor-entries": ("add_eventor_entries", ("main",), "Import the IOF Eventor entries"),
+    "add-late-entries": ("add_late_entries", ("main",), "Import the late registrations"),
+    "fix-missing-iof": ("fix_missing_iof", ("main",), "Add the manually matched IOF IDs"),
+    "define-wre-start-blocks": ("define_wre_start_blocks", ("main",), "Start blocks by reverse IOF ranking"),
+    "start-blocks": ("start_blocks", ("main",), "Ranking-seeded start blocks for any class"),
+    "draw-startlist": ("draw_startlist", ("main",), "Draw the start times of all the classes"),
+    "define-common-startnr": ("define_common_startnr", ("main",), "Common start numbers among multiple events"),
+    "export-startnr-for-print": ("export_startnr_for_print", ("main",), "Combine the start lists for printing the bibs"),
+    "audit-entries": ("audit_entries", ("main",), "Check the consistency of entry and start list files"),
+    "validate-startlist": ("validate_startlist", ("main",), "Check the start lists before printing"),
+    "iof-xml": ("iof_xml", ("entry_list", "start_list"), "Export IOF XML 3.0 entry and start lists"),
+    "render-bibs": ("render_bibs", ("main",), "Render the start number bibs as PDF"),
+    "pipeline": ("pipeline", ("main",), "Run the whole entries preparation"),
+    "watch": ("watch", ("main",), "Run the pipeline again when its inputs change"),
+    "iof-ranking": ("iof_ranking", ("add", "show"), "Manage the IOF ranking store"),
+    "solv-lookup": ("solv_db", ("lookup",), "Look up runners in the SOLV DB"),
+    "desk-lookup": ("desk_lookup", ("main",), "Serve SOLV DB lookups to the registration desk"),
+    "synthetic-data": ("synthetic_data", ("main",), "Generate synthetic inputs"),
+    "benchmark": ("benchmark", ("main",), "Benchmark the tools on synthetic data"),
+}
+
+
+def usage() -> str:
+    width = max(len(c) for c in COMMANDS)
+    lines = ["Usage: oe_tools.py COMMAND [OPTIONS]", "", "Commands:"]
+    lines += [f"  {command:{width}}  {help}" for command, (_, _, help) in COMMANDS.items()]
+    lines += ["", "Run `oe_tools.py COMMAND --help` for the options of a command."]
+    return "\n".join(lines)
+
+
+def load_app(command: str):
+    """Import the module of `command` and wrap its functions in a typer app."""
+    import typer
+
+    module_name, functions, help = COMMANDS[command]
+    module = importlib.import_module(module_name)
+    app = typer.Typer(no_args_is_help=True, add_completion=False, help=help)
+    for function in functions:
+        app.command()(getattr(module, function))
+    return app
+
+
+def run(command: str, args):
+    load_app(command)(args=args, prog_name=f"oe_tools.py {command}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    if argv[0] not in COMMANDS:
+        print(f"Unknown command {argv[0]!r}\n", file=sys.stderr)
+        print(usage(), file=sys.stderr)
+        sys.exit(2)
+    run(argv[0], argv[1:])
+
+
+if __name__ == '__main__':
+    main()
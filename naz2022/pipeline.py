@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Run the whole entries preparation of prepare_entries.sh in a single process.
+
+Each event is loaded once into an EntryTable and passed through the stages
+add_eventor_entries -> add_late_entries -> fix_missing_iof ->
+define_wre_start_blocks, then define_common_startnr is run over all events.
+The events are independent until the common start numbers, so they are
+processed in parallel, one process per event.
+The pipeline is described by a JSON file, see pipeline_naz2022.json.
+
+The output of every stage of an event is kept in the stage cache (see
+stage_cache.py), keyed by the stages before it and by the content of its
+inputs: a stage whose key is found is not run again, the event continues from
+the cached table. The late entries are keyed by their sheet alone, so when
+only the Sunday sheet changes the Saturday stages are all taken from the
+cache. The common start numbers are drawn at random, so they are always run.
+The late entries of the ledger are looked up again when the SOLV DB changes,
+so it only speeds up the stage and does not change its output. When the
+stage runs, the late entries new or changed since the ledger are written to
+`<output>_delta.csv`, as by add_late_entries.py; a cached stage does not
+update the ledger and writes an empty delta.
+"""
+
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import typer
+
+import oe_columns
+from oe_entries import CSV_OUTPUT_ENCODING, CSV_OUTPUT_ERRORS, EntryTable
+from late_ledger import LateEntriesLedger
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, RunReport, Stage, measure_run
+from solv_db import SolvDB
+from ingest import Source, load_sources
+from stage_cache import MAX_CACHE_MB, STAGE_CACHE_DIR, StageCache, stage_key, tools_digest
+import add_eventor_entries
+import add_late_entries
+import fix_missing_iof
+import define_wre_start_blocks
+import define_common_startnr
+import iof_xml
+
+
+GO2OLID_FIELD = fix_missing_iof.GO2OLID_FIELD
+# Name of the table in the cached outputs of a stage, in UTF-8 to keep every name
+CACHED_TABLE = "table.csv"
+CACHED_TABLE_ENCODING = "UTF8"
+
+
+@dataclass
+class EventConfig:
+    name: str
+    oe_entries: Path
+    eventor_entries: Optional[Path] = None
+    late_entries_sheet: Optional[str] = None
+    missing_iof: Optional[Path] = None
+    output: Optional[Path] = None
+    late_entries_ledger: Optional[Path] = None
+    # IOF XML EntryList of the final entries
+    entry_list: Optional[Path] = None
+
+    def output_filename(self) -> Path:
+        return self.output or Path(f"{self.name}_entries_final.csv")
+
+
+@dataclass
+class PipelineConfig:
+    events: List[EventConfig]
+    solv_db: Optional[Path] = None
+    late_entries: Optional[Path] = None
+    men_ranking: Optional[Path] = None
+    women_ranking: Optional[Path] = None
+    # Language of the OE exports, detected from their header by default
+    language: Optional[str] = None
+    common_startnr: bool = True
+
+
+INPUT_KEYS = ("oe_entries", "eventor_entries", "missing_iof", "solv_db", "late_entries", "men_ranking", "women_ranking")
+
+
+def load_config(config_filename: Path) -> PipelineConfig:
+    """
+    Read the pipeline description. Input paths are relative to `data_root`
+    (which defaults to the folder of the config file), outputs are relative
+    to the working directory.
+    """
+    with open(config_filename, encoding="UTF8") as f:
+        raw = json.load(f)
+
+    data_root = Path(raw.pop("data_root", config_filename.parent)).expanduser()
+
+    def _paths(d: dict) -> dict:
+        d = dict(d)
+        for k in INPUT_KEYS:
+            if d.get(k):
+                d[k] = data_root / Path(d[k]).expanduser()
+        for k in ("output", "late_entries_ledger", "entry_list"):
+            if d.get(k):
+                d[k] = Path(d[k])
+        return d
+
+    events = [EventConfig(**_paths(e)) for e in raw.pop("events")]
+    return PipelineConfig(events=events, **_paths(raw))
+
+
+def input_path(config: PipelineConfig, event: EventConfig, key: str) -> Optional[Path]:
+    """Input file `key` of INPUT_KEYS of an event, given per event or for the whole pipeline."""
+    return getattr(event, key) if hasattr(event, key) else getattr(config, key)
+
+
+@dataclass
+class EventStep:
+    """A stage of an event after reading the OE entries, run on the table in place."""
+    name: str
+    # Keys of the input files it reads, in EventConfig or PipelineConfig
+    inputs: Tuple[str, ...]
+    # run(data, stage), where stage(name, **kwargs) measures a stage of the report
+    run: Callable[[EntryTable, Callable], None]
+    # Of the intermediate output, if any
+    suffix: Optional[str] = None
+    # Parameters of the stage, part of its cache key
+    params: Optional[Dict[str, str]] = None
+    # Files written by the stage besides the table, kept in the cache with it
+    outputs: Tuple[Path, ...] = ()
+    # Parsing of its input file, loaded ahead together with the table
+    source: Optional[Source] = None
+    # on_cached(data), run instead of `run` when its output is taken from the cache
+    on_cached: Optional[Callable[[EntryTable], None]] = None
+
+
+def read_table(config: PipelineConfig, event: EventConfig, cached: Optional[Path] = None) -> EntryTable:
+    """The OE entries of an event, or the `cached` table of one of its stages."""
+    index_cols = add_eventor_entries.INDEX_COLS
+    if event.missing_iof:
+        index_cols = (*index_cols, GO2OLID_FIELD)
+
+    typer.echo(f"Reading entries from CSV file {cached or event.oe_entries}")
+    columns = oe_columns.load(config.language) if config.language else None
+    if cached:
+        return EntryTable.read(cached, index_cols, name_fields=add_eventor_entries.NAME_FIELDS, encoding=CACHED_TABLE_ENCODING, columns=columns)
+    return EntryTable.read(event.oe_entries, index_cols, name_fields=add_eventor_entries.NAME_FIELDS, unique_names=True, columns=columns)
+
+
+def read_event(config: PipelineConfig, event: EventConfig, stage: Callable, cached: Optional[Path] = None) -> EntryTable:
+    with stage("read_cached" if cached else "read_oe_entries") as st:
+        data = read_table(config, event, cached)
+        st.rows_out = len(data)
+        st.indexes = data.index_sizes()
+    return data
+
+
+def event_steps(config: PipelineConfig, event: EventConfig, solv_db=None, rankings=None, inputs: Optional[Dict[str, Any]] = None) -> List[EventStep]:
+    """
+    The stages configured for an event, in order. The inputs of the stages
+    already loaded (see EventStep.source) are given by name in `inputs`,
+    the others are read by the stages.
+    """
+    inputs = inputs or {}
+    steps = []
+
+    if event.eventor_entries:
+        def _eventor(data: EntryTable, stage: Callable):
+            with stage("add_eventor_entries", rows_in=len(data)) as st:
+                total_eventor, total_added, _ = add_eventor_entries.add_eventor_entries(data, event.eventor_entries, entries=inputs.get("eventor_entries"))
+                st.rows_out = len(data)
+                st.indexes = data.index_sizes()
+            typer.secho(f'Added {total_added} of {total_eventor} Eventor entries', fg=typer.colors.GREEN)
+        source = Source("eventor_entries", add_eventor_entries.read_person_entries, (event.eventor_entries,), process=True)
+        steps.append(EventStep("add_eventor_entries", ("eventor_entries",), _eventor, "eventor", source=source))
+
+    if event.late_entries_sheet:
+        delta_filename = add_late_entries.delta_filename_of(event.output_filename())
+
+        def _late(data: EntryTable, stage: Callable):
+            ledger = LateEntriesLedger(event.late_entries_ledger) if event.late_entries_ledger else None
+            with stage("add_late_entries", rows_in=len(data)) as st:
+                new_rows = add_late_entries.add_late_entries(data, solv_db, config.late_entries, event.late_entries_sheet, ledger, inputs.get("late_entries"))
+                st.rows_out = len(data)
+                st.indexes = data.index_sizes()
+            if ledger is not None:
+                add_late_entries.write_delta(delta_filename, data, new_rows)
+                ledger.save()
+
+        def _late_cached(data: EntryTable):
+            if event.late_entries_ledger:
+                add_late_entries.write_delta(delta_filename, data, [])
+        source = Source("late_entries", add_late_entries.read_late_entries, (config.late_entries, event.late_entries_sheet), process=True)
+        steps.append(EventStep("add_late_entries", ("late_entries", "solv_db"), _late, "late", {"sheet": event.late_entries_sheet}, source=source, on_cached=_late_cached))
+
+    if event.missing_iof:
+        def _ioffix(data: EntryTable, stage: Callable):
+            with stage("fix_missing_iof", rows_in=len(data)) as st:
+                fix_missing_iof.fix_missing_iof(data, event.missing_iof, inputs.get("missing_iof"))
+                st.rows_out = len(data)
+        source = Source("missing_iof", fix_missing_iof.read_missing_iof, (event.missing_iof,), process=True)
+        steps.append(EventStep("fix_missing_iof", ("missing_iof",), _ioffix, "ioffix", source=source))
+
+    if rankings:
+        def _wre(data: EntryTable, stage: Callable):
+            with stage("define_wre_start_blocks", rows_in=len(data)) as st:
+                df = define_wre_start_blocks.define_wre_start_blocks(data, *rankings)
+                st.rows_out = len(df)
+            with stage("write_report", rows_in=len(df)):
+                define_wre_start_blocks.write_report(df, event.output_filename())
+        report_filename = define_wre_start_blocks.wre_report_filename(event.output_filename())
+        steps.append(EventStep("define_wre_start_blocks", ("men_ranking", "women_ranking"), _wre, outputs=(report_filename,)))
+
+    return steps
+
+
+def write_event(event: EventConfig, data: EntryTable, stage: Callable):
+    output_filename = event.output_filename()
+    typer.echo(f"Writing output to {output_filename}")
+    with stage("write_output", rows_in=len(data)):
+        data.write(output_filename)
+
+
+def step_keys(cache: StageCache, config: PipelineConfig, event: EventConfig, steps: List[EventStep]) -> List[str]:
+    """Cache keys of the stages of an event, each one covering the stages before it."""
+    key = stage_key(
+        oe_entries=cache.file_digest(event.oe_entries),
+        language=config.language,
+        tools=tools_digest(),
+    )
+    keys = []
+    for step in steps:
+        digests = {}
+        for input_key in step.inputs:
+            filename = input_path(config, event, input_key)
+            if input_key == "late_entries":
+                digests[input_key] = cache.sheet_digest(filename, step.params["sheet"], add_late_entries.SHEET_SKIPROWS)
+            else:
+                digests[input_key] = cache.file_digest(filename)
+        key = stage_key(previous=key, stage=step.name, inputs=digests, params=step.params)
+        keys.append(key)
+    return keys
+
+
+def run_event(config: PipelineConfig, event: EventConfig, solv_db=None, rankings=None, keep_intermediate: bool = False, report: Optional[RunReport] = None, cache: Optional[StageCache] = None, processes: bool = True) -> EntryTable:
+    """
+    Run the stages of one event, measured as `<event name>/<stage>` in
+    `report`. With a `cache`, the stages already cached are skipped.
+    Without `processes` (in a worker of the pipeline pool), the inputs are
+    loaded in threads only.
+    """
+    typer.secho(f"=== {event.name} ===", fg=typer.colors.MAGENTA)
+    report = report or RunReport("pipeline")
+
+    def _stage(name: str, **kwargs):
+        return report.stage(f"{event.name}/{name}", **kwargs)
+
+    steps = event_steps(config, event, solv_db, rankings)
+    stems = []
+    stem = f"{event.name}_entries_go2ol"
+    for step in steps:
+        if step.suffix:
+            stem = f"{stem}_{step.suffix}"
+        stems.append(stem)
+
+    # Outputs of the cached stages, until the first one to run
+    start = 0
+    cached = None
+    if cache is not None:
+        with _stage("cache_lookup"):
+            keys = step_keys(cache, config, event, steps)
+        for step, key, stem in zip(steps, keys, stems):
+            files = cache.get(key)
+            if files is None:
+                break
+            typer.echo(f"Reusing the cached output of {step.name}")
+            for filename in step.outputs:
+                shutil.copyfile(files[filename.name], filename)
+            if step.suffix and keep_intermediate:
+                with open(files[CACHED_TABLE], encoding=CACHED_TABLE_ENCODING, newline='') as src, \
+                        open(f"{stem}.csv", 'w', encoding=CSV_OUTPUT_ENCODING, errors=CSV_OUTPUT_ERRORS, newline='') as dst:
+                    shutil.copyfileobj(src, dst)
+            cached = files[CACHED_TABLE]
+            start += 1
+
+    # The table is read while the inputs of the stages to run are parsed
+    inputs = load_sources([
+        Source("cached" if cached else "oe_entries", read_table, (config, event, cached)),
+        *(step.source for step in steps[start:]),
+    ], report, prefix=f"{event.name}/", processes=processes)
+    data = inputs.pop("cached" if cached else "oe_entries")
+    steps = event_steps(config, event, solv_db, rankings, inputs)
+    for step in steps[:start]:
+        if step.on_cached is not None:
+            step.on_cached(data)
+    for i in range(start, len(steps)):
+        step = steps[i]
+        step.run(data, _stage)
+        if step.suffix and keep_intermediate:
+            typer.echo(f"Writing intermediate output to {stems[i]}.csv")
+            with _stage(f"write_{step.suffix}", rows_in=len(data)):
+                data.write(Path(f"{stems[i]}.csv"))
+        if cache is not None:
+            with _stage(f"cache_{step.name}", rows_in=len(data)), tempfile.TemporaryDirectory() as tmp_dir:
+                table_filename = Path(tmp_dir) / CACHED_TABLE
+                data.write(table_filename, CACHED_TABLE_ENCODING)
+                cache.put(keys[i], f"{event.name}/{step.name}", {CACHED_TABLE: table_filename, **{f.name: f for f in step.outputs}})
+
+    write_event(event, data, _stage)
+    return data
+
+
+def load_shared_inputs(config: PipelineConfig, report: RunReport, solv_db: bool = True, rankings: bool = True) -> Tuple[Optional[SolvDB], Any]:
+    """
+    The SOLV DB (if a late entries sheet needs it) and the men and women
+    rankings (if both are given), loaded concurrently. Only those selected
+    by `solv_db` and `rankings` are loaded, the others are None.
+    """
+    late_entries = solv_db and any(e.late_entries_sheet for e in config.events)
+    rankings = rankings and bool(config.men_ranking and config.women_ranking)
+    inputs = load_sources([
+        Source("solv_db", add_late_entries.load_solv_db, (config.solv_db,)) if late_entries else None,
+        Source("men_ranking", define_wre_start_blocks.load_ranking, (config.men_ranking, "men")) if rankings else None,
+        Source("women_ranking", define_wre_start_blocks.load_ranking, (config.women_ranking, "women")) if rankings else None,
+    ], report)
+    return inputs.get("solv_db"), (inputs["men_ranking"], inputs["women_ranking"]) if rankings else None
+
+
+# Shared read-only inputs of the worker processes, set once per worker
+_worker_inputs = {}
+
+def _init_worker(solv_index_filename: Optional[Path], rankings, profile: Optional[str], trace_memory: Optional[str], cache_args: Optional[Tuple[Path, int]]):
+    _worker_inputs["solv_db"] = SolvDB(solv_index_filename) if solv_index_filename else None
+    _worker_inputs["rankings"] = rankings
+    _worker_inputs["profile"] = profile
+    _worker_inputs["trace_memory"] = trace_memory
+    # Each process has its own connection to the cache index
+    _worker_inputs["cache"] = StageCache(*cache_args) if cache_args else None
+
+def _run_event_worker(config: PipelineConfig, event: EventConfig, keep_intermediate: bool, report_filename: Optional[Path]) -> Tuple[EntryTable, List[Stage]]:
+    # Stages measured in the worker are sent back with the table
+    report = RunReport("pipeline", _worker_inputs["profile"], _worker_inputs["trace_memory"], report_filename)
+    # The CPUs are taken by the workers, no pool is nested in them
+    data = run_event(config, event, _worker_inputs["solv_db"], _worker_inputs["rankings"], keep_intermediate, report, _worker_inputs["cache"], processes=False)
+    return data, report.stages
+
+
+def run_pipeline(config: PipelineConfig, keep_intermediate: bool = False, jobs: int = 1, report: Optional[RunReport] = None, cache: Optional[StageCache] = None) -> List[EntryTable]:
+    """
+    Run the stages of every event, then the common start numbers. With
+    `jobs` > 1 the events are processed concurrently in a process pool;
+    the SOLV DB index and the rankings are prepared once and handed to each
+    worker process when it starts, the workers open the `cache` again.
+    """
+    report = report or RunReport("pipeline")
+    solv_db, rankings = load_shared_inputs(config, report)
+
+    jobs = min(jobs, len(config.events))
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Workers open the (already built) SOLV DB index themselves
+        solv_index_filename = solv_db.index_filename if solv_db else None
+        cache_args = (cache.cache_dir, cache.max_bytes) if cache else None
+        initargs = (solv_index_filename, rankings, report.profile, report.trace_memory, cache_args)
+        with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=initargs) as executor:
+            futures = [
+                executor.submit(_run_event_worker, config, event, keep_intermediate, report.report_filename)
+                for event in config.events
+            ]
+            tables = []
+            for f in futures:
+                data, stages = f.result()
+                tables.append(data)
+                report.extend(stages)
+    else:
+        tables = [
+            run_event(config, event, solv_db, rankings, keep_intermediate, report, cache)
+            for event in config.events
+        ]
+
+    finish_pipeline(config, tables, report)
+    return tables
+
+
+def finish_pipeline(config: PipelineConfig, tables: List[EntryTable], report: RunReport):
+    """Common start numbers and IOF XML entry lists of the final tables of the events."""
+    if config.common_startnr:
+        total_rows = sum(len(data) for data in tables)
+        with report.stage("define_common_startnr", rows_in=total_rows) as st:
+            define_common_startnr.define_common_startnr(tables)
+            st.rows_out = total_rows
+        for event, data in zip(config.events, tables):
+            output_filename = event.output_filename()
+            output_filename = output_filename.with_stem(f"{output_filename.stem}_startnr")
+            typer.echo(f"Writing output to {output_filename}")
+            with report.stage(f"{event.name}/write_startnr", rows_in=len(data)):
+                data.write(output_filename)
+
+    for event, data in zip(config.events, tables):
+        if event.entry_list:
+            typer.echo(f"Writing entry list to {event.entry_list}")
+            with report.stage(f"{event.name}/write_entry_list", rows_in=len(data)) as st:
+                st.rows_out = iof_xml.write_entry_list(event.entry_list, data, event.name)
+
+
+def main(
+    config_filename: Path=typer.Argument(..., help="JSON file describing the events and their inputs"),
+    keep_intermediate: bool=typer.Option(False, help="Write the CSV output of every stage"),
+    jobs: int=typer.Option(0, "--jobs", "-j", help="Number of events processed in parallel. 0: one process per event"),
+    use_cache: bool=typer.Option(True, "--cache/--no-cache", help="Reuse the outputs of the stages whose inputs did not change"),
+    cache_dir: Path=typer.Option(STAGE_CACHE_DIR, help="Folder of the stage cache"),
+    cache_size: int=typer.Option(MAX_CACHE_MB, help="Size of the stage cache in MB, the least recently used outputs are removed beyond it"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    config = load_config(config_filename)
+    if jobs <= 0:
+        jobs = min(len(config.events), os.cpu_count() or 1)
+    with measure_run("pipeline", report_filename, profile, trace_memory) as report:
+        cache = StageCache(cache_dir, cache_size << 20) if use_cache else None
+        try:
+            run_pipeline(config, keep_intermediate, jobs, report, cache)
+        finally:
+            if cache is not None:
+                cache.close()
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
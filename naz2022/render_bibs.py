@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Render the start number bibs as print-ready PDF sheets.
+
+Reads the table written by export_startnr_for_print.py (start number, name
+and start/class/start time of every run) and lays out the bibs on pages
+following a JSON template (see DEFAULT_TEMPLATE):
+
+    {
+        "page_size": "A4", "landscape": false, "columns": 2, "rows": 4,
+        "margin_mm": 8, "fonts": {"Bib": "fonts/Bib-Bold.ttf"},
+        "number_font": "Bib", "number_size": 90, "background": "logo.png"
+    }
+
+The bibs are split in files of `--bibs-per-file` consecutive start numbers,
+rendered in a process pool; each worker registers the fonts and loads the
+background image once. A manifest keeps the content hash of every rendered
+bib, so that with `--only-changed` only the new or modified bibs (e.g. after
+late entries) are rendered, in `changed_bibs_*.pdf`.
+
+Needs reportlab (pip install reportlab).
+"""
+
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import typer
+
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+from workbook import iter_sheet
+
+
+MM = 72 / 25.4
+MANIFEST_VERSION = 1
+
+DEFAULT_TEMPLATE = {
+    "page_size": "A4",
+    "landscape": False,
+    "columns": 2,
+    "rows": 4,
+    "margin_mm": 8,
+    "padding_mm": 4,
+    "cut_marks": True,
+    # Name -> TTF file, relative to the template file
+    "fonts": {},
+    "number_font": "Helvetica-Bold",
+    "number_size": 90,
+    "name_font": "Helvetica-Bold",
+    "name_size": 16,
+    "run_font": "Helvetica",
+    "run_size": 9,
+    # Image drawn on every bib, relative to the template file
+    "background": None,
+}
+
+STARTNR_COLUMN = "Startnummer"
+GIVEN_NAME_COLUMN = "Vorname"
+FAMILY_NAME_COLUMN = "Nachname"
+RUN_PREFIXES = ("Start (", "Kategorie (", "Startzeit (")
+
+
+@dataclass
+class Bib:
+    startnr: str
+    given_name: str
+    family_name: str
+    # (label, start, class, start time) of every run
+    runs: Tuple[Tuple[str, str, str, str], ...]
+
+    def content_hash(self) -> str:
+        return hashlib.sha1(json.dumps([self.startnr, self.given_name, self.family_name, self.runs], ensure_ascii=False).encode()).hexdigest()
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def read_bibs(table_filename: Path) -> List[Bib]:
+    """Bibs of the export_startnr_for_print table, the runs found from the column names."""
+    bibs = []
+    labels = None
+    for row in iter_sheet(table_filename):
+        if labels is None:
+            labels = [h[len("Start ("):-1] for h in row.header if h.startswith("Start (")]
+        bibs.append(Bib(
+            _text(row[STARTNR_COLUMN]),
+            _text(row[GIVEN_NAME_COLUMN]),
+            _text(row[FAMILY_NAME_COLUMN]),
+            tuple(
+                (label, *(_text(row.get(f"{prefix}{label})")) for prefix in RUN_PREFIXES))
+                for label in labels
+            ),
+        ))
+    return bibs
+
+
+def load_template(template_filename: Optional[Path]) -> dict:
+    template = dict(DEFAULT_TEMPLATE)
+    if template_filename:
+        with open(template_filename, encoding="UTF8") as f:
+            template.update(json.load(f))
+        root = template_filename.parent
+        template["fonts"] = {name: str(root / path) for name, path in template["fonts"].items()}
+        if template["background"]:
+            template["background"] = str(root / template["background"])
+    return template
+
+
+# Fonts and images of the template, loaded once per process
+_assets: Dict[str, object] = {}
+
+def _load_assets(template: dict):
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.lib.utils import ImageReader
+
+    for name, path in template["fonts"].items():
+        if name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(name, path))
+    _assets["background"] = ImageReader(template["background"]) if template["background"] else None
+    _assets["template_key"] = json.dumps(template, sort_keys=True)
+
+
+def _page_size(template: dict) -> Tuple[float, float]:
+    from reportlab.lib import pagesizes
+
+    size = getattr(pagesizes, template["page_size"].upper())
+    return pagesizes.landscape(size) if template["landscape"] else pagesizes.portrait(size)
+
+
+def _fit_size(text: str, font: str, size: float, width: float) -> float:
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    text_width = stringWidth(text, font, size)
+    return size if text_width <= width else size * width / text_width
+
+
+def _draw_bib(c, bib: Bib, x: float, y: float, w: float, h: float, template: dict):
+    pad = template["padding_mm"] * MM
+    inner_w = w - 2 * pad
+    if _assets["background"] is not None:
+        c.drawImage(_assets["background"], x, y, w, h, preserveAspectRatio=True, mask="auto")
+    if template["cut_marks"]:
+        c.setLineWidth(0.25)
+        c.rect(x, y, w, h)
+
+    number_size = _fit_size(bib.startnr, template["number_font"], template["number_size"], inner_w)
+    c.setFont(template["number_font"], number_size)
+    c.drawCentredString(x + w / 2, y + h * 0.62 - number_size / 3, bib.startnr)
+
+    name = f"{bib.given_name} {bib.family_name}".strip()
+    name_size = _fit_size(name, template["name_font"], template["name_size"], inner_w)
+    c.setFont(template["name_font"], name_size)
+    c.drawCentredString(x + w / 2, y + h * 0.30, name)
+
+    c.setFont(template["run_font"], template["run_size"])
+    line_y = y + pad
+    for label, start, class_name, start_time in reversed(bib.runs):
+        if class_name or start_time:
+            c.drawString(x + pad, line_y, f"{label}: {class_name}  {start_time}  {start}".rstrip())
+        line_y += template["run_size"] * 1.3
+
+
+def render_pdf(output_filename: Path, bibs: Sequence[Bib], template: dict) -> int:
+    """Write the bibs to a PDF file, returns the number of pages."""
+    from reportlab.pdfgen import canvas
+
+    if _assets.get("template_key") != json.dumps(template, sort_keys=True):
+        _load_assets(template)
+
+    page_w, page_h = _page_size(template)
+    margin = template["margin_mm"] * MM
+    columns, rows = template["columns"], template["rows"]
+    bib_w = (page_w - 2 * margin) / columns
+    bib_h = (page_h - 2 * margin) / rows
+    per_page = columns * rows
+
+    c = canvas.Canvas(str(output_filename), pagesize=(page_w, page_h))
+    pages = 0
+    for start in range(0, len(bibs), per_page):
+        for n, bib in enumerate(bibs[start:start + per_page]):
+            col, row = n % columns, n // columns
+            _draw_bib(c, bib, margin + col * bib_w, page_h - margin - (row + 1) * bib_h, bib_w, bib_h, template)
+        c.showPage()
+        pages += 1
+    c.save()
+    return pages
+
+
+def _init_worker(template: dict):
+    _load_assets(template)
+
+def _render_worker(output_filename: Path, bibs: List[Bib], template: dict) -> int:
+    return render_pdf(output_filename, bibs, template)
+
+
+def render_bibs(bibs: List[Bib], template: dict, output_dir: Path, prefix: str = "bibs", bibs_per_file: int = 200, jobs: int = 1) -> List[Path]:
+    """
+    Render the bibs in files of `bibs_per_file` bibs named after their first
+    and last start number, in parallel with `jobs` > 1. Returns the files.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    chunks = []
+    for start in range(0, len(bibs), bibs_per_file):
+        chunk = bibs[start:start + bibs_per_file]
+        chunks.append((output_dir / f"{prefix}_{chunk[0].startnr}-{chunk[-1].startnr}.pdf", chunk))
+
+    jobs = min(jobs, len(chunks))
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(template,)) as executor:
+            futures = [executor.submit(_render_worker, filename, chunk, template) for filename, chunk in chunks]
+            pages = [f.result() for f in futures]
+    else:
+        pages = [render_pdf(filename, chunk, template) for filename, chunk in chunks]
+
+    for (filename, chunk), n in zip(chunks, pages):
+        typer.echo(f"Wrote {len(chunk)} bibs on {n} pages to {filename}")
+    return [filename for filename, _ in chunks]
+
+
+def load_manifest(manifest_filename: Path) -> Dict[str, str]:
+    if not manifest_filename.exists():
+        return {}
+    with open(manifest_filename, encoding="UTF8") as f:
+        raw = json.load(f)
+    return raw["bibs"] if raw.get("version") == MANIFEST_VERSION else {}
+
+
+def save_manifest(manifest_filename: Path, hashes: Dict[str, str]):
+    tmp_filename = manifest_filename.with_suffix(".tmp")
+    with open(tmp_filename, "w", encoding="UTF8") as f:
+        json.dump({"version": MANIFEST_VERSION, "bibs": hashes}, f, indent=1)
+    os.replace(tmp_filename, manifest_filename)
+
+
+def main(
+    table_filename: Path=typer.Option(..., "--startnr-table", help="Excel file written by export_startnr_for_print.py"),
+    template_filename: Optional[Path]=typer.Option(None, "--template", help="JSON template of the bibs"),
+    output_dir: Path=typer.Option(..., help="Folder of the PDF files"),
+    only_changed: bool=typer.Option(False, help="Only render the bibs new or modified since the last run"),
+    bibs_per_file: int=typer.Option(200, help="Number of bibs in each PDF file"),
+    jobs: int=typer.Option(0, "--jobs", "-j", help="Number of files rendered in parallel. 0: one process per CPU"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        typer.secho("render_bibs.py needs reportlab: pip install reportlab", fg=typer.colors.RED)
+        raise typer.Exit(1)
+
+    with measure_run("render_bibs", report_filename, profile, trace_memory) as report:
+        template = load_template(template_filename)
+
+        typer.echo(f"Reading start numbers from {table_filename}")
+        with report.stage("read_bibs") as st:
+            bibs = read_bibs(table_filename)
+            st.rows_out = len(bibs)
+
+        manifest_filename = output_dir / "bibs_manifest.json"
+        rendered = load_manifest(manifest_filename)
+        hashes = {bib.startnr: bib.content_hash() for bib in bibs}
+        prefix = "bibs"
+        if only_changed:
+            bibs = [bib for bib in bibs if rendered.get(bib.startnr) != hashes[bib.startnr]]
+            prefix = "changed_bibs"
+            typer.secho(f"{len(bibs)} new or modified bibs", fg=typer.colors.BLUE)
+        if not bibs:
+            return
+
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+        with report.stage("render", rows_in=len(bibs)) as st:
+            files = render_bibs(bibs, template, output_dir, prefix, bibs_per_file, jobs)
+            st.rows_out = len(files)
+
+        save_manifest(manifest_filename, {**rendered, **hashes})
+        typer.secho(f"Rendered {len(bibs)} bibs in {len(files)} files", fg=typer.colors.GREEN)
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
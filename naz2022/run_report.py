@@ -0,0 +1,194 @@
+"""
+Per-stage instrumentation of the tools, written as a JSON run report.
+
+Every tool wraps its stages (reading the inputs, processing, writing) in
+`report.stage(...)`, which records the wall and CPU time, the peak RSS of the
+process and, when given, the rows in/out and the index sizes of the stage.
+A stage selected with `--profile` is run under cProfile (the stats are dumped
+next to the report and the top functions included in it), one selected with
+`--trace-memory` under tracemalloc. Stage names can be patterns, e.g.
+`--profile "*/add_late_entries"` for every event of the pipeline.
+
+The CPU time and the RSS are those of the whole process: a stage run
+concurrently with others in threads (`concurrent=True`) only has its wall
+time, the CPU time and RSS growth of the threads being given by the run.
+
+    python add_late_entries.py ... --report late.json --profile add_late_entries
+
+The `main` of a tool takes the REPORT_OPTION, PROFILE_OPTION and
+TRACE_MEMORY_OPTION and runs in `with measure_run(...) as report:`, which
+writes the report however the run ends.
+"""
+
+import cProfile
+import contextlib
+import datetime
+from dataclasses import asdict, dataclass, field
+from fnmatch import fnmatchcase
+import json
+import os
+import platform
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import typer
+
+
+REPORT_VERSION = 1
+PROFILE_TOP = 25
+TRACE_TOP = 10
+
+REPORT_OPTION = typer.Option(None, "--report", help="Write a JSON run report with timings and memory per stage")
+PROFILE_OPTION = typer.Option(None, "--profile", help="Run the stages matching this name under cProfile (needs --report)")
+TRACE_MEMORY_OPTION = typer.Option(None, "--trace-memory", help="Trace the allocations of the stages matching this name (needs --report)")
+
+
+def _peak_rss_mb() -> float:
+    ru_maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else ru_maxrss / 1024
+
+
+@dataclass
+class Stage:
+    name: str
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    indexes: Dict[str, int] = field(default_factory=dict)
+    wall_s: float = 0.0
+    # None for a stage run concurrently in a thread
+    cpu_s: Optional[float] = 0.0
+    peak_rss_mb: float = 0.0
+    rss_growth_mb: Optional[float] = 0.0
+    pid: int = 0
+    concurrent: bool = False
+    profile: Optional[dict] = None
+    memory: Optional[dict] = None
+
+
+def _profile_summary(profiler: cProfile.Profile, dump_filename: Optional[Path]) -> dict:
+    stats = pstats.Stats(profiler)
+    if dump_filename:
+        stats.dump_stats(dump_filename)
+    top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+    return {
+        "stats_file": str(dump_filename) if dump_filename else None,
+        "total_calls": stats.total_calls,
+        "top_cumulative": [
+            {
+                "function": f"{Path(filename).name}:{line}({name})",
+                "ncalls": nc,
+                "tottime_s": round(tt, 6),
+                "cumtime_s": round(ct, 6),
+            }
+            for (filename, line, name), (_, nc, tt, ct, _) in top
+        ],
+    }
+
+
+def _memory_summary(snapshot: tracemalloc.Snapshot, peak: int) -> dict:
+    return {
+        "peak_mb": peak / (1024 * 1024),
+        "top_allocations": [
+            {"location": str(stat.traceback[0]), "size_mb": stat.size / (1024 * 1024), "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:TRACE_TOP]
+        ],
+    }
+
+
+class RunReport:
+    """Stages of one tool run. Measuring is always on, the report is only written when asked."""
+
+    def __init__(self, tool: str, profile: Optional[str] = None, trace_memory: Optional[str] = None, report_filename: Optional[Path] = None):
+        self.tool = tool
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.report_filename = report_filename
+        self.stages: List[Stage] = []
+        self.started = datetime.datetime.now().isoformat(timespec="seconds")
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None, concurrent: bool = False) -> Iterator[Stage]:
+        """
+        Measure the block as a stage. The yielded Stage can be completed with
+        `rows_out` and `indexes` (see EntryTable.index_sizes) inside the block.
+        A `concurrent` stage, run in a thread next to others, is not given the
+        CPU time and RSS growth of the process.
+        """
+        st = Stage(name, rows_in=rows_in, pid=os.getpid(), concurrent=concurrent)
+        profiler = cProfile.Profile() if self.profile and fnmatchcase(name, self.profile) else None
+        trace = bool(self.trace_memory and fnmatchcase(name, self.trace_memory)) and not tracemalloc.is_tracing()
+        rss_before = _peak_rss_mb()
+        if trace:
+            tracemalloc.start()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield st
+        finally:
+            if profiler:
+                profiler.disable()
+            st.wall_s = time.perf_counter() - start_wall
+            st.cpu_s = None if concurrent else time.process_time() - start_cpu
+            if trace:
+                st.memory = _memory_summary(tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            if profiler:
+                st.profile = _profile_summary(profiler, self._stats_filename(name))
+            st.peak_rss_mb = _peak_rss_mb()
+            st.rss_growth_mb = None if concurrent else st.peak_rss_mb - rss_before
+            self.stages.append(st)
+
+    def _stats_filename(self, stage_name: str) -> Optional[Path]:
+        if not self.report_filename:
+            return None
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in stage_name)
+        return self.report_filename.with_name(f"{self.report_filename.stem}_{safe_name}.prof")
+
+    def extend(self, stages: List[Stage], prefix: str = ""):
+        """Add the stages measured elsewhere, e.g. in a worker process."""
+        for st in stages:
+            if prefix:
+                st.name = f"{prefix}/{st.name}"
+            self.stages.append(st)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": REPORT_VERSION,
+            "tool": self.tool,
+            "argv": sys.argv,
+            "started": self.started,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "wall_s": time.perf_counter() - self._start_wall,
+            "cpu_s": time.process_time() - self._start_cpu,
+            "peak_rss_mb": _peak_rss_mb(),
+            "stages": [asdict(st) for st in self.stages],
+        }
+
+    def write(self, report_filename: Optional[Path] = None):
+        """Write the report, if a file name was given here or to the constructor."""
+        report_filename = report_filename or self.report_filename
+        if not report_filename:
+            return
+        typer.echo(f"Writing run report to {report_filename}")
+        with open(report_filename, "w", encoding="UTF8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+@contextlib.contextmanager
+def measure_run(tool: str, report_filename: Optional[Path] = None, profile: Optional[str] = None, trace_memory: Optional[str] = None) -> Iterator[RunReport]:
+    """RunReport of a tool run from the options of its main, written when the block exits (also by typer.Exit or an error)."""
+    report = RunReport(tool, profile, trace_memory, report_filename)
+    try:
+        yield report
+    finally:
+        report.write()
@@ -0,0 +1,224 @@
+"""
+Pre-built index of the SOLV runners database (solv-competitors.csv).
+
+The CSV is compiled once into a SQLite file in the local cache folder, with
+indexes on the SOLV number, the SI-card and the (family, given, year) name
+key. Later runs only open the SQLite file, so nothing is parsed up front and
+a lookup touches just the pages it needs. The index is rebuilt when the size
+or mtime of the CSV changes and its content hash differs.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import typer
+
+
+CSV_INPUT_ENCODING = 'ISO-8859-1'
+
+CACHE_DIR = Path(os.environ.get("OE_TOOLS_CACHE", Path.home() / ".cache" / "oe-tools"))
+
+SOLVNR_FIELD = "Datenbank Id"
+SICARD_FIELD = "Chipnr SI"
+FAMILY_NAME_FIELD = "Nachname"
+GIVEN_NAME_FIELD = "Vorname"
+BIRTH_FIELD = "Jg"
+
+INDEX_VERSION = "1"
+
+
+def _file_hash(filename: Path) -> str:
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _index_filename(solv_input_filename: Path) -> Path:
+    key = hashlib.sha1(str(Path(solv_input_filename).resolve()).encode()).hexdigest()[:12]
+    return CACHE_DIR / f"{Path(solv_input_filename).stem}-{key}.sqlite"
+
+
+def _db_row(row: dict) -> dict:
+    # Same aliases as the OE entry columns
+    row["Chipnr"] = row["Chipnr SI"]
+    row["Geschlecht"] = row["G"]
+    return row
+
+
+def build_index(solv_input_filename: Path, index_filename: Path, source_hash: Optional[str] = None):
+    """Compile the SOLV CSV into the SQLite index file."""
+    index_filename.parent.mkdir(parents=True, exist_ok=True)
+    tmp_filename = index_filename.with_suffix(".tmp")
+    if tmp_filename.exists():
+        tmp_filename.unlink()
+
+    stat = os.stat(solv_input_filename)
+    con = sqlite3.connect(tmp_filename)
+    con.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE runner (solvnr TEXT, sicard TEXT, family TEXT, given TEXT, year TEXT, row TEXT);
+    """)
+    with open(solv_input_filename, encoding=CSV_INPUT_ENCODING) as csvfile:
+        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
+        con.executemany(
+            "INSERT INTO runner VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    row[SOLVNR_FIELD],
+                    row[SICARD_FIELD],
+                    row[FAMILY_NAME_FIELD],
+                    row[GIVEN_NAME_FIELD],
+                    row[BIRTH_FIELD],
+                    json.dumps(row, ensure_ascii=False),
+                )
+                for row in reader
+            ),
+        )
+    con.executescript("""
+        CREATE INDEX runner_solvnr ON runner (solvnr);
+        CREATE INDEX runner_sicard ON runner (sicard);
+        CREATE INDEX runner_name ON runner (family, given, year);
+    """)
+    con.executemany("INSERT INTO meta VALUES (?, ?)", (
+        ("version", INDEX_VERSION),
+        ("size", str(stat.st_size)),
+        ("mtime_ns", str(stat.st_mtime_ns)),
+        ("sha256", source_hash or _file_hash(solv_input_filename)),
+    ))
+    con.commit()
+    con.close()
+    os.replace(tmp_filename, index_filename)
+
+
+class SolvDB:
+    """
+    Read-only view of the compiled SOLV DB. Behaves like the former
+    `solv_db` dict keyed by SOLV number: `solvnr in db`, `db[solvnr]`.
+    """
+
+    def __init__(self, index_filename: Path):
+        self.index_filename = index_filename
+        self._con = sqlite3.connect(f"{Path(index_filename).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+
+    @classmethod
+    def open(cls, solv_input_filename: Path, index_filename: Optional[Path] = None) -> "SolvDB":
+        """Open the index of `solv_input_filename`, (re)building it when stale."""
+        index_filename = index_filename or _index_filename(solv_input_filename)
+        if not index_filename.exists():
+            build_index(solv_input_filename, index_filename)
+            return cls(index_filename)
+
+        db = cls(index_filename)
+        meta = db.meta()
+        stat = os.stat(solv_input_filename)
+        if meta.get("version") == INDEX_VERSION and meta.get("size") == str(stat.st_size) and meta.get("mtime_ns") == str(stat.st_mtime_ns):
+            return db
+
+        # Touched or synced again: only rebuild if the content changed
+        source_hash = _file_hash(solv_input_filename)
+        db.close()
+        if meta.get("version") == INDEX_VERSION and meta.get("sha256") == source_hash:
+            con = sqlite3.connect(index_filename)
+            con.executemany("UPDATE meta SET value = ? WHERE key = ?", (
+                (str(stat.st_size), "size"),
+                (str(stat.st_mtime_ns), "mtime_ns"),
+            ))
+            con.commit()
+            con.close()
+        else:
+            build_index(solv_input_filename, index_filename, source_hash)
+        return cls(index_filename)
+
+    def meta(self) -> dict:
+        return dict(self._con.execute("SELECT key, value FROM meta"))
+
+    def digest(self) -> str:
+        """Content hash of the CSV the index was built from."""
+        return self.meta().get("sha256", "")
+
+    def close(self):
+        self._con.close()
+
+    def _rows(self, where: str, params) -> List[dict]:
+        cur = self._con.execute(f"SELECT row FROM runner WHERE {where} ORDER BY rowid", params)
+        return [_db_row(json.loads(r)) for (r,) in cur]
+
+    def get(self, solvnr, default=None) -> Optional[dict]:
+        rows = self._rows("solvnr = ?", (str(solvnr),))
+        # The last occurrence wins, as with the former dict
+        return rows[-1] if rows else default
+
+    def __getitem__(self, solvnr) -> dict:
+        row = self.get(solvnr)
+        if row is None:
+            raise KeyError(solvnr)
+        return row
+
+    def __contains__(self, solvnr) -> bool:
+        return self._con.execute("SELECT 1 FROM runner WHERE solvnr = ? LIMIT 1", (str(solvnr),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._con.execute("SELECT COUNT(*) FROM runner").fetchone()[0]
+
+    def by_sicard(self, sicard) -> List[dict]:
+        return self._rows("sicard = ?", (str(sicard),))
+
+    def by_name(self, family_name: str, given_name: str, birth_year) -> List[dict]:
+        return self._rows("family = ? AND given = ? AND year = ?", (family_name, given_name, str(birth_year)))
+
+    def search_name(self, family_name: str, given_name: Optional[str] = None, birth_year=None) -> List[dict]:
+        """Runners by family name, optionally narrowed by given name and birth year."""
+        where, params = ["family = ?"], [family_name]
+        if given_name:
+            where.append("given = ?")
+            params.append(given_name)
+        if birth_year:
+            where.append("year = ?")
+            params.append(str(birth_year))
+        return self._rows(" AND ".join(where), params)
+
+    def rows(self) -> Iterator[dict]:
+        for (r,) in self._con.execute("SELECT row FROM runner ORDER BY rowid"):
+            yield _db_row(json.loads(r))
+
+
+LOOKUP_COLUMNS = (SOLVNR_FIELD, SICARD_FIELD, FAMILY_NAME_FIELD, GIVEN_NAME_FIELD, BIRTH_FIELD, "Ort", "Nat")
+
+
+def lookup(
+    solv_input_filename: Path=typer.Option(..., "--solv-db", help="File CSV con DB SOLV"),
+    solvnr: Optional[str]=typer.Option(None, help="SOLV number"),
+    sicard: Optional[str]=typer.Option(None, help="SI-card number"),
+    family_name: Optional[str]=typer.Option(None, "--family", help="Family name"),
+    given_name: Optional[str]=typer.Option(None, "--given", help="Given name, with --family"),
+    birth_year: Optional[str]=typer.Option(None, "--year", help="Birth year, with --family"),
+    ):
+    """Look up runners in the SOLV DB by SOLV number, SI-card or name."""
+    db = SolvDB.open(solv_input_filename)
+    rows = []
+    if solvnr and solvnr in db:
+        rows.append(db[solvnr])
+    if sicard:
+        rows.extend(db.by_sicard(sicard))
+    if family_name:
+        rows.extend(db.search_name(family_name, given_name, birth_year))
+    db.close()
+
+    if not rows:
+        typer.secho("No runner found", fg=typer.colors.YELLOW)
+        raise typer.Exit(1)
+    for row in rows:
+        typer.echo("    ".join(row.get(k, "") for k in LOOKUP_COLUMNS))
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(lookup)
+    app()
@@ -0,0 +1,160 @@
+"""
+Content-addressed cache of the outputs of the pipeline stages.
+
+The key of a stage is a hash of everything its output depends on: the key of
+the previous stage (so a key covers the whole chain up to the stage), the
+content of its input files, its parameters and the version of the tools (the
+sources of the modules run by the stages, STAGE_SOURCES: editing a test or
+another tool keeps the cache). When the key is found, the stage is skipped
+and its output files are taken from the cache instead. A sheet of a workbook
+can be hashed by itself, so that the late entries of one day do not change
+the keys of the other day.
+
+The files are kept in the local cache folder (`OE_TOOLS_CACHE`), one folder
+per key, and listed in a SQLite index together with their size and the time
+of their last use. When the cache grows beyond `max_bytes`, the least
+recently used entries are removed. The content hashes of the input files
+(and sheets) are also kept, by path, size and mtime, so an unchanged file is
+not read again to compute the keys. Several processes can use the same cache, an entry is
+moved in place only once complete.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from late_ledger import row_hash
+from solv_db import CACHE_DIR, _file_hash
+from workbook import iter_sheet
+
+
+CACHE_VERSION = "1"
+# Sources run by the pipeline stages (the modules imported by pipeline.py), as their version
+STAGE_SOURCES = (
+    "add_eventor_entries.py", "add_late_entries.py", "define_common_startnr.py", "define_wre_start_blocks.py",
+    "fix_missing_iof.py", "fuzzy_match.py", "identity.py", "ingest.py", "iof_ranking.py", "iof_xml.py",
+    "late_ledger.py", "oe_columns", "oe_entries.py", "pipeline.py", "run_report.py", "solv_db.py",
+    "stage_cache.py", "start_blocks.py", "workbook.py",
+)
+STAGE_CACHE_DIR = CACHE_DIR / "stages"
+MAX_CACHE_MB = 500
+
+
+@lru_cache(maxsize=None)
+def tools_digest() -> str:
+    """Hash of the STAGE_SOURCES, as the version of the stages."""
+    h = hashlib.sha256(CACHE_VERSION.encode())
+    root = Path(__file__).parent
+    filenames = (root / name for name in STAGE_SOURCES)
+    for filename in sorted(f for path in filenames for f in (sorted(path.rglob("*.py")) if path.is_dir() else [path])):
+        h.update(filename.relative_to(root).as_posix().encode())
+        h.update(filename.read_bytes())
+    return h.hexdigest()
+
+
+def stage_key(**parts) -> str:
+    """Key of a stage from its parts, which must be JSON serializable."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class StageCache:
+
+    def __init__(self, cache_dir: Path = STAGE_CACHE_DIR, max_bytes: int = MAX_CACHE_MB << 20):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._con = sqlite3.connect(self.cache_dir / "index.sqlite", timeout=30, isolation_level=None)
+        self._con.executescript("""
+            CREATE TABLE IF NOT EXISTS entry (key TEXT PRIMARY KEY, stage TEXT, files TEXT, size INTEGER, used REAL);
+            CREATE TABLE IF NOT EXISTS file_hash (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT);
+        """)
+        # Also when opened with a smaller size than before
+        self.evict()
+
+    def close(self):
+        self._con.close()
+
+    def _digest(self, filename: Path, part: str, compute: Callable[[Path], str]) -> str:
+        """`compute(filename)`, only called again when the size or mtime of the file changed."""
+        filename = Path(filename).resolve()
+        path = f"{filename}#{part}" if part else str(filename)
+        stat = os.stat(filename)
+        row = self._con.execute("SELECT size, mtime_ns, sha256 FROM file_hash WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = compute(filename)
+        self._con.execute("INSERT OR REPLACE INTO file_hash VALUES (?, ?, ?, ?)", (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def file_digest(self, filename: Path) -> str:
+        """Content hash of a file."""
+        return self._digest(filename, "", _file_hash)
+
+    def sheet_digest(self, filename: Path, sheet_name: str, skiprows: int = 0) -> str:
+        """Content hash of one sheet of a workbook, unchanged when only the other sheets are modified."""
+        def _sheet_hash(filename: Path) -> str:
+            h = hashlib.sha256()
+            for n, row in enumerate(iter_sheet(filename, sheet_name, skiprows)):
+                if n == 0:
+                    h.update(row_hash(row.header).encode())
+                h.update(row_hash(row).encode())
+            return h.hexdigest()
+        return self._digest(filename, f"{sheet_name}#{skiprows}", _sheet_hash)
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def get(self, key: str) -> Optional[Dict[str, Path]]:
+        """{name: cached file} of a stage output, None if not cached."""
+        row = self._con.execute("SELECT files FROM entry WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        files = {name: self._entry_dir(key) / name for name in json.loads(row[0])}
+        if not all(f.exists() for f in files.values()):
+            self._remove(key)
+            return None
+        self._con.execute("UPDATE entry SET used = ? WHERE key = ?", (time.time(), key))
+        return files
+
+    def put(self, key: str, stage: str, files: Dict[str, Path]) -> Dict[str, Path]:
+        """Copy the output files of a stage into the cache, returns {name: cached file}."""
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir.with_name(f"{key}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        for name, filename in files.items():
+            shutil.copyfile(filename, tmp_dir / name)
+        size = sum(f.stat().st_size for f in tmp_dir.iterdir())
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self._con.execute("INSERT OR REPLACE INTO entry VALUES (?, ?, ?, ?, ?)", (key, stage, json.dumps(sorted(files)), size, time.time()))
+        self.evict()
+        return {name: entry_dir / name for name in files}
+
+    def _remove(self, key: str):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        self._con.execute("DELETE FROM entry WHERE key = ?", (key,))
+
+    def size(self) -> int:
+        return self._con.execute("SELECT COALESCE(SUM(size), 0) FROM entry").fetchone()[0]
+
+    def evict(self) -> int:
+        """Remove the least recently used entries beyond `max_bytes`. Returns the number removed."""
+        excess = self.size() - self.max_bytes
+        removed = 0
+        if excess <= 0:
+            return removed
+        for key, size in self._con.execute("SELECT key, size FROM entry ORDER BY used").fetchall():
+            if excess <= 0:
+                break
+            self._remove(key)
+            excess -= size
+            removed += 1
+        return removed
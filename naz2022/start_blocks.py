@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Ranking-seeded start blocks for any set of classes.
+
+Within each seeded class the athletes are sorted by a ranking and split into
+blocks of `block_size`, the best block starting last (odd block numbers,
+counting down from the highest), as required by the WRE regulations.
+All classes are handled together: the entries are grouped and sorted once
+with NumPy, instead of scanning the whole entry list for every class.
+
+The classes and their rankings are described by a JSON file:
+
+    {
+        "sources": {
+            "men": {"iof_list": "MEN_F"},
+            "women": {"iof_list": "WOMEN_F"},
+            "solv": {"csv": "solv_ranking.csv", "id_column": "Datenbank Id",
+                     "value_column": "Punkte", "higher_is_better": true}
+        },
+        "classes": {
+            "HE": {"source": "men", "block_size": 10},
+            "H18": {"source": "solv", "block_size": 6}
+        }
+    }
+
+The "block_size" of a class must be a positive whole number, and its
+"source" one of the "sources".
+"""
+
+import csv
+from dataclasses import dataclass
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import typer
+
+import oe_columns
+from oe_entries import EntryTable
+from iof_ranking import DEFAULT_STORE, RankingStore, UNRANKED
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+CSV_INPUT_ENCODING = 'ISO-8859-1'
+
+
+@dataclass
+class RankingSource:
+    """Ranking value by athlete id, the id being read from the `id_field` column (ID) of the OE entries."""
+    values: Dict[str, float]
+    id_field: str
+    higher_is_better: bool = False
+    is_iof: bool = False
+
+
+@dataclass
+class ClassSeeding:
+    source: str
+    block_size: int = 10
+
+
+def _format_rank(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:g}"
+
+
+def assign_start_blocks(
+    data: EntryTable,
+    seedings: Dict[str, ClassSeeding],
+    sources: Dict[str, RankingSource],
+) -> "pd.DataFrame":
+    """
+    Set block and rank columns of all entries of the seeded classes.
+    Returns the report, one row per seeded athlete, in seeding and block
+    order.
+    """
+    import numpy as np
+    import pandas as pd
+
+    class_names = list(seedings)
+    class_codes = {c: i for i, c in enumerate(class_names)}
+    entry_class = np.fromiter(
+        (class_codes.get(c, -1) for c in data.column("CLASS")),
+        dtype=np.int64, count=len(data),
+    )
+    ix = np.flatnonzero(entry_class >= 0)
+    code = entry_class[ix]
+
+    # Ranking value of every seeded entry, looked up in the source of its class
+    rank = np.full(len(ix), float(UNRANKED))
+    sort_key = np.full(len(ix), np.inf)
+    source_of_class = np.array([seedings[c].source for c in class_names], dtype=object)
+    for source_name in set(source_of_class):
+        source = sources[source_name]
+        mask = source_of_class[code] == source_name
+        ids = data.column(source.id_field)
+        values = np.fromiter(
+            (source.values.get(ids[i], np.nan) for i in ix[mask]),
+            dtype=np.float64, count=int(mask.sum()),
+        )
+        ranked = ~np.isnan(values)
+        rank[mask] = np.where(ranked, values, UNRANKED)
+        sort_key[mask] = np.where(ranked, -values if source.higher_is_better else values, np.inf)
+
+    # Stable: ties keep the order of the OE file
+    order = np.lexsort((ix, sort_key, code))
+    ix, code, rank = ix[order], code[order], rank[order]
+
+    class_sizes = np.bincount(code, minlength=len(class_names))
+    class_start = np.concatenate(([0], np.cumsum(class_sizes)[:-1]))
+    position = np.arange(len(ix)) - class_start[code]
+    block_size = np.array([seedings[c].block_size for c in class_names])[code]
+    max_block = np.ceil(class_sizes[code] / block_size).astype(np.int64) * 2 + 1
+    block = max_block - 2 * (position // block_size + 1)
+
+    is_iof = np.array([sources[seedings[c].source].is_iof for c in class_names])[code]
+    iof_ids = data.column("IOFID")
+    family_names = data.column("FAMILY_NAME")
+    given_names = data.column("GIVEN_NAME")
+    report = []
+    for i, c, r, b, iof in zip(ix.tolist(), code.tolist(), rank.tolist(), block.tolist(), is_iof.tolist()):
+        rank_str = _format_rank(r)
+        data.set(i, "BLOCK", str(b))
+        if iof:
+            data.set(i, "IOFRANK", rank_str)
+        data.set(i, "DBRANK", rank_str)
+        report.append((class_names[c], str(iof_ids[i]), f"{family_names[i]} {given_names[i]}", rank_str, str(b)))
+
+    for c, class_name in enumerate(class_names):
+        size = int(class_sizes[c])
+        class_max = int(np.ceil(size / seedings[class_name].block_size)) * 2 + 1
+        class_block = int(block[class_start[c] + size - 1]) if size else class_max
+        typer.secho(f"Class {class_name} finished with block {class_block} from max block {class_max} and {size} entries.", fg=typer.colors.GREEN)
+
+    return pd.DataFrame(report, columns=["Class", "IOF ID", "Name", "Rank", "StartBlock"])
+
+
+def load_ranking_csv(ranking_filename: Path, id_column: str, value_column: str, encoding: str = CSV_INPUT_ENCODING) -> Dict[str, float]:
+    typer.echo(f"Reading ranking from CSV file {ranking_filename}")
+    with open(ranking_filename, encoding=encoding) as csvfile:
+        reader = csv.DictReader(csvfile, dialect='excel', delimiter=';')
+        values = {}
+        for row in reader:
+            value = row[value_column].replace(",", ".")
+            if value:
+                values[row[id_column]] = float(value)
+    return values
+
+
+def load_config(config_filename: Path, data: EntryTable, ranking_store: Path = DEFAULT_STORE, snapshot: Optional[str] = None):
+    """
+    Seedings and ranking sources described in the JSON config. The
+    "id_column" of a CSV ranking defaults to the SOLV number column of the
+    OE export, "oe_field" is a column ID (default SOLVNR).
+    """
+    with open(config_filename, encoding="UTF8") as f:
+        raw = json.load(f)
+
+    store = None
+    sources: Dict[str, RankingSource] = {}
+    for name, src in raw["sources"].items():
+        if "iof_list" in src:
+            store = store or RankingStore(ranking_store)
+            values = store.ranks(src["iof_list"], data.column("IOFID"), snapshot)
+            sources[name] = RankingSource(values, "IOFID", is_iof=True)
+        else:
+            values = load_ranking_csv(
+                config_filename.parent / src["csv"],
+                src.get("id_column", data.field_name("SOLVNR")),
+                src["value_column"],
+                src.get("encoding", CSV_INPUT_ENCODING),
+            )
+            sources[name] = RankingSource(
+                values,
+                src.get("oe_field", "SOLVNR").removesuffix("_FIELD"),
+                higher_is_better=src.get("higher_is_better", False),
+            )
+    if store:
+        store.close()
+
+    seedings = {name: ClassSeeding(**cls) for name, cls in raw["classes"].items()}
+    for name, seeding in seedings.items():
+        if not isinstance(seeding.block_size, int) or isinstance(seeding.block_size, bool) or seeding.block_size < 1:
+            raise ValueError(f"{config_filename}: block_size of class {name} must be a positive whole number, not {seeding.block_size!r}")
+        if seeding.source not in sources:
+            raise ValueError(f"{config_filename}: unknown source {seeding.source!r} of class {name}")
+    return seedings, sources
+
+
+def main(
+    oe_input_filename: Path=typer.Option(..., "--oe-entries", help="File CSV con iscrizioni OE"),
+    config_filename: Path=typer.Option(..., "--config", help="JSON file with the seeded classes and rankings"),
+    language: Optional[str]=typer.Option(None, help="Language of the OE export (de, it). Default: detected from the header"),
+    ranking_store: Path=typer.Option(DEFAULT_STORE, help="Ranking store for the IOF lists"),
+    snapshot: Optional[str]=typer.Option(None, help="Use the latest IOF ranking snapshot up to this date (YYYY-MM-DD)"),
+    output_filename: Path=typer.Option(..., "--output", help="File CSV di output"),
+    run_report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    with measure_run("start_blocks", run_report_filename, profile, trace_memory) as run_report:
+        typer.echo(f"Reading entries from CSV file {oe_input_filename}")
+        with run_report.stage("read_oe_entries") as st:
+            data = EntryTable.read(oe_input_filename, index_cols=(), columns=oe_columns.load(language) if language else None)
+            st.rows_out = len(data)
+
+        with run_report.stage("load_config") as st:
+            seedings, sources = load_config(config_filename, data, ranking_store, snapshot)
+            st.rows_out = sum(len(source.values) for source in sources.values())
+        with run_report.stage("assign_start_blocks", rows_in=len(data)) as st:
+            df = assign_start_blocks(data, seedings, sources)
+            st.rows_out = len(df)
+
+        report_filename = output_filename.with_stem(f"{output_filename.stem}_report").with_suffix(".xlsx")
+        typer.echo(f"Writing report to {report_filename}")
+        with run_report.stage("write_report", rows_in=len(df)):
+            df.to_excel(report_filename, index=False)
+
+        typer.echo(f"Writing output to {output_filename}")
+        with run_report.stage("write_output", rows_in=len(data)):
+            data.write(output_filename)
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
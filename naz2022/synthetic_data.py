@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Generate realistic synthetic inputs for all the naz2022 tools.
+
+For a given number of runners this writes, in the output folder:
+
+- `oe_entries_de.csv`, `oe_entries_it.csv`: OE entries exports (German and Italian headers)
+- `oe_startlist_1.csv`, `oe_startlist_2.csv`: OE start lists of two runs (Italian headers)
+- `eventor_entries.xml`: IOF XML 3.0 EntryList from Eventor
+- `solv-competitors.csv`: SOLV runners DB
+- `iof_ranking_MEN_F_<date>.csv`, `iof_ranking_WOMEN_F_<date>.csv`: IOF rankings
+- `late_entries.xlsx` (sheets Sabato / Domenica) and `missing_iof.xlsx`
+- `pipeline.json`: pipeline config using the files above
+
+The data is random but reproducible (`--seed`).
+"""
+
+import csv
+import datetime
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+import typer
+
+import oe_columns
+from export_startnr_for_print import START_MAPPING
+
+
+CSV_OUTPUT_ENCODING = 'ISO-8859-1'
+WRE_OUTPUT_ENCODING = 'UTF8'
+XML_OUTPUT_ENCODING = 'UTF8'
+
+CLASSES_FILE = "resources/solv-classes.csv"
+
+OE_HEADER_DE = (
+    "OE0001", "Stnr", "XStnr", "Chipnr", "Datenbank Id", "Nachname", "Vorname", "Jg", "Geschlecht",
+    "Block", "AK", "Start", "Ziel", "Zeit", "Wertung", "Club-Nr.", "Abk", "Ort", "Nat", "Sitz", "Region",
+    "Katnr", "Kurz", "Lang", "Rang", "Num1", "Num2", "Num3", "Text1", "Text2", "Text3",
+    "Adr. Nachname", "Adr. Vorname", "Straße", "Zeile2", "PLZ", "Adr. Ort", "Tel", "Mobil", "EMail",
+    "Gemietet", "Startgeld", "Bezahlt", "ID",
+)
+
+SOLV_DB_HEADER = (
+    "Datenbank Id", "Chipnr SI", "Nachname", "Vorname", "Jg", "G", "Club-Nr.", "Abk", "Ort", "Nat", "Sitz",
+    "Region", "Num1", "Num3", "Adr. Nachname", "Adr. Vorname", "Straße", "PLZ", "Adr. Ort", "EMail",
+)
+
+RANKING_HEADER = ("WRS Position", "IOF ID", "First Name", "Last Name", "Country", "WRS Points")
+
+LATE_ENTRIES_HEADER = ("SOLV-nr", "Cognome", "Nome", "Cat", "SI-Card", "Importo", "Eseguito")
+MISSING_IOF_HEADER = ("Export-ID", "Nachname", "Vorname", "IOF ID")
+
+FAMILY_NAMES = (
+    "Müller", "Meier", "Schmid", "Keller", "Weber", "Huber", "Schneider", "Steiner", "Fischer", "Gerber",
+    "Brunner", "Baumann", "Frei", "Zimmermann", "Moser", "Widmer", "Wyss", "Graf", "Roth", "Bühler",
+    "Rossi", "Bernasconi", "Ferrari", "Colombo", "Galli", "Bianchi", "Crivelli", "Fontana", "Pedrazzini",
+    "Dubois", "Favre", "Rochat", "Perret", "Jeanneret", "Hänni", "Zürcher", "Lüthi", "Bärtschi", "Nüesch",
+)
+GIVEN_NAMES_M = ("Hans", "Peter", "Luca", "Marco", "Daniel", "Thomas", "Matthias", "Andrea", "Jonas", "Noah", "Lukas", "Simon", "René", "François", "Jürg")
+GIVEN_NAMES_F = ("Anna", "Laura", "Sara", "Julia", "Lea", "Chiara", "Elena", "Sandra", "Monika", "Céline", "Mélanie", "Nadia", "Jana", "Ursula", "Zoë")
+CLUBS = (
+    ("OLG Bern", "SUI"), ("OL Regio Olten", "SUI"), ("ASTi", "SUI"), ("OLG Cordoba", "SUI"),
+    ("OLV Baselland", "SUI"), ("CO Chenau", "SUI"), ("OLG Zürich", "SUI"), ("GOLD Zürich", "SUI"),
+    ("ANA Orienteering", "ITA"), ("OK Linné", "SWE"), ("Helsingin Suunnistajat", "FIN"), ("Kalevan Rasti", "FIN"),
+)
+START_REGIONS = ("101", "102", "103", "104", "105", "106", "107")
+
+
+def load_classes() -> List[dict]:
+    with open(CLASSES_FILE, encoding=CSV_OUTPUT_ENCODING) as csvfile:
+        return list(csv.DictReader(csvfile, dialect='excel', delimiter=';'))
+
+
+def _it_header() -> List[str]:
+    translation = oe_columns.translation(oe_columns.load("de"), oe_columns.load("it"))
+    return [translation.get(k, k) for k in OE_HEADER_DE]
+
+
+def make_runners(n: int, rng: random.Random) -> List[Dict[str, str]]:
+    """Athletes with a unique (family, given, year) name key."""
+    classes = [c for c in load_classes() if c["G"] in ("M", "F")]
+    runners = []
+    name_keys = set()
+    i = 0
+    while len(runners) < n:
+        cls = rng.choice(classes)
+        gender = cls["G"]
+        family = rng.choice(FAMILY_NAMES)
+        if rng.random() < 0.5:
+            family = f"{family}-{rng.choice(FAMILY_NAMES)}"
+        given = rng.choice(GIVEN_NAMES_M if gender == "M" else GIVEN_NAMES_F)
+        year = str(rng.randint(1940, 2014))
+        if (family, given, year) in name_keys:
+            continue
+        name_keys.add((family, given, year))
+        club, nat = rng.choice(CLUBS)
+        i += 1
+        runners.append({
+            "ix": str(i),
+            "Datenbank Id": f"{rng.randint(1, 9)}{''.join(rng.choices('ABCDEFGHJKLMNPRSTUVWXYZ0123456789', k=4))}{i}",
+            "Chipnr": str(rng.randint(2000000, 9999999)) if rng.random() < 0.9 else "0",
+            "Nachname": family,
+            "Vorname": given,
+            "Jg": year,
+            "Geschlecht": gender,
+            "Club-Nr.": str(CLUBS.index((club, nat)) + 1),
+            "Ort": club,
+            "Abk": club[:10],
+            "Nat": nat,
+            "Katnr": cls["Katnr"],
+            "Kurz": cls["Kurz"],
+            "Lang": cls["Lang"],
+            "Num1": rng.choice(START_REGIONS),
+            "Num3": str(500000 + i) if cls["Kurz"] in ("HE", "DE", "H20", "D20") or rng.random() < 0.05 else "",
+            "Startgeld": str(rng.choice((15, 20, 25, 35))),
+            "ID": str(100000 + i),
+        })
+    return runners
+
+
+def write_oe_entries(filename: Path, header: List[str], runners: List[dict], startlist: bool = False, rng: random.Random = None):
+    with open(filename, 'w', encoding=CSV_OUTPUT_ENCODING) as csvfile:
+        writer = csv.writer(csvfile, dialect='excel', delimiter=';')
+        writer.writerow(header)
+        for nr, runner in enumerate(runners, start=1):
+            row = dict.fromkeys(OE_HEADER_DE, "")
+            row.update({k: v for k, v in runner.items() if k in row})
+            row.update({"OE0001": runner["ix"], "Adr. Nachname": runner["Nachname"], "Adr. Vorname": runner["Vorname"],
+                        "Gemietet": "0", "Bezahlt": "0"})
+            if startlist:
+                row["Stnr"] = str(nr)
+                row["Start"] = str(datetime.timedelta(minutes=rng.randint(0, 240)))
+                if len(row["Start"]) == 7:
+                    row["Start"] = "0" + row["Start"]
+            writer.writerow([row[k] for k in OE_HEADER_DE])
+
+
+def write_solv_db(filename: Path, runners: List[dict], extra: int, rng: random.Random):
+    with open(filename, 'w', encoding=CSV_OUTPUT_ENCODING) as csvfile:
+        writer = csv.writer(csvfile, dialect='excel', delimiter=';')
+        writer.writerow(SOLV_DB_HEADER)
+        for runner in runners:
+            writer.writerow([
+                runner.get({"Chipnr SI": "Chipnr", "G": "Geschlecht"}.get(k, k), "") for k in SOLV_DB_HEADER
+            ])
+        for i in range(extra):
+            gender = rng.choice("MF")
+            writer.writerow([
+                f"X{i}", str(rng.randint(2000000, 9999999)), rng.choice(FAMILY_NAMES),
+                rng.choice(GIVEN_NAMES_M if gender == "M" else GIVEN_NAMES_F), str(rng.randint(1940, 2014)), gender,
+                "", "", rng.choice(CLUBS)[0], "SUI", "", "", rng.choice(START_REGIONS), "", "", "", "", "", "", "",
+            ])
+
+
+def write_rankings(output_dir: Path, runners: List[dict], snapshot: datetime.date, rng: random.Random) -> Dict[str, Path]:
+    filenames = {}
+    for list_name, gender in (("MEN_F", "M"), ("WOMEN_F", "F")):
+        ranked = [r for r in runners if r["Geschlecht"] == gender and r["Num3"]]
+        rng.shuffle(ranked)
+        filename = output_dir / f"iof_ranking_{list_name}_{snapshot.strftime('%d-%m-%Y')}.csv"
+        with open(filename, 'w', encoding=WRE_OUTPUT_ENCODING) as csvfile:
+            writer = csv.writer(csvfile, dialect='excel', delimiter=';')
+            writer.writerow(RANKING_HEADER)
+            for pos, r in enumerate(ranked, start=1):
+                writer.writerow([pos, r["Num3"], r["Vorname"], r["Nachname"], r["Nat"], f"{max(7000 - pos * 3, 100)}"])
+        filenames[list_name] = filename
+    return filenames
+
+
+def write_eventor_entries(filename: Path, n: int, rng: random.Random):
+    with open(filename, 'w', encoding=XML_OUTPUT_ENCODING) as xmlfile:
+        xmlfile.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        xmlfile.write('<EntryList xmlns="http://www.orienteering.org/datastandard/3.0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" iofVersion="3.0" createTime="2022-08-20T10:00:00" creator="Eventor">\n')
+        xmlfile.write('  <Event><Id type="IOF">7433</Id><Name>8. National Orienteering Middle</Name></Event>\n')
+        for i in range(n):
+            gender = rng.choice("MF")
+            club, nat = rng.choice(CLUBS)
+            xmlfile.write(
+                f'  <PersonEntry modifyTime="2022-08-19T12:00:00"><Id>{i + 1}</Id>'
+                f'<Person sex="{gender}"><Id type="IOF">{900000 + i}</Id>'
+                f'<Name><Family>{rng.choice(FAMILY_NAMES)}</Family><Given>{rng.choice(GIVEN_NAMES_M if gender == "M" else GIVEN_NAMES_F)}</Given></Name>'
+                f'<BirthDate>{rng.randint(1975, 2004)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}</BirthDate>'
+                f'<Nationality code="{nat}">{nat}</Nationality></Person>'
+                f'<Organisation><Id type="IOF">{rng.randint(1, 999)}</Id><Name>{club}</Name><Country code="{nat}">{nat}</Country></Organisation>'
+                f'<ControlCard punchingSystem="SI">{rng.randint(2000000, 9999999)}</ControlCard>'
+                f'<Class><Id type="IOF">{1 if gender == "M" else 2}</Id><Name>{"Men" if gender == "M" else "Women"}</Name></Class>'
+                f'<RaceNumber>1</RaceNumber>'
+                f'<AssignedFee><Fee><Id>1</Id><Name>Elite</Name><Amount currency="CHF">35</Amount></Fee></AssignedFee>'
+                f'</PersonEntry>\n'
+            )
+        xmlfile.write('</EntryList>\n')
+
+
+def write_late_entries(filename: Path, solv_runners: List[dict], n: int, rng: random.Random):
+    import pandas as pd
+
+    with pd.ExcelWriter(filename) as writer:
+        for sheet_name in ("Sabato", "Domenica"):
+            rows = []
+            for runner in rng.sample(solv_runners, min(n, len(solv_runners))):
+                rows.append({
+                    "SOLV-nr": runner["Datenbank Id"],
+                    "Cognome": runner["Nachname"],
+                    "Nome": runner["Vorname"],
+                    "Cat": runner["Kurz"],
+                    "SI-Card": rng.randint(2000000, 9999999) if rng.random() < 0.3 else None,
+                    "Importo": rng.choice((20, 25, 30)),
+                    "Eseguito": "x" if rng.random() < 0.1 else None,
+                })
+            pd.DataFrame(rows, columns=LATE_ENTRIES_HEADER).to_excel(writer, sheet_name=sheet_name, index=False, startrow=1)
+
+
+def write_missing_iof(filename: Path, runners: List[dict], rng: random.Random):
+    import pandas as pd
+
+    rows = [
+        {"Export-ID": int(r["ID"]), "Nachname": r["Nachname"], "Vorname": r["Vorname"], "IOF ID": 700000 + int(r["ix"]) if rng.random() < 0.8 else "NA"}
+        for r in runners if r["Kurz"] in ("HE", "DE", "H20", "D20") and not r["Num3"]
+    ]
+    pd.DataFrame(rows, columns=MISSING_IOF_HEADER).to_excel(filename, index=False, startrow=2)
+
+
+def generate(output_dir: Path, runners: int, seed: int = 2022) -> Dict[str, Path]:
+    """Write all the synthetic inputs for `runners` athletes, returns the file names."""
+    rng = random.Random(seed)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    files = {
+        "oe_entries_de": output_dir / "oe_entries_de.csv",
+        "oe_entries_it": output_dir / "oe_entries_it.csv",
+        "oe_startlist_1": output_dir / "oe_startlist_1.csv",
+        "oe_startlist_2": output_dir / "oe_startlist_2.csv",
+        "eventor_entries": output_dir / "eventor_entries.xml",
+        "solv_db": output_dir / "solv-competitors.csv",
+        "late_entries": output_dir / "late_entries.xlsx",
+        "missing_iof": output_dir / "missing_iof.xlsx",
+        "pipeline": output_dir / "pipeline.json",
+    }
+
+    all_runners = make_runners(runners, rng)
+    late_runners = make_runners(max(runners // 20, 10), rng)
+    for i, r in enumerate(late_runners):
+        r["Datenbank Id"] = f"L{i}{r['Datenbank Id']}"
+
+    write_oe_entries(files["oe_entries_de"], list(OE_HEADER_DE), all_runners)
+    write_oe_entries(files["oe_entries_it"], _it_header(), all_runners)
+    startlist_runners = [r for r in all_runners if all(r["Kurz"] in mapping for mapping in START_MAPPING.values())]
+    write_oe_entries(files["oe_startlist_1"], _it_header(), rng.sample(startlist_runners, int(len(startlist_runners) * 0.9)), startlist=True, rng=rng)
+    write_oe_entries(files["oe_startlist_2"], _it_header(), rng.sample(startlist_runners, int(len(startlist_runners) * 0.8)), startlist=True, rng=rng)
+    write_eventor_entries(files["eventor_entries"], max(runners // 10, 10), rng)
+    write_solv_db(files["solv_db"], all_runners + late_runners, extra=runners, rng=rng)
+    files.update({f"ranking_{k}": v for k, v in write_rankings(output_dir, all_runners, datetime.date(2022, 8, 18), rng).items()})
+    write_late_entries(files["late_entries"], late_runners, len(late_runners), rng)
+    write_missing_iof(files["missing_iof"], all_runners, rng)
+
+    with open(files["pipeline"], 'w', encoding="UTF8") as f:
+        json.dump({
+            "data_root": str(output_dir.resolve()),
+            "solv_db": files["solv_db"].name,
+            "late_entries": files["late_entries"].name,
+            "men_ranking": files["ranking_MEN_F"].name,
+            "women_ranking": files["ranking_WOMEN_F"].name,
+            "language": "de",
+            "events": [
+                {
+                    "name": name,
+                    "oe_entries": files["oe_entries_de"].name,
+                    "eventor_entries": files["eventor_entries"].name,
+                    "late_entries_sheet": sheet,
+                    "missing_iof": files["missing_iof"].name,
+                    "output": str(output_dir.resolve() / f"{name}_entries_final.csv"),
+                }
+                for name, sheet in (("day1", "Sabato"), ("day2", "Domenica"))
+            ],
+        }, f, indent=4)
+    return files
+
+
+def main(
+    output_dir: Path=typer.Argument(..., help="Folder for the generated files"),
+    runners: int=typer.Option(1000, help="Number of runners"),
+    seed: int=typer.Option(2022, help="Random seed"),
+    ):
+    typer.echo(f"Generating data for {runners} runners in {output_dir}")
+    files = generate(output_dir, runners, seed)
+    for name, filename in files.items():
+        typer.echo(f"{name:20} {filename}")
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
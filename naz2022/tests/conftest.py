@@ -0,0 +1,48 @@
+"""
+The tools are flat modules run from this folder (they read resources/ by
+relative path), so the tests import them from the folder of the tools and
+run in it. The caches (SOLV DB index, rankings, stage cache) are kept in a
+temporary folder, set before the tools are imported.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+
+TOOLS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(TOOLS_DIR))
+CACHE_DIR = os.environ["OE_TOOLS_CACHE"] = tempfile.mkdtemp(prefix="oe-tools-test-")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def tools_dir(monkeypatch):
+    monkeypatch.chdir(TOOLS_DIR)
+    return TOOLS_DIR
+
+
+@pytest.fixture
+def synthetic(tmp_path, tools_dir):
+    """{name: file} of the synthetic inputs of a small event (see synthetic_data.py)."""
+    from synthetic_data import generate
+
+    return generate(tmp_path / "data", 200)
+
+
+@pytest.fixture
+def oe_csv(tmp_path):
+    """write(name, header, rows) of an OE CSV export in the temporary folder, returns its path."""
+    def write(name, header, rows):
+        filename = tmp_path / name
+        with open(filename, "w", encoding="ISO-8859-1") as f:
+            f.write("\n".join(";".join(values) for values in (header, *rows)) + "\n")
+        return filename
+    return write
@@ -0,0 +1,34 @@
+from add_eventor_entries import iter_person_entries
+
+
+ENTRY_LIST = """<?xml version="1.0" encoding="UTF-8"?>
+<EntryList xmlns="http://www.orienteering.org/datastandard/3.0" iofVersion="3.0">
+  <Event><Name>Test</Name></Event>
+  <PersonEntry>
+    <Person>
+      <Id type="IOF">500</Id>
+      <Name><Family>Keller</Family><Given>Lea</Given></Name>
+      <BirthDate>1990-05-01</BirthDate>
+    </Person>
+    <Organisation><Name>OLG Bern</Name><Country code="SUI">Switzerland</Country></Organisation>
+    <ControlCard punchingSystem="SI">8123456</ControlCard>
+    <Class><Id>1</Id><Name>Women</Name></Class>
+    <AssignedFee><Fee><Name>Elite</Name><Amount currency="CHF">35</Amount></Fee></AssignedFee>
+  </PersonEntry>
+  <PersonEntry>
+    <Person><Name><Family>Frei</Family><Given>Urs</Given></Name></Person>
+    <Class><Name>Men</Name></Class>
+  </PersonEntry>
+</EntryList>
+"""
+
+
+def test_iter_person_entries(tmp_path):
+    filename = tmp_path / "entries.xml"
+    filename.write_text(ENTRY_LIST, encoding="UTF-8")
+    first, second = iter_person_entries(filename)
+    assert (first.iof_id, first.family_name, first.given_name, first.birth_year) == ("500", "Keller", "Lea", "1990")
+    assert (first.control_card, first.class_name, first.organisation, first.country, first.fee) == ("8123456", "Women", "OLG Bern", "Switzerland", "35")
+    # Missing elements are empty
+    assert (second.iof_id, second.birth_year, second.control_card, second.organisation, second.fee) == ("", "", "", "", "")
+    assert second.class_name == "Men"
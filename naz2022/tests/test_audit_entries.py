@@ -0,0 +1,69 @@
+import json
+
+from audit_entries import EntryAudit, count_issues, write_issues
+from synthetic_data import OE_HEADER_DE
+
+
+def _file(oe_csv, name, rows):
+    return oe_csv(name, OE_HEADER_DE, [[row.get(k, "") for k in OE_HEADER_DE] for row in rows])
+
+
+def _row(family_name, given_name="Anna", birth="1990", **values):
+    return {"Nachname": family_name, "Vorname": given_name, "Jg": birth, **values}
+
+
+def _issues(audit, **kwargs):
+    return sorted((issue.check, issue.value, issue.file) for issue in audit.audit(**kwargs))
+
+
+def test_within_a_file(oe_csv):
+    audit = EntryAudit()
+    audit.add_file(_file(oe_csv, "sat.csv", [
+        _row("Meier", Chipnr="100", Stnr="1"),
+        _row("Frei", Chipnr="100", Stnr="1"),
+        _row("Meier"),
+        _row("Vakant", Chipnr="100"),
+    ]))
+    assert len(audit) == 3
+    assert _issues(audit) == [
+        ("duplicate_name", "", "sat.csv"),
+        ("duplicate_sicard", "100", "sat.csv"),
+        ("duplicate_startnr", "1", "sat.csv"),
+    ]
+
+
+def test_across_files(oe_csv):
+    audit = EntryAudit()
+    audit.add_file(_file(oe_csv, "sat.csv", [
+        _row("Meier", Chipnr="100", Stnr="1"),
+        _row("Frei", Chipnr="200", Gemietet="X", Stnr="2"),
+        _row("Keller", Num3="9", Stnr="3"),
+    ]))
+    audit.add_file(_file(oe_csv, "sun.csv", [
+        # Same SI-card on another athlete, same start number on another athlete
+        _row("Huber", Chipnr="100", Stnr="1"),
+        # A rented SI-card changes hands
+        _row("Moser", Chipnr="200", Stnr="5"),
+        # Another start number for the same athlete, and a namesake with another IOF ID
+        _row("Keller", Num3="9", Stnr="4"),
+        _row("Keller", Num3="8", Stnr="6", Jg="1991"),
+    ]))
+    assert _issues(audit) == [
+        ("sicard_conflict", "100", "sun.csv"),
+        ("startnr_mismatch", "4", "sun.csv"),
+        ("startnr_shared", "1", "sun.csv"),
+    ]
+    assert _issues(audit, checks=("startnr_mismatch",)) == [("startnr_mismatch", "4", "sun.csv")]
+
+
+def test_write_issues(oe_csv, tmp_path):
+    audit = EntryAudit()
+    audit.add_file(_file(oe_csv, "sat.csv", [_row("Meier", Stnr="1"), _row("Frei", Stnr="1")]))
+    issues = audit.audit()
+    write_issues(tmp_path / "audit.json", issues, audit)
+    result = json.loads((tmp_path / "audit.json").read_text(encoding="UTF8"))
+    assert result["rows"] == 2
+    assert result["counts"] == count_issues(issues)
+    assert result["issues"][0]["startnr"] == "1"
+    write_issues(tmp_path / "audit.csv", issues, audit)
+    assert (tmp_path / "audit.csv").read_text(encoding="UTF8").splitlines()[0] == "Check;Value;File;Line;Startnr;Name;Detail"
@@ -0,0 +1,25 @@
+from define_common_startnr import define_common_startnr
+from oe_entries import EntryTable
+from synthetic_data import OE_HEADER_DE
+
+
+def _table(runners):
+    data = EntryTable(OE_HEADER_DE, index_cols=())
+    for family_name, solvnr, class_name in runners:
+        data.append({**dict.fromkeys(OE_HEADER_DE, ""), "Nachname": family_name, "Vorname": "Jonas", "Jg": "1990",
+                     "Datenbank Id": solvnr, "Kurz": class_name})
+    return data
+
+
+def test_same_athlete_same_startnr():
+    saturday = _table([("Meier", "S1", "HE"), ("Frei", "S2", "H35"), ("Keller", "S3", "H35")])
+    sunday = _table([("Frei", "S2", "H35"), ("Meier", "S1", "HE"), ("Huber", "S4", "H35")])
+    define_common_startnr([saturday, sunday])
+    sat = dict(zip(saturday.column("Nachname"), saturday.column("Stnr")))
+    sun = dict(zip(sunday.column("Nachname"), sunday.column("Stnr")))
+    assert sat["Meier"] == sun["Meier"] and sat["Frei"] == sun["Frei"]
+    numbers = {*sat.values(), *sun.values()}
+    assert len(numbers) == 4 and "" not in numbers
+    # Elite classes first, the others from the next hundred
+    assert sat["Meier"] == "1"
+    assert int(sat["Keller"]) > 100
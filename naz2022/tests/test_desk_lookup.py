@@ -0,0 +1,42 @@
+import json
+import threading
+from urllib.request import urlopen
+
+import pytest
+
+from desk_lookup import RunnerIndex, make_server
+
+
+RUNNERS = [
+    {"Datenbank Id": "1ABC", "Chipnr SI": "123456", "Nachname": "Müller", "Vorname": "Hans", "Jg": "1985", "Ort": "OLG Bern"},
+    {"Datenbank Id": "2DEF", "Chipnr SI": "0", "Nachname": "Meier", "Vorname": "Anna", "Jg": "1990", "Ort": "OLG Thun"},
+]
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**kwargs):
+        server = make_server(RunnerIndex(RUNNERS), "127.0.0.1", 0, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_search(serve):
+    with urlopen(f"{serve()}/search?q=muell%20han") as response:
+        result = json.load(response)
+        assert response.headers["Access-Control-Allow-Origin"] is None
+    assert [r["Datenbank Id"] for r in result["runners"]] == ["1ABC"]
+
+
+def test_allow_origin(serve):
+    with urlopen(f"{serve(allow_origin='http://desk1:8080')}/runner/2DEF") as response:
+        assert response.headers["Access-Control-Allow-Origin"] == "http://desk1:8080"
+        assert json.load(response)["Nachname"] == "Meier"
@@ -0,0 +1,47 @@
+from draw_startlist import _start_time, draw, make_classes
+from oe_entries import EntryTable
+from synthetic_data import OE_HEADER_DE
+
+
+def _table(runners):
+    data = EntryTable(OE_HEADER_DE, index_cols=())
+    for startnr, block, start in runners:
+        data.append({**dict.fromkeys(OE_HEADER_DE, ""), "Stnr": startnr, "Nachname": f"Runner {startnr}",
+                     "Club-Nr.": startnr, "Kurz": "HE", "Block": block, "Start": start})
+    return data
+
+
+def _starts(data):
+    return dict(zip(data.column("Stnr"), data.column("Start")))
+
+
+def test_draw_by_block():
+    data = _table([(str(n), str(n % 3), "") for n in range(1, 13)])
+    classes = make_classes(data, {"default": {"interval": 2}})
+    draw(data, classes, seed=1)
+    starts = _starts(data)
+    order = sorted(starts, key=starts.get)
+    assert [int(n) % 3 for n in order] == [0] * 4 + [1] * 4 + [2] * 4
+    assert sorted(starts.values()) == [_start_time(2 * k) for k in range(12)]
+
+
+def test_late_entries_keep_the_block_order():
+    drawn = [("1", "1", "00:10:00"), ("2", "1", "00:11:00"), ("3", "2", "00:15:00"), ("4", "2", "00:16:00")]
+    late = [("5", "1", ""), ("6", "2", ""), ("7", "1", "")]
+    data = _table(drawn + late)
+    classes = make_classes(data, {}, keep_drawn=True)
+    draw(data, classes, seed=1)
+    starts = _starts(data)
+    # The free minutes between the blocks, in block order
+    assert sorted(starts[n] for n in ("5", "7")) == ["00:12:00", "00:13:00"]
+    assert starts["6"] == "00:14:00"
+    assert [starts[n] for n in ("1", "2", "3", "4")] == ["00:10:00", "00:11:00", "00:15:00", "00:16:00"]
+    assert classes["HE"].out_of_block == []
+
+
+def test_late_entries_without_room_in_their_block():
+    data = _table([("1", "1", "00:10:00"), ("2", "2", "00:11:00"), ("3", "1", "")])
+    classes = make_classes(data, {}, keep_drawn=True)
+    draw(data, classes, seed=1)
+    assert _starts(data)["3"] == "00:12:00"
+    assert [data.get(i, "Stnr") for i in classes["HE"].out_of_block] == ["3"]
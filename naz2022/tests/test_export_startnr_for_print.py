@@ -0,0 +1,30 @@
+from export_startnr_for_print import load_run, merge_runs, output_columns
+
+
+HEADER_IT = ["Pett", "Chip", "ID banca dati", "Cognome", "Nome", "An.", "Corto", "Num3", "Partenza"]
+
+
+def test_merge_runs(oe_csv):
+    day1 = oe_csv("day1.csv", HEADER_IT, [
+        ["101", "1", "S1", "Keller", "Lea", "1990", "DE", "", "00:00:00"],
+        ["102", "2", "S2", "Frei", "Urs", "1985", "HE", "", "00:02:00"],
+        ["103", "3", "", "Vacante", "", "", "HE", "", "00:04:00"],
+    ])
+    day2 = oe_csv("day2.csv", HEADER_IT, [
+        ["102", "2", "S2", "Frei", "Urs", "1985", "H35", "", "01:00:00"],
+        ["104", "4", "S4", "Rossi", "Luca", "2004", "H20", "", "00:30:00"],
+    ])
+    runs = [
+        load_run(day1, "10:00", "Sabato", {"DE": "START 1", "HE": "START 1"}),
+        load_run(day2, "9:30", "Domenica"),
+    ]
+    assert output_columns(runs) == [
+        "Startnummer", "Vorname", "Nachname",
+        "Start (Sabato)", "Kategorie (Sabato)", "Startzeit (Sabato)",
+        "Start (Domenica)", "Kategorie (Domenica)", "Startzeit (Domenica)",
+    ]
+    assert list(merge_runs(runs)) == [
+        ["101", "Lea", "Keller", "START 1", "DE", "10:00", "", "", ""],
+        ["102", "Urs", "Frei", "START 1", "HE", "10:02", "", "H35", "10:30"],
+        ["104", "Luca", "Rossi", "", "", "", "", "H20", "10:00"],
+    ]
@@ -0,0 +1,67 @@
+from add_eventor_entries import PersonEntry, add_eventor_entries
+from fuzzy_match import NameMatcher, fold_name, match_score, name_tokens, normalize_name
+from oe_entries import EntryTable
+from synthetic_data import OE_HEADER_DE
+
+
+ROWS = [
+    {"Stnr": "1", "Chipnr": "100", "Datenbank Id": "S1", "Nachname": "Müller", "Vorname": "Anna", "Jg": "1990", "Geschlecht": "F", "Nat": "SUI", "Kurz": "DE"},
+    {"Stnr": "2", "Chipnr": "200", "Datenbank Id": "S2", "Nachname": "Keller", "Vorname": "Michael", "Jg": "1985", "Geschlecht": "M", "Nat": "SUI", "Kurz": "HE"},
+]
+
+
+def _table(oe_csv):
+    rows = [[row.get(k, "") for k in OE_HEADER_DE] for row in ROWS]
+    return EntryTable.read(oe_csv("entries.csv", OE_HEADER_DE, rows), name_fields=("FAMILY_NAME", "GIVEN_NAME", "BIRTH"))
+
+
+def _person(family_name, given_name, birth_year, class_name, iof_id="900001"):
+    return PersonEntry(iof_id, family_name, given_name, birth_year, "", class_name, "OLG Bern", "SUI", "35", "SUI")
+
+
+def test_normalize_name():
+    assert normalize_name("Müller") == normalize_name("Mueller") == "mueller"
+    assert normalize_name("Groß") == "gross"
+    assert normalize_name("Dvořák") == "dvorak"
+    # "ae"/"oe"/"ue" of other names are not umlauts
+    assert normalize_name("Michael") != normalize_name("Michal")
+    assert normalize_name("Manuel") != normalize_name("Manul")
+    assert fold_name("Muller") == fold_name("Müller")
+
+
+def test_match_score():
+    assert match_score(name_tokens("Mueller", "Hans"), name_tokens("Hans", "Müller")) == 1.0
+    assert match_score(name_tokens("Müller", "Hans"), name_tokens("Müller", "Hans"), "SUI", "ITA") < 1.0
+
+
+def test_matcher_same_gender(oe_csv):
+    matcher = NameMatcher(_table(oe_csv), "FAMILY_NAME", "GIVEN_NAME", "BIRTH", sex_field="SEX")
+    assert matcher.best_match("Keller", "Michael", "1985", sex="M")[0] == 1
+    assert matcher.best_match("Keller", "Michael", "1985", sex="F") is None
+    assert matcher.best_match("Keller", "Michael", "1986", sex="M") is None
+
+
+def test_similar_name_reported_not_skipped(oe_csv):
+    data = _table(oe_csv)
+    fuzzy_report = []
+    total, added, skipped = add_eventor_entries(data, None, fuzzy_report=fuzzy_report, entries=[_person("Müller", "Hanna", "1990", "Women")])
+    assert (total, added, skipped) == (1, 1, 0)
+    assert len(data) == 3
+    assert [row[3] for row in fuzzy_report] == ["Müller Anna"]
+    assert fuzzy_report[0][-1] == "0"
+
+
+def test_similar_name_skipped(oe_csv):
+    data = _table(oe_csv)
+    fuzzy_report = []
+    entries = [_person("Müller", "Hanna", "1990", "Women"), _person("Keller", "Peter", "1985", "Men", "900002")]
+    total, added, skipped = add_eventor_entries(data, None, fuzzy_threshold=0.9, fuzzy_report=fuzzy_report, entries=entries)
+    assert (total, added, skipped) == (2, 1, 1)
+    assert data.find("IOFID", "900002") == 2
+    assert [(row[3], row[-1]) for row in fuzzy_report] == [("Müller Anna", "1")]
+
+
+def test_similar_name_other_gender(oe_csv):
+    data = _table(oe_csv)
+    total, added, skipped = add_eventor_entries(data, None, fuzzy_threshold=0.9, entries=[_person("Müler", "Anna", "1990", "Men")])
+    assert (added, skipped) == (1, 0)
@@ -0,0 +1,93 @@
+from identity import IdentityResolver, add_entries, entry_keys
+from define_common_startnr import define_common_startnr
+from oe_entries import EntryTable
+
+
+def _entry(sicard="", iofid="", solvnr="", family_name="", given_name="", birth="", rented=""):
+    return {
+        "SICARD": sicard, "IOFID": iofid, "SOLVNR": solvnr, "RENTED": rented,
+        "FAMILY_NAME": family_name, "GIVEN_NAME": given_name, "BIRTH": birth, "CLASS": "HE",
+    }
+
+
+def _athletes(resolver, rows_by_run):
+    for irun, rows in enumerate(rows_by_run):
+        add_entries(resolver, irun, rows)
+    return [[resolver.athlete_of(irun, i) for i in range(len(rows))] for irun, rows in enumerate(rows_by_run)]
+
+
+def test_linked_through_other_event():
+    resolver = IdentityResolver()
+    (a,), (b,), (c,) = _athletes(resolver, [
+        [_entry(sicard="100", family_name="Meier", given_name="Jonas", birth="2001")],
+        [_entry(sicard="100", solvnr="S1", family_name="Meier", given_name="Jonas", birth="2001")],
+        [_entry(solvnr="S1")],
+    ])
+    assert a == b == c
+    assert resolver.athletes[a].run_list() == [0, 1, 2]
+
+
+def test_rented_sicard_not_linked():
+    resolver = IdentityResolver()
+    assert ("SICARD", "100") not in entry_keys(_entry(sicard="100", rented="1"))
+    (a,), (b,) = _athletes(resolver, [
+        [_entry(sicard="100", rented="1", family_name="Meier", given_name="Jonas", birth="2001")],
+        [_entry(sicard="100", rented="1", family_name="Frei", given_name="Lea", birth="1999")],
+    ])
+    assert a != b
+
+
+def test_siblings_sharing_sicard():
+    """Two entries of an event are never the same athlete, the SI-card is not linked."""
+    resolver = IdentityResolver()
+    [a, b], [c, d] = _athletes(resolver, [
+        [_entry(sicard="100", family_name="Frei", given_name="Lea", birth="2005"),
+         _entry(sicard="100", family_name="Frei", given_name="Noah", birth="2007")],
+        [_entry(sicard="100", family_name="Frei", given_name="Noah", birth="2007"),
+         _entry(sicard="100", family_name="Frei", given_name="Lea", birth="2005")],
+    ])
+    assert a != b
+    assert (a, b) == (d, c)
+    assert len(resolver.by_class()["HE"]) == 2
+    assert resolver.conflicts and not resolver.duplicates
+
+
+def test_different_iofid_not_merged():
+    resolver = IdentityResolver()
+    (a,), (b,) = _athletes(resolver, [
+        [_entry(iofid="500", family_name="Frei", given_name="Julia", birth="2003")],
+        [_entry(iofid="501", family_name="Frei", given_name="Julia", birth="2003")],
+    ])
+    assert a != b
+    assert resolver.conflicts == [(1, ("IOFID", "501"), ("name", "Frei", "Julia", "2003"))]
+
+
+def test_duplicate_has_own_athlete():
+    resolver = IdentityResolver()
+    [a, b], [c] = _athletes(resolver, [
+        [_entry(iofid="500", family_name="Frei", given_name="Julia", birth="2003"),
+         _entry(iofid="500", family_name="Frei", given_name="Julia", birth="2003")],
+        [_entry(iofid="500", family_name="Frei", given_name="Julia", birth="2003")],
+    ])
+    assert a != b
+    assert c == a
+    assert resolver.duplicates == [(0, "Frei Julia 2003")]
+
+
+def test_shared_iofid_different_startnr(tmp_path):
+    header = ["Stnr", "Chipnr", "Datenbank Id", "Nachname", "Vorname", "Jg", "Kurz", "Num3"]
+    rows = [
+        ["", "100", "S1", "Frei", "Julia", "2003", "DE", "500"],
+        ["", "200", "S2", "Lüthi", "Julia", "1996", "DE", "500"],
+        ["", "300", "S3", "Rossi", "Luca", "1990", "HE", "0"],
+    ]
+    tables = []
+    for irun in range(2):
+        filename = tmp_path / f"run{irun}.csv"
+        with open(filename, "w", encoding="ISO-8859-1") as f:
+            f.write("\n".join(";".join(values) for values in (header, *rows)) + "\n")
+        tables.append(EntryTable.read(filename))
+    define_common_startnr(tables)
+    for data in tables:
+        assert len(set(data.column("STARTNR"))) == 3
+    assert tables[0].column("STARTNR") == tables[1].column("STARTNR")
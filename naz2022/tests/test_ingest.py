@@ -0,0 +1,39 @@
+import concurrent.futures
+
+import pytest
+
+from ingest import Source, load_sources
+from run_report import RunReport
+
+
+def _load(value):
+    return [value] * 3
+
+
+def test_load_sources():
+    report = RunReport("test")
+    sources = [Source("a", _load, ("a",)), None, Source("b", _load, ("b",), process=True)]
+    assert load_sources(sources, report, prefix="x/") == {"a": ["a"] * 3, "b": ["b"] * 3}
+    assert sorted(stage.name for stage in report.stages) == ["x/load_a", "x/load_b"]
+
+
+def test_thread_stages_without_process_measures():
+    sources = [Source("a", _load, ("a",)), Source("b", _load, ("b",))]
+    report = RunReport("test")
+    load_sources(sources, report, processes=False)
+    assert all(stage.concurrent and stage.cpu_s is None and stage.rss_growth_mb is None for stage in report.stages)
+    report = RunReport("test")
+    load_sources(sources, report, concurrent=False)
+    assert all(not stage.concurrent and stage.cpu_s is not None for stage in report.stages)
+
+
+def test_no_process_pool_without_processes(monkeypatch):
+    def _no_pool(*args, **kwargs):
+        raise AssertionError("process pool started")
+
+    monkeypatch.setattr("os.cpu_count", lambda: 4)
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", _no_pool)
+    sources = [Source("a", _load, ("a",), process=True), Source("b", _load, ("b",), process=True)]
+    assert load_sources(sources, processes=False) == {"a": ["a"] * 3, "b": ["b"] * 3}
+    with pytest.raises(AssertionError):
+        load_sources(sources)
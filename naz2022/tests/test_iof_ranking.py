@@ -0,0 +1,32 @@
+from iof_ranking import RankingStore, parse_ranking_filename
+
+
+RANKING_HEADER = ["WRS Position", "IOF ID", "First Name", "Last Name", "Country", "WRS Points"]
+
+
+def _ranking(filename, rows):
+    with open(filename, "w", encoding="UTF8") as f:
+        f.write("\n".join(";".join(values) for values in (RANKING_HEADER, *rows)) + "\n")
+    return filename
+
+
+def test_parse_ranking_filename():
+    assert parse_ranking_filename("data/iof_ranking_MEN_F_18-08-2022.csv") == ("MEN_F", "2022-08-18")
+    assert parse_ranking_filename("ranking.csv") == (None, None)
+
+
+def test_ranks_of_the_latest_snapshot(tmp_path):
+    store = RankingStore(tmp_path / "rankings.sqlite")
+    assert store.add_snapshot(_ranking(tmp_path / "iof_ranking_MEN_F_18-08-2022.csv", [
+        ["1", "500", "Urs", "Frei", "SUI", "1400"],
+        ["2", "501", "Max", "Huber", "SUI", "1350"],
+    ])) == ("MEN_F", "2022-08-18", 2)
+    store.add_snapshot(_ranking(tmp_path / "iof_ranking_MEN_F_25-08-2022.csv", [
+        ["1", "501", "Max", "Huber", "SUI", "1410"],
+        ["2", "500", "Urs", "Frei", "SUI", "1390"],
+    ]))
+    assert store.snapshots() == [("MEN_F", "2022-08-18", 2), ("MEN_F", "2022-08-25", 2)]
+    # Unranked athletes are left out
+    assert store.ranks("MEN_F", ["500", "501", "999"]) == {"500": 2, "501": 1}
+    assert store.ranks("MEN_F", ["500"], snapshot="2022-08-20") == {"500": 1}
+    store.close()
@@ -0,0 +1,61 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+import typer
+
+from iof_xml import start_list, write_entry_list, write_start_list
+from oe_entries import EntryTable
+from synthetic_data import OE_HEADER_DE
+
+
+IOF = "{http://www.orienteering.org/datastandard/3.0}"
+
+
+def _table(oe_csv, rows):
+    return EntryTable.read(oe_csv("entries.csv", OE_HEADER_DE, [[row.get(k, "") for k in OE_HEADER_DE] for row in rows]))
+
+
+def test_entry_list(oe_csv, tmp_path):
+    data = _table(oe_csv, [
+        {"Stnr": "1", "Chipnr": "100", "Nachname": "Keller", "Vorname": "Lea", "Jg": "1990", "Geschlecht": "F", "Kurz": "DE", "Num3": "500", "Ort": "OLG Bern", "Nat": "SUI"},
+        {"Stnr": "2", "Nachname": "Vakant", "Kurz": "DE"},
+    ])
+    assert write_entry_list(tmp_path / "entries.xml", data, "Test") == 1
+    person = ET.parse(tmp_path / "entries.xml").getroot().find(f"{IOF}PersonEntry/{IOF}Person")
+    assert person.get("sex") == "F"
+    assert person.find(f"{IOF}Id").text == "500"
+    assert person.find(f"{IOF}Name/{IOF}Family").text == "Keller"
+    # Only the year is known
+    assert person.find(f"{IOF}BirthDate") is None
+
+
+def test_names_outside_latin1(oe_csv, tmp_path):
+    data = _table(oe_csv, [{"Stnr": "1", "Nachname": "Keller", "Vorname": "Lea", "Jg": "1990", "Kurz": "DE"}])
+    data.append({"FAMILY_NAME": "Dvořák", "GIVEN_NAME": "Łukasz", "BIRTH": "1995", "CLASS": "HE"})
+    data.write(tmp_path / "out.csv")
+    assert "Dvorák;?ukasz" in (tmp_path / "out.csv").read_text(encoding="ISO-8859-1")
+    write_entry_list(tmp_path / "entries.xml", data, "Test")
+    families = [e.text for e in ET.parse(tmp_path / "entries.xml").getroot().iter(f"{IOF}Family")]
+    assert families == ["Keller", "Dvořák"]
+
+
+def test_start_list(oe_csv, tmp_path):
+    data = _table(oe_csv, [
+        {"Stnr": "2", "Nachname": "Keller", "Vorname": "Lea", "Kurz": "DE", "Start": "0:12:00"},
+        {"Stnr": "1", "Nachname": "Frei", "Vorname": "Anna", "Kurz": "DE", "Start": "0:10:00"},
+    ])
+    assert write_start_list(tmp_path / "start.xml", data, "Test", "2022-08-27", "12:00:00", "+02:00") == 2
+    starts = ET.parse(tmp_path / "start.xml").getroot().findall(f"{IOF}ClassStart/{IOF}PersonStart/{IOF}Start")
+    assert [(s.find(f"{IOF}BibNumber").text, s.find(f"{IOF}StartTime").text) for s in starts] == [
+        ("1", "2022-08-27T12:10:00+02:00"),
+        ("2", "2022-08-27T12:12:00+02:00"),
+    ]
+
+
+def test_zero_time_without_seconds(oe_csv, tmp_path):
+    data = _table(oe_csv, [{"Stnr": "1", "Nachname": "Frei", "Vorname": "Anna", "Kurz": "DE", "Start": "0:10:00"}])
+    write_start_list(tmp_path / "start.xml", data, "Test", "2022-08-27", "12:00")
+    assert ET.parse(tmp_path / "start.xml").getroot().find(f"{IOF}ClassStart/{IOF}PersonStart/{IOF}Start/{IOF}StartTime").text == "2022-08-27T12:10:00"
+    with pytest.raises(typer.BadParameter):
+        start_list(oe_input_filename=tmp_path / "missing.csv", event_name="Test", date="2022-08-27", zero_time="noon",
+                   utc_offset="", language=None, output_filename=tmp_path / "start.xml", report_filename=None, profile=None, trace_memory=None)
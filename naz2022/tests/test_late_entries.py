@@ -0,0 +1,85 @@
+import os
+
+import openpyxl
+import pytest
+
+from add_late_entries import add_late_entries, read_late_entries
+from late_ledger import LateEntriesLedger
+from oe_entries import EntryTable
+from solv_db import SolvDB
+
+
+OE_HEADER = [
+    "Stnr", "Chipnr", "Datenbank Id", "Nachname", "Vorname", "Jg", "Geschlecht", "Block", "Club-Nr.", "Abk", "Ort", "Nat",
+    "Sitz", "Region", "Katnr", "Kurz", "Num3", "Adr. Nachname", "Adr. Vorname", "Straße", "PLZ", "Adr. Ort", "EMail", "Startgeld",
+]
+SOLV_DB_HEADER = [
+    "Datenbank Id", "Chipnr SI", "Nachname", "Vorname", "Jg", "G", "Club-Nr.", "Abk", "Ort", "Nat", "Sitz",
+    "Region", "Num1", "Num3", "Adr. Nachname", "Adr. Vorname", "Straße", "PLZ", "Adr. Ort", "EMail",
+]
+LATE_ENTRIES_HEADER = ["SOLV-nr", "Cognome", "Nome", "Cat", "SI-Card", "Importo", "Eseguito"]
+RUNNERS = [
+    ("S1", "Keller", "Lea", "F", "OLG Bern", "D35"),
+    ("S2", "Frei", "Urs", "M", "OLG Bern", "H35"),
+    ("S3", "Rossi", "Luca", "M", "OLC Kapreolo", "H20"),
+]
+
+
+@pytest.fixture
+def files(oe_csv, tmp_path):
+    oe_csv("entries.csv", OE_HEADER, [["1", "100", "S9", "Huber", "Max", "1980", "M"] + [""] * (len(OE_HEADER) - 7)])
+    solv_runners = [
+        {"Datenbank Id": solvnr, "Chipnr SI": str(200 + n), "Nachname": family, "Vorname": given, "Jg": "1980", "G": sex, "Ort": club, "Nat": "SUI", "Num1": "101"}
+        for n, (solvnr, family, given, sex, club, _) in enumerate(RUNNERS)
+    ]
+    oe_csv("solv-competitors.csv", SOLV_DB_HEADER, [[runner.get(k, "") for k in SOLV_DB_HEADER] for runner in solv_runners])
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.title = "Sabato"
+    sheet.append(["Iscrizioni tardive"])
+    sheet.append(LATE_ENTRIES_HEADER)
+    for solvnr, family, given, _, _, class_name in RUNNERS:
+        sheet.append([solvnr, family, given, class_name, None, 20, None])
+    book.save(tmp_path / "late.xlsx")
+    return {"oe_entries": tmp_path / "entries.csv", "solv_db": tmp_path / "solv-competitors.csv", "late_entries": tmp_path / "late.xlsx"}
+
+
+def _run(files, ledger_filename):
+    data = EntryTable.read(files["oe_entries"])
+    ledger = LateEntriesLedger(ledger_filename)
+    solv_db = SolvDB.open(files["solv_db"])
+    new_rows = add_late_entries(data, solv_db, files["late_entries"], "Sabato", ledger, read_late_entries(files["late_entries"], "Sabato"))
+    solv_db.close()
+    ledger.save()
+    return data, new_rows
+
+
+def _replace_in_solv_db(files, old, new):
+    filename = files["solv_db"]
+    content = filename.read_text(encoding="ISO-8859-1")
+    filename.write_text(content.replace(old, new), encoding="ISO-8859-1")
+    # Same size, the index is rebuilt by content
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_ledger_replays_the_rows(files, tmp_path):
+    first, new_rows = _run(files, tmp_path / "ledger.json")
+    assert [row["SOLVNR"] for row in new_rows] == ["S1", "S2", "S3"]
+    assert first.get(first.find("SOLVNR", "S3"), "CLASS") == "H20"
+    second, new_rows = _run(files, tmp_path / "ledger.json")
+    assert new_rows == []
+    assert list(second.rows()) == list(first.rows())
+
+
+def test_solv_db_change(files, tmp_path):
+    first, new_rows = _run(files, tmp_path / "ledger.json")
+    _replace_in_solv_db(files, ";OLG Bern;", ";OLG Berx;")
+
+    second, new_rows = _run(files, tmp_path / "ledger.json")
+    # Only the late entries of the renamed club are imported again
+    assert [row["SOLVNR"] for row in new_rows] == ["S1", "S2"]
+    assert second.get(second.find("SOLVNR", "S1"), "CLUB_NAME") == "OLG Berx"
+    third, new_rows = _run(files, tmp_path / "ledger.json")
+    assert new_rows == []
+    assert list(third.rows()) == list(second.rows())
@@ -0,0 +1,74 @@
+import pickle
+
+import oe_columns
+from oe_entries import EntryTable
+
+
+HEADER_DE = ["Stnr", "Chipnr", "Datenbank Id", "Nachname", "Vorname", "Jg", "Kurz", "Num3"]
+
+
+def _write(filename, header, rows):
+    with open(filename, "w", encoding="ISO-8859-1") as f:
+        for values in (header, *rows):
+            f.write(";".join(values) + "\n")
+    return filename
+
+
+def test_columns_by_id(tmp_path):
+    filename = _write(tmp_path / "entries.csv", HEADER_DE, [
+        ["1", "12345", "A1", "Müller", "Anna", "1990", "D21E", "500"],
+        ["2", "0", "A2", "Vakant", "", "", "D21E", "0"],
+    ])
+    table = EntryTable.read(filename, name_fields=("FAMILY_NAME", "GIVEN_NAME", "BIRTH"))
+    assert table.language == "de"
+    assert table.field_name("SICARD") == "Chipnr"
+    assert table.get(0, "IOFID") == table.get(0, "Num3") == "500"
+    assert table.find("SICARD", "12345") == 0
+    # "0" is OE's missing value
+    assert table.find("SICARD", "0") is None
+    assert table.find_name(("Müller", "Anna", "1990")) == 0
+    # Vacant places are not indexed by name
+    assert len(table.ix_by_name) == 1
+
+
+def test_set_updates_indexes(tmp_path):
+    filename = _write(tmp_path / "entries.csv", HEADER_DE, [["1", "12345", "A1", "Müller", "Anna", "1990", "D21E", "500"]])
+    table = EntryTable.read(filename, name_fields=("FAMILY_NAME", "GIVEN_NAME", "BIRTH"))
+    table.set(0, "SICARD", "777")
+    table.set(0, "GIVEN_NAME", "Hanna")
+    assert table.find("SICARD", "12345") is None
+    assert table.find("SICARD", "777") == 0
+    assert table.find_name(("Müller", "Anna", "1990")) is None
+    assert table.find_name(("Müller", "Hanna", "1990")) == 0
+
+
+def test_italian_header(tmp_path):
+    header = [oe_columns.translation(oe_columns.load("de"), oe_columns.load("it")).get(k, k) for k in HEADER_DE]
+    filename = _write(tmp_path / "entries.csv", header, [["1", "12345", "A1", "Rossi", "Luca", "1990", "H21E", "500"]])
+    table = EntryTable.read(filename)
+    assert table.language == "it"
+    assert table.find("SICARD", "12345") == 0
+    assert table.get(0, "FAMILY_NAME") == "Rossi"
+
+
+def test_pickle(tmp_path):
+    filename = _write(tmp_path / "entries.csv", HEADER_DE, [["1", "12345", "A1", "Müller", "Anna", "1990", "D21E", "500"]])
+    table = EntryTable.read(filename, name_fields=("FAMILY_NAME", "GIVEN_NAME", "BIRTH"))
+    copy = pickle.loads(pickle.dumps(table))
+    assert copy.oe_columns is oe_columns.load("de")
+    assert copy.find("SICARD", "12345") == 0
+    assert copy.get(0, "CLASS") == "D21E"
+    copy.write(tmp_path / "copy.csv")
+    assert (tmp_path / "copy.csv").read_bytes() == filename.read_bytes().replace(b"\n", b"\r\n")
+
+
+def test_append_and_write(tmp_path):
+    filename = _write(tmp_path / "entries.csv", HEADER_DE, [["1", "12345", "A1", "Müller", "Anna", "1990", "D21E", "500"]])
+    table = EntryTable.read(filename, name_fields=("FAMILY_NAME", "GIVEN_NAME", "BIRTH"))
+    assert table.append({"FAMILY_NAME": "Rossi", "GIVEN_NAME": "Luca", "BIRTH": "1985", "CLASS": "H21E", "SICARD": "888"}) == 1
+    assert table.find("SICARD", "888") == 1
+    assert table.find_name(("Rossi", "Luca", "1985")) == 1
+    table.write(tmp_path / "copy.csv")
+    assert (tmp_path / "copy.csv").read_bytes() == (
+        filename.read_bytes() + ";".join(["", "888", "", "Rossi", "Luca", "1985", "H21E", ""]).encode() + b"\n"
+    ).replace(b"\n", b"\r\n")
@@ -0,0 +1,24 @@
+import importlib
+
+import pytest
+
+import oe_tools
+
+
+def test_usage_lists_every_command():
+    usage = oe_tools.usage()
+    assert all(command in usage for command in oe_tools.COMMANDS)
+
+
+@pytest.mark.parametrize("command", sorted(oe_tools.COMMANDS))
+def test_commands_exist(command):
+    module_name, functions, _ = oe_tools.COMMANDS[command]
+    module = importlib.import_module(module_name)
+    assert all(callable(getattr(module, function)) for function in functions)
+
+
+def test_unknown_command(capsys):
+    with pytest.raises(SystemExit) as exit:
+        oe_tools.main(["no-such-command"])
+    assert exit.value.code == 2
+    assert "Unknown command" in capsys.readouterr().err
@@ -0,0 +1,89 @@
+import json
+import subprocess
+import sys
+
+import pipeline
+
+
+HEADER_DE = ["Stnr", "Chipnr", "Datenbank Id", "Nachname", "Vorname", "Jg", "Kurz", "Num3"]
+
+
+def run_pipeline(config_filename, *args):
+    subprocess.run([sys.executable, "pipeline.py", str(config_filename), *args], check=True, capture_output=True)
+
+
+def _outputs(config_filename):
+    config = json.loads(config_filename.read_text(encoding="UTF8"))
+    return {event["name"]: open(event["output"], "rb").read() for event in config["events"]}
+
+
+def _event_rows(*names):
+    return [["0", "0", "", family, given, "1990", class_name, "0"] for family, given, class_name in names]
+
+
+def _config(oe_csv, tmp_path):
+    oe_csv("day1.csv", HEADER_DE, _event_rows(("Keller", "Lea", "DE"), ("Frei", "Anna", "D20"), ("Meier", "Urs", "HE"), ("Huber", "Max", "H20"), ("Rossi", "Luca", "H35")))
+    oe_csv("day2.csv", HEADER_DE, _event_rows(("Rossi", "Luca", "H35"), ("Keller", "Lea", "DE"), ("Bianchi", "Sara", "D35")))
+    config_filename = tmp_path / "pipeline.json"
+    config_filename.write_text(json.dumps({"events": [
+        {"name": "day1", "oe_entries": "day1.csv", "output": str(tmp_path / "day1_final.csv")},
+        {"name": "day2", "oe_entries": "day2.csv", "output": str(tmp_path / "day2_final.csv")},
+    ]}), encoding="UTF8")
+    return config_filename
+
+
+def test_common_startnr(oe_csv, tmp_path):
+    config_filename = _config(oe_csv, tmp_path)
+    config = pipeline.load_config(config_filename)
+    assert config.events[0].oe_entries == tmp_path / "day1.csv"
+    day1, day2 = pipeline.run_pipeline(config)
+
+    startnr = [{(t.get(i, "Nachname"), t.get(i, "Vorname")): t.get(i, "Stnr") for i in range(len(t))} for t in (day1, day2)]
+    assert startnr[0][("Keller", "Lea")] == startnr[1][("Keller", "Lea")]
+    assert startnr[0][("Rossi", "Luca")] == startnr[1][("Rossi", "Luca")]
+    # The elite classes get the first numbers, the others start at the next hundred
+    assert sorted(int(startnr[0][k]) for k in (("Keller", "Lea"), ("Frei", "Anna"), ("Meier", "Urs"), ("Huber", "Max"))) == [1, 2, 3, 4]
+    assert int(startnr[1][("Bianchi", "Sara")]) > 100
+    assert (tmp_path / "day2_final_startnr.csv").exists()
+
+
+
+def test_parallel_events(synthetic):
+    """The tables of the events are sent back from the worker processes."""
+    config_filename = synthetic["pipeline"]
+    run_pipeline(config_filename, "--no-cache", "-j", "1")
+    sequential = _outputs(config_filename)
+    run_pipeline(config_filename, "--no-cache", "-j", "2")
+    assert _outputs(config_filename) == sequential
+
+
+def test_late_entries_delta(synthetic, tmp_path):
+    config_filename = synthetic["pipeline"]
+    config = json.loads(config_filename.read_text(encoding="UTF8"))
+    for event in config["events"]:
+        event["late_entries_ledger"] = str(tmp_path / f"{event['name']}_ledger.json")
+    config_filename.write_text(json.dumps(config), encoding="UTF8")
+    delta_filenames = [tmp_path / "data" / f"{event['name']}_entries_final_delta.csv" for event in config["events"]]
+
+    run_pipeline(config_filename, "--cache-dir", str(tmp_path / "cache"))
+    assert all(len(filename.read_text(encoding="ISO-8859-1").splitlines()) > 1 for filename in delta_filenames)
+    # Everything in the ledger, the stages taken from the cache
+    run_pipeline(config_filename, "--cache-dir", str(tmp_path / "cache"))
+    assert all(len(filename.read_text(encoding="ISO-8859-1").splitlines()) == 1 for filename in delta_filenames)
+
+
+def test_entry_list_keeps_eventor_names(synthetic, tmp_path):
+    """Names outside ISO-8859-1 reach the entry list, also from the stage cache."""
+    eventor_filename = synthetic["eventor_entries"]
+    eventor_filename.write_text(eventor_filename.read_text(encoding="UTF8").replace("<Family>", "<Family>Dvořák-", 1), encoding="UTF8")
+    config_filename = synthetic["pipeline"]
+    config = json.loads(config_filename.read_text(encoding="UTF8"))
+    for event in config["events"]:
+        event["entry_list"] = str(tmp_path / f"{event['name']}_entries.xml")
+    config_filename.write_text(json.dumps(config), encoding="UTF8")
+
+    for _ in range(2):
+        run_pipeline(config_filename, "--cache-dir", str(tmp_path / "cache"))
+        for event in config["events"]:
+            assert "Dvořák-" in open(event["entry_list"], encoding="UTF8").read()
+            assert "Dvorák-" in open(event["output"], encoding="ISO-8859-1").read()
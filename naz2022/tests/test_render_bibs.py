@@ -0,0 +1,30 @@
+import pytest
+
+from render_bibs import DEFAULT_TEMPLATE, read_bibs, render_bibs
+from workbook import write_sheet
+
+
+HEADER = ["Startnummer", "Vorname", "Nachname", "Start (Sabato)", "Kategorie (Sabato)", "Startzeit (Sabato)"]
+
+
+def test_read_bibs(tmp_path):
+    write_sheet(tmp_path / "startnr.xlsx", HEADER, [
+        [101, "Lea", "Keller", "START 1", "DE", "10:00"],
+        [102, "Urs", "Frei", None, None, None],
+    ])
+    bibs = read_bibs(tmp_path / "startnr.xlsx")
+    assert [bib.startnr for bib in bibs] == ["101", "102"]
+    assert bibs[0].runs == (("Sabato", "START 1", "DE", "10:00"),)
+    assert bibs[1].runs == (("Sabato", "", "", ""),)
+    bibs[1].given_name = "Lea"
+    assert bibs[0].content_hash() != bibs[1].content_hash()
+
+
+def test_render_bibs(tmp_path):
+    pytest.importorskip("reportlab")
+    write_sheet(tmp_path / "startnr.xlsx", HEADER, [
+        [startnr, "Lea", "Keller", "START 1", "DE", "10:00"] for startnr in range(101, 106)
+    ])
+    files = render_bibs(read_bibs(tmp_path / "startnr.xlsx"), dict(DEFAULT_TEMPLATE), tmp_path / "bibs", bibs_per_file=2)
+    assert [f.name for f in files] == ["bibs_101-102.pdf", "bibs_103-104.pdf", "bibs_105-105.pdf"]
+    assert all(f.read_bytes().startswith(b"%PDF") for f in files)
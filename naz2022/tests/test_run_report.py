@@ -0,0 +1,38 @@
+import json
+
+import pytest
+import typer
+
+from run_report import measure_run
+
+
+def test_report_stages(tmp_path):
+    report_filename = tmp_path / "report.json"
+    with measure_run("test", report_filename, profile="work") as report:
+        with report.stage("read") as st:
+            st.rows_out = 3
+        with report.stage("work", rows_in=3):
+            sum(range(1000))
+    result = json.loads(report_filename.read_text(encoding="UTF8"))
+    assert result["tool"] == "test"
+    assert [(st["name"], st["rows_out"]) for st in result["stages"]] == [("read", 3), ("work", None)]
+    assert result["stages"][1]["profile"]["total_calls"] > 0
+    assert (tmp_path / "report_work.prof").exists()
+
+
+def test_report_written_on_exit(tmp_path):
+    report_filename = tmp_path / "report.json"
+    with pytest.raises(typer.Exit):
+        with measure_run("test", report_filename) as report:
+            with report.stage("check"):
+                pass
+            raise typer.Exit(1)
+    assert [st["name"] for st in json.loads(report_filename.read_text(encoding="UTF8"))["stages"]] == ["check"]
+
+
+def test_no_report_without_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with measure_run("test") as report:
+        with report.stage("check"):
+            pass
+    assert list(tmp_path.iterdir()) == []
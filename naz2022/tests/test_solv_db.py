@@ -0,0 +1,49 @@
+import os
+
+from solv_db import SolvDB
+
+
+SOLV_DB_HEADER = ["Datenbank Id", "Chipnr SI", "Nachname", "Vorname", "Jg", "G", "Ort", "Nat"]
+RUNNERS = [
+    ["S1", "100", "Keller", "Lea", "1990", "F", "OLG Bern", "SUI"],
+    ["S2", "200", "Frei", "Urs", "1985", "M", "OLC Kapreolo", "SUI"],
+    ["S3", "200", "Frei", "Anna", "1988", "F", "OLC Kapreolo", "SUI"],
+]
+
+
+def _solv_db(filename, rows):
+    with open(filename, "w", encoding="ISO-8859-1") as f:
+        f.write("\n".join(";".join(values) for values in (SOLV_DB_HEADER, *rows)) + "\n")
+    return filename
+
+
+def test_lookups(tmp_path):
+    db = SolvDB.open(_solv_db(tmp_path / "solv-competitors.csv", RUNNERS))
+    assert len(db) == 3
+    assert "S1" in db
+    assert db["S1"]["Nachname"] == "Keller"
+    # Same aliases as the OE entries
+    assert db["S1"]["Chipnr"] == "100"
+    assert db["S1"]["Geschlecht"] == "F"
+    assert db.get("missing") is None
+    assert [r["Datenbank Id"] for r in db.by_sicard("200")] == ["S2", "S3"]
+    assert [r["Datenbank Id"] for r in db.by_name("Frei", "Anna", 1988)] == ["S3"]
+    db.close()
+
+
+def test_index_rebuilt_on_change(tmp_path):
+    filename = _solv_db(tmp_path / "solv-competitors.csv", RUNNERS)
+    db = SolvDB.open(filename)
+    digest = db.meta()["sha256"]
+    db.close()
+    # Touched only: same index
+    os.utime(filename)
+    db = SolvDB.open(filename)
+    assert db.meta()["sha256"] == digest
+    db.close()
+    # One runner less
+    _solv_db(filename, RUNNERS[:-1])
+    db = SolvDB.open(filename)
+    assert db.meta()["sha256"] != digest
+    assert len(db) == 2
+    db.close()
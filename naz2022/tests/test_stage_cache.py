@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+from stage_cache import STAGE_SOURCES, StageCache, stage_key
+
+
+def _file(path, content):
+    path.write_bytes(content)
+    return path
+
+
+def test_stage_key():
+    key = stage_key(previous="a", params={"x": 1, "y": 2})
+    assert key == stage_key(params={"y": 2, "x": 1}, previous="a")
+    assert key != stage_key(previous="b", params={"x": 1, "y": 2})
+    assert key != stage_key(previous="a", params={"x": 1, "y": 3})
+
+
+def test_put_get(tmp_path):
+    cache = StageCache(tmp_path / "cache")
+    files = cache.put("k1", "stage", {"out.csv": _file(tmp_path / "a.csv", b"abc")})
+    assert files["out.csv"].read_bytes() == b"abc"
+    assert cache.get("k1") == files
+    assert cache.get("k2") is None
+    # An entry whose files were removed is dropped
+    files["out.csv"].unlink()
+    assert cache.get("k1") is None
+    assert cache.size() == 0
+    cache.close()
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = StageCache(tmp_path / "cache", max_bytes=250)
+    for key in ("k1", "k2"):
+        cache.put(key, "stage", {"out": _file(tmp_path / key, b"x" * 100)})
+    cache.get("k1")
+    cache.put("k3", "stage", {"out": _file(tmp_path / "k3", b"x" * 100)})
+    assert cache.get("k2") is None
+    assert cache.get("k1") is not None and cache.get("k3") is not None
+    assert cache.size() == 200
+    cache.close()
+
+
+def test_file_digest(tmp_path):
+    cache = StageCache(tmp_path / "cache")
+    filename = _file(tmp_path / "input.csv", b"abc")
+    digest = cache.file_digest(filename)
+    assert cache.file_digest(filename) == digest
+    _file(filename, b"abd")
+    os.utime(filename, ns=(1, 1))
+    assert cache.file_digest(filename) != digest
+    cache.close()
+
+
+def test_stage_sources_cover_the_pipeline(tools_dir):
+    # Every module of the folder imported by the pipeline
+    code = "import sys, pipeline; print('\\n'.join(getattr(m, '__file__', None) or '' for m in list(sys.modules.values())))"
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=tools_dir, capture_output=True, text=True, check=True).stdout.split()
+    local = {Path(f).resolve().relative_to(tools_dir).parts[0] for f in loaded if Path(f).resolve().is_relative_to(tools_dir)}
+    assert local <= set(STAGE_SOURCES)
+    assert "tests" not in STAGE_SOURCES
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from oe_entries import EntryTable
+from start_blocks import assign_start_blocks, load_config
+
+
+HEADER_DE = ["Stnr", "Block", "Datenbank Id", "Nachname", "Vorname", "Jg", "Katnr", "Kurz", "Rang", "Num2", "Num3", "Chipnr", "Start"]
+
+
+def _setup(tmp_path, block_size):
+    data = EntryTable(HEADER_DE, index_cols=())
+    for n in range(1, 6):
+        data.append({**dict.fromkeys(HEADER_DE, ""), "Datenbank Id": f"S{n}", "Nachname": f"Runner {n}", "Kurz": "H18"})
+    (tmp_path / "ranking.csv").write_text("Datenbank Id;Punkte\n" + "".join(f"S{n};{n * 10}\n" for n in range(1, 6)), encoding="ISO-8859-1")
+    config = {
+        "sources": {"solv": {"csv": "ranking.csv", "value_column": "Punkte", "higher_is_better": True}},
+        "classes": {"H18": {"source": "solv", "block_size": block_size}},
+    }
+    config_filename = tmp_path / "blocks.json"
+    config_filename.write_text(json.dumps(config), encoding="UTF8")
+    return data, config_filename
+
+
+def test_blocks(tmp_path):
+    data, config_filename = _setup(tmp_path, 2)
+    seedings, sources = load_config(config_filename, data)
+    assign_start_blocks(data, seedings, sources)
+    blocks = dict(zip(data.column("Datenbank Id"), data.column("Block")))
+    # The best block starts last
+    assert [blocks[f"S{n}"] for n in (5, 4, 3, 2, 1)] == ["5", "5", "3", "3", "1"]
+
+
+@pytest.mark.parametrize("block_size", [0, -2, 2.5, "10"])
+def test_invalid_block_size(tmp_path, block_size):
+    data, config_filename = _setup(tmp_path, block_size)
+    with pytest.raises(ValueError, match="block_size of class H18"):
+        load_config(config_filename, data)
+
+
+def test_unknown_source(tmp_path):
+    data, config_filename = _setup(tmp_path, 2)
+    config = json.loads(config_filename.read_text(encoding="UTF8"))
+    config["classes"]["H18"]["source"] = "men"
+    config_filename.write_text(json.dumps(config), encoding="UTF8")
+    with pytest.raises(ValueError, match="unknown source 'men' of class H18"):
+        load_config(config_filename, data)
@@ -0,0 +1,70 @@
+import typer
+from typer.testing import CliRunner
+
+import validate_startlist
+from audit_entries import EntryAudit
+from synthetic_data import OE_HEADER_DE
+from validate_startlist import AUDIT_CHECKS, load_start_list, validate
+
+
+def _start_list(oe_csv, name, rows, day, zero="10:00:00", start_mapping=None):
+    filename = oe_csv(name, OE_HEADER_DE, [[row.get(k, "") for k in OE_HEADER_DE] for row in rows])
+    return load_start_list(filename, zero, name, day, start_mapping or {})
+
+
+def _runner(startnr, start, family_name, club="1", class_name="HE", sicard=""):
+    return {"Stnr": startnr, "Start": start, "Nachname": family_name, "Vorname": "Jonas", "Jg": "1990",
+            "Club-Nr.": club, "Kurz": class_name, "Chipnr": sicard}
+
+
+def test_start_gap(oe_csv):
+    morning = _start_list(oe_csv, "morning.csv", [_runner("1", "0:30:00", "Meier")], "sat", zero="09:00:00")
+    afternoon = _start_list(oe_csv, "afternoon.csv", [_runner("1", "0:15:00", "Meier")], "sat", zero="10:00:00")
+    issues = validate([morning, afternoon])
+    assert [(i.check, i.startnr) for i in issues] == [("start_gap", "1")]
+    assert "45 min apart" in issues[0].detail
+    afternoon.day = "sun"
+    assert validate([morning, afternoon]) == []
+
+
+def test_day_rest(oe_csv):
+    # Without --day, one run per day
+    saturday = _start_list(oe_csv, "sat.csv", [_runner("1", "6:00:00", "Meier"), _runner("2", "0:00:00", "Frei", club="2")], "0", zero="14:00:00")
+    sunday = _start_list(oe_csv, "sun.csv", [_runner("1", "0:30:00", "Meier"), _runner("2", "0:35:00", "Frei", club="2")], "1", zero="07:00:00")
+    issues = validate([saturday, sunday])
+    assert [(i.check, i.startnr) for i in issues] == [("day_rest", "1")]
+    assert issues[0].detail == "starts 20:00 and 07:30 the next day, 11:30 h apart"
+    assert validate([saturday, sunday], min_rest_hours=0) == []
+
+
+def test_checks_of_one_start_list(oe_csv):
+    rows = [
+        _runner("1", "0:10:00", "Meier", club="1", sicard="100"),
+        _runner("2", "0:12:00", "Frei", club="1", sicard="100"),
+        _runner("3", "0:12:00", "Keller", club="2"),
+        _runner("4", "0:12:00", "Vakant"),
+    ]
+    sl = _start_list(oe_csv, "run.csv", rows, "sat", start_mapping={"HE": "START 1"})
+    checks = sorted(i.check for i in validate([sl], capacity=1))
+    assert checks == ["duplicate_sicard", "same_club", "slot_capacity"]
+
+
+def test_same_issues_as_audit(oe_csv):
+    saturday = _start_list(oe_csv, "sat.csv", [_runner("1", "0:10:00", "Meier"), _runner("2", "0:12:00", "Frei", club="2")], "sat")
+    sunday = _start_list(oe_csv, "sun.csv", [_runner("2", "0:10:00", "Meier"), _runner("3", "0:12:00", "Keller", club="2")], "sun")
+    audit = EntryAudit()
+    for filename in (saturday.filename, sunday.filename):
+        audit.add_file(filename)
+    expected = sorted((i.check, i.startnr) for i in audit.audit(AUDIT_CHECKS))
+    assert expected == [("startnr_mismatch", "2"), ("startnr_shared", "2")]
+    assert sorted((i.check, i.startnr) for i in validate([saturday, sunday])) == expected
+
+
+def test_day_needed_for_more_runs(oe_csv):
+    filename = oe_csv("run.csv", OE_HEADER_DE, [])
+    app = typer.Typer()
+    app.command()(validate_startlist.main)
+    args = [arg for _ in range(3) for arg in ("--oe-input", str(filename), "--zero", "10:00:00")]
+    result = CliRunner().invoke(app, args)
+    assert result.exit_code == 2
+    assert "--day" in result.output
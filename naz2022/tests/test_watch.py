@@ -0,0 +1,64 @@
+import csv
+import os
+
+import openpyxl
+import pytest
+
+import pipeline
+from run_report import RunReport
+from watch import PipelineWatcher
+
+
+def _stages(watcher, changed=None):
+    report = RunReport("test")
+    watcher.update(changed, report)
+    return {stage.name for stage in report.stages}
+
+
+def _rows(tables):
+    # The common start numbers are drawn at random
+    return [[{k: v for k, v in row.items() if k != "Stnr"} for row in data.rows()] for data in tables]
+
+
+def _touch(filename):
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_update(synthetic):
+    config = pipeline.load_config(synthetic["pipeline"])
+    watcher = PipelineWatcher(config)
+    assert "day1/read_oe_entries" in _stages(watcher)
+
+    # One late entry less on Saturday, and a club renamed in the SOLV DB
+    workbook = openpyxl.load_workbook(synthetic["late_entries"])
+    workbook["Sabato"].delete_rows(workbook["Sabato"].max_row)
+    workbook.save(synthetic["late_entries"])
+    late_entries = synthetic["late_entries"].read_bytes()
+    solv_db = synthetic["solv_db"]
+    with open(solv_db, encoding="ISO-8859-1", newline="") as f:
+        clubs = {row["Datenbank Id"]: row["Ort"] for row in csv.DictReader(f, delimiter=";")}
+    sheet = workbook["Sabato"]
+    header = [cell.value for cell in sheet[2]]
+    entry = next(dict(zip(header, (cell.value for cell in row))) for row in sheet.iter_rows(min_row=3) if row[header.index("Eseguito")].value is None)
+    club = clubs[entry["SOLV-nr"]]
+    content = solv_db.read_text(encoding="ISO-8859-1")
+    solv_db.write_text(content.replace(f";{club};", f";{club}X;"), encoding="ISO-8859-1")
+    _touch(solv_db)
+
+    # A sheet saved with an error: the stage fails, the change is kept
+    synthetic["late_entries"].write_bytes(b"not a workbook")
+    with pytest.raises(Exception):
+        watcher.update({synthetic["late_entries"], solv_db}, RunReport("test"))
+    synthetic["late_entries"].write_bytes(late_entries)
+    stages = _stages(watcher, {synthetic["late_entries"]})
+    for event in ("day1", "day2"):
+        assert f"{event}/add_late_entries" in stages and f"{event}/define_wre_start_blocks" in stages
+        assert f"{event}/read_oe_entries" not in stages and f"{event}/add_eventor_entries" not in stages
+    assert "load_men_ranking" not in stages
+
+    fresh = pipeline.run_pipeline(config, report=RunReport("test"))
+    assert _rows(state.tables[-1] for state in watcher.events) == _rows(fresh)
+    assert f"{club}X" in {row["Ort"] for data in fresh for row in data.rows()}
+    assert _stages(watcher, {synthetic["oe_entries_de"]}) >= {"day1/read_oe_entries", "day2/read_oe_entries"}
+    watcher.close()
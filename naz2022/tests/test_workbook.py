@@ -0,0 +1,22 @@
+import openpyxl
+
+from workbook import iter_sheet
+
+
+def test_iter_sheet(tmp_path):
+    book = openpyxl.Workbook()
+    book.active.title = "Other"
+    sheet = book.create_sheet("Sabato")
+    sheet.append(["Iscrizioni tardive"])
+    sheet.append(["Cognome", "Nome", None, "Nome", "Importo"])
+    sheet.append(["Keller", "Lea", None, "L.", 20.0])
+    sheet.append([None, None, None, None, None])
+    sheet.append(["Frei", "NA", 1, None, 12.5])
+    book.save(tmp_path / "late.xlsx")
+
+    rows = list(iter_sheet(tmp_path / "late.xlsx", "Sabato", skiprows=1))
+    assert rows[0].header == ("Cognome", "Nome", "Unnamed: 2", "Nome.1", "Importo")
+    assert rows == [("Keller", "Lea", None, "L.", 20), ("Frei", None, 1, None, 12.5)]
+    assert isinstance(rows[0]["Importo"], int)
+    assert rows[1]["Cognome"] == "Frei" and rows[1].get("Eseguito", "-") == "-"
+    assert rows[0].as_dict()["Nome.1"] == "L."
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Check the OE start lists before printing.
+
+Every start list is loaded once into NumPy arrays and all the checks are
+vectorized over the rows:
+
+- slot_capacity: more starters than `--capacity` in the same minute at the
+  same start location (START_MAPPING or `--start-mapping`);
+- same_club: consecutive starters of a class from the same club;
+- duplicate_sicard, duplicate_startnr: within a start list;
+- startnr_shared: a start number given to different athletes in the
+  start lists;
+- startnr_mismatch: an athlete with different start numbers in the start
+  lists;
+- start_gap: an athlete starting less than `--min-gap` minutes apart in two
+  runs of the same `--day`;
+- day_rest: an athlete starting less than `--min-rest` hours apart in runs
+  of consecutive days (the days in the order of the runs), e.g. late on
+  Saturday and early on Sunday.
+
+Without `--day`, the runs are the Saturday and Sunday of RUN_LABELS, so only
+day_rest applies, and more runs need their `--day`.
+
+The checks of the SI-cards and start numbers are those of audit_entries.py,
+run on the tables of the start lists, so the two gates agree. Vacant places
+are ignored. The issues are printed and optionally written
+to a CSV file; the exit code is 1 if there are any.
+
+    python validate_startlist.py --oe-input 8Naz_Liste_di_partenza.csv --zero 12:00:00 \\
+        --oe-input 9Naz_Liste_di_partenza.csv --zero 09:00:00 --output issues.csv
+"""
+
+import csv
+from dataclasses import astuple, dataclass
+import itertools
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import typer
+
+import oe_columns
+from audit_entries import EntryAudit
+from oe_entries import EntryTable
+from export_startnr_for_print import RUN_LABELS, START_MAPPING
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, measure_run
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+SLOT_CAPACITY = 6
+MIN_GAP_MINUTES = 60
+MIN_REST_HOURS = 12
+ISSUE_COLUMNS = ("Run", "Check", "Startnr", "Name", "Detail")
+CLUB_FIELD = "CLUB"
+# Checks of audit_entries.py run on the start lists
+AUDIT_CHECKS = ("duplicate_sicard", "duplicate_startnr", "startnr_shared", "startnr_mismatch")
+
+
+@dataclass
+class Issue:
+    run: str
+    check: str
+    startnr: str
+    name: str
+    detail: str
+
+
+@dataclass
+class StartList:
+    """Columns of a start list as arrays, without the vacant places."""
+    label: str
+    day: str
+    startnr: "np.ndarray"
+    sicard: "np.ndarray"
+    club: "np.ndarray"
+    class_name: "np.ndarray"
+    location: "np.ndarray"
+    name: "np.ndarray"
+    # Seconds from midnight, -1 if missing
+    start: "np.ndarray"
+    filename: Optional[Path] = None
+    # The table the start list is read from, for the audit checks
+    data: Optional[EntryTable] = None
+
+
+def _seconds(value: str) -> int:
+    if not value:
+        return -1
+    parts = value.split(":")
+    return int(parts[0]) * 3600 + int(parts[1]) * 60 + (int(parts[2]) if len(parts) > 2 else 0)
+
+
+def _clock(seconds: int) -> str:
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}"
+
+
+def load_start_list(input_filename: Path, zero_time: str, label: str, day: str, start_mapping: Dict[str, str], columns=None, club_field: str = CLUB_FIELD) -> StartList:
+    import numpy as np
+
+    typer.echo(f"Reading start list from CSV file {input_filename}")
+    data = EntryTable.read(input_filename, index_cols=(), columns=columns)
+    zero = _seconds(zero_time)
+
+    def _col(field_name: str) -> "np.ndarray":
+        return np.array(data.column(field_name) if field_name in data else [""] * len(data), dtype=object)
+
+    family_names = _col("FAMILY_NAME")
+    keep = family_names != data.vacancy_name
+    class_name = _col("CLASS")
+    relative_start = np.fromiter((_seconds(s) for s in data.column("START")), dtype=np.int64, count=len(data))
+    names = family_names + " " + _col("GIVEN_NAME") + " " + _col("BIRTH")
+    return StartList(
+        label=label,
+        day=day,
+        startnr=_col("STARTNR")[keep],
+        sicard=_col("SICARD")[keep],
+        club=_col(club_field)[keep],
+        class_name=class_name[keep],
+        location=np.array([start_mapping.get(c, "") for c in class_name[keep]], dtype=object),
+        name=names[keep],
+        start=np.where(relative_start >= 0, relative_start + zero, -1)[keep],
+        filename=input_filename,
+        data=data,
+    )
+
+
+def _has_value(values: "np.ndarray") -> "np.ndarray":
+    return (values != "") & (values != "0")
+
+
+def check_slot_capacity(sl: StartList, capacity: int) -> List[Issue]:
+    import numpy as np
+
+    rows = np.flatnonzero((sl.start >= 0) & (sl.location != ""))
+    locations, location_code = np.unique(sl.location[rows].astype(str), return_inverse=True)
+    minute = sl.start[rows] // 60
+    slot = location_code * (24 * 60 * 2) + minute
+    slots, counts = np.unique(slot, return_counts=True)
+    return [
+        Issue(sl.label, "slot_capacity", "", "", f"{locations[s // (24 * 60 * 2)]} {_clock(int(s % (24 * 60 * 2)) * 60)}: {c} starters, capacity {capacity}")
+        for s, c in zip(slots.tolist(), counts.tolist())
+        if c > capacity
+    ]
+
+
+def check_same_club(sl: StartList) -> List[Issue]:
+    import numpy as np
+
+    rows = np.flatnonzero(sl.start >= 0)
+    _, class_code = np.unique(sl.class_name[rows].astype(str), return_inverse=True)
+    order = rows[np.lexsort((sl.start[rows], class_code))]
+    club = sl.club[order]
+    same = (
+        (sl.class_name[order][1:] == sl.class_name[order][:-1])
+        & (club[1:] == club[:-1])
+        & _has_value(club[1:])
+    )
+    return [
+        Issue(sl.label, "same_club", sl.startnr[order[k + 1]], sl.name[order[k + 1]],
+              f"{sl.class_name[order[k + 1]]} {_clock(int(sl.start[order[k + 1]]))}: same club {club[k + 1]} as {sl.startnr[order[k]]} {sl.name[order[k]]}")
+        for k in np.flatnonzero(same).tolist()
+    ]
+
+
+def check_audit(start_lists: List[StartList], checks: Sequence[str] = AUDIT_CHECKS) -> List[Issue]:
+    """The `checks` of audit_entries.py on the start lists, by their label."""
+    audit = EntryAudit()
+    for sl in start_lists:
+        audit.add_table(sl.data, sl.label, sl.filename)
+    return [Issue(issue.file, issue.check, issue.startnr, issue.name, issue.detail) for issue in audit.audit(checks)]
+
+
+def check_start_gap(start_lists: List[StartList], min_gap_minutes: int, min_rest_hours: int = MIN_REST_HOURS) -> List[Issue]:
+    """Athletes starting too close in two runs of the same day (start_gap) or of consecutive days (day_rest)."""
+    import numpy as np
+
+    day_order = {day: k for k, day in enumerate(dict.fromkeys(sl.day for sl in start_lists))}
+    issues = []
+    for a, b in itertools.combinations(start_lists, 2):
+        days_apart = day_order[b.day] - day_order[a.day]
+        if days_apart == 0:
+            check, limit = "start_gap", min_gap_minutes * 60
+        elif abs(days_apart) == 1:
+            check, limit = "day_rest", min_rest_hours * 3600
+        else:
+            continue
+        if limit <= 0:
+            continue
+        ok_a = _has_value(a.startnr) & (a.start >= 0)
+        ok_b = _has_value(b.startnr) & (b.start >= 0)
+        _, ix_a, ix_b = np.intersect1d(a.startnr[ok_a].astype(str), b.startnr[ok_b].astype(str), return_indices=True)
+        ix_a, ix_b = np.flatnonzero(ok_a)[ix_a], np.flatnonzero(ok_b)[ix_b]
+        gap = np.abs(b.start[ix_b] + days_apart * 24 * 3600 - a.start[ix_a])
+        close = gap < limit
+        for i, j, g in zip(ix_a[close].tolist(), ix_b[close].tolist(), gap[close].tolist()):
+            if days_apart == 0:
+                detail = f"starts {_clock(int(a.start[i]))} and {_clock(int(b.start[j]))}, {g // 60} min apart"
+            else:
+                detail = f"starts {_clock(int(a.start[i]))} and {_clock(int(b.start[j]))} the {'next day' if days_apart > 0 else 'day before'}, {_clock(g)} h apart"
+            issues.append(Issue(f"{a.label}/{b.label}", check, a.startnr[i], a.name[i], detail))
+    return issues
+
+
+def validate(start_lists: List[StartList], capacity: int = SLOT_CAPACITY, min_gap_minutes: int = MIN_GAP_MINUTES, min_rest_hours: int = MIN_REST_HOURS) -> List[Issue]:
+    issues = []
+    for sl in start_lists:
+        issues += check_slot_capacity(sl, capacity)
+        issues += check_same_club(sl)
+    issues += check_audit(start_lists)
+    issues += check_start_gap(start_lists, min_gap_minutes, min_rest_hours)
+    return issues
+
+
+def main(
+    oe_input_filenames: List[Path]=typer.Option(..., "--oe-input", help="CSV file with the OE start list of a run, repeat for every run"),
+    zero_times: List[str]=typer.Option(..., "--zero", help="Zero time of each run, in the order of --oe-input"),
+    labels: List[str]=typer.Option([], "--label", help="Name of each run. Default: Sabato, Domenica, Run 3, ..."),
+    days: List[str]=typer.Option([], "--day", help="Day of each run, in the order of the days. Default: Sabato and Domenica, required for more runs"),
+    start_mappings: List[Path]=typer.Option([], "--start-mapping", help="JSON file with the start of each class, for each run. Default: the Naz 2022 starts"),
+    capacity: int=typer.Option(SLOT_CAPACITY, help="Maximum number of starters per minute at a start location"),
+    min_gap: int=typer.Option(MIN_GAP_MINUTES, help="Minimum minutes between the starts of an athlete in runs of the same day, 0 to disable"),
+    min_rest: int=typer.Option(MIN_REST_HOURS, help="Minimum hours between the starts of an athlete in runs of consecutive days, 0 to disable"),
+    language: Optional[str]=typer.Option(None, help="Language of the OE exports (de, it). Default: detected from the header of each file"),
+    club_field: str=typer.Option(CLUB_FIELD, help="Column with the club, by name or column ID"),
+    output_filename: Optional[Path]=typer.Option(None, "--output", help="CSV file with the issues"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    for option, values in (("--zero", zero_times), ("--label", labels), ("--day", days), ("--start-mapping", start_mappings)):
+        if (values or option == "--zero") and len(values) != len(oe_input_filenames):
+            typer.secho(f"Give one {option} for each --oe-input", fg=typer.colors.RED)
+            raise typer.Exit(2)
+    if not days and min_gap > 0 and len(oe_input_filenames) > len(RUN_LABELS):
+        typer.secho(f"Give the --day of each run for --min-gap, only {len(RUN_LABELS)} runs are on their own day by default", fg=typer.colors.RED)
+        raise typer.Exit(2)
+
+    columns = oe_columns.load(language) if language else None
+    with measure_run("validate_startlist", report_filename, profile, trace_memory) as report:
+        start_lists = []
+        for n, (input_filename, zero_time) in enumerate(zip(oe_input_filenames, zero_times)):
+            label = labels[n] if labels else (RUN_LABELS[n] if n < len(RUN_LABELS) else f"Run {n + 1}")
+            if start_mappings:
+                with open(start_mappings[n], encoding="UTF8") as f:
+                    start_mapping = json.load(f)
+            else:
+                start_mapping = START_MAPPING.get(n, {})
+            with report.stage(f"load_start_list/{n + 1}") as st:
+                start_lists.append(load_start_list(input_filename, zero_time, label, days[n] if days else str(n), start_mapping, columns, club_field))
+                st.rows_out = len(start_lists[-1].startnr)
+
+        with report.stage("validate", rows_in=sum(len(sl.startnr) for sl in start_lists)) as st:
+            issues = validate(start_lists, capacity, min_gap, min_rest)
+            st.rows_out = len(issues)
+
+        for issue in issues:
+            typer.secho(f"{issue.run:10} {issue.check:18} {issue.startnr:>5} {issue.name:30} {issue.detail}", fg=typer.colors.YELLOW)
+        if output_filename:
+            typer.echo(f"Writing issues to {output_filename}")
+            with open(output_filename, 'w', encoding='UTF8', newline='') as csvfile:
+                writer = csv.writer(csvfile, dialect='excel', delimiter=';')
+                writer.writerow(ISSUE_COLUMNS)
+                writer.writerows(astuple(issue) for issue in issues)
+
+        if issues:
+            typer.secho(f"{len(issues)} issues found", fg=typer.colors.RED)
+            raise typer.Exit(1)
+        typer.secho("Start lists OK", fg=typer.colors.GREEN)
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
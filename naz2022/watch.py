@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Keep the pipeline in memory and run again the stages whose inputs change.
+
+    python watch.py pipeline_naz2022.json
+
+The first run is the run of pipeline.py, in this process. The table of every
+event is then kept as it was before each of its stages, together with the
+SOLV DB index and the rankings, and the input files are polled. When one
+changes (e.g. the late entries sheet is saved, or the entries exported again
+from GO2OL), only the stages reading it and the following ones are run again,
+starting from a copy of the table kept before the first of them: the OE
+export and the Eventor XML are not parsed again unless they changed
+themselves. The outputs of the events run again, the common start numbers and
+the entry lists are then written as by pipeline.py.
+
+A file is read once its size and mtime stayed the same for one poll, so a
+file still being saved is not read half written. When a stage fails (e.g. a
+sheet saved with an error), the error is shown and the stage is run again at
+the next change. A change of the pipeline JSON file itself needs a restart.
+"""
+
+from dataclasses import dataclass, field
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import typer
+
+from oe_entries import EntryTable
+from run_report import PROFILE_OPTION, REPORT_OPTION, TRACE_MEMORY_OPTION, RunReport, measure_run
+import pipeline
+from pipeline import EventConfig, EventStep, PipelineConfig, input_path
+
+
+POLL_INTERVAL = 0.5
+
+FileStamp = Tuple[int, int]
+
+
+def _stamp(path: Path) -> Optional[FileStamp]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass
+class EventState:
+    event: EventConfig
+    # Table before each step, the last one is the final table
+    tables: List[Optional[EntryTable]] = field(default_factory=list)
+    # First step to run again, len(steps) when up to date, -1 to read the OE entries again
+    rerun_from: int = -1
+
+
+class PipelineWatcher:
+    """The pipeline state kept between the runs."""
+
+    def __init__(self, config: PipelineConfig):
+        self.config = config
+        self.events = [EventState(event) for event in config.events]
+        self.solv_db = None
+        self.rankings = None
+
+    def paths(self) -> Set[Path]:
+        paths = {
+            input_path(self.config, event, key)
+            for event in self.config.events
+            for key in pipeline.INPUT_KEYS
+        }
+        paths.discard(None)
+        return paths
+
+    def _changed_keys(self, event: EventConfig, changed: Set[Path]) -> Set[str]:
+        return {key for key in pipeline.INPUT_KEYS if input_path(self.config, event, key) in changed}
+
+    def update(self, changed: Optional[Set[Path]] = None, report: Optional[RunReport] = None) -> int:
+        """
+        Run the stages affected by the `changed` files (all of them when
+        None). Returns the number of events run again.
+        """
+        report = report or RunReport("watch")
+        # Marked for all the events first, so that a failing stage does not lose the changes of the others
+        for state in self.events:
+            keys = self._changed_keys(state.event, changed) if changed is not None else {"oe_entries"}
+            if "oe_entries" in keys:
+                state.rerun_from = -1
+            elif keys:
+                steps = pipeline.event_steps(self.config, state.event, self.solv_db, self.rankings)
+                first = min((i for i, step in enumerate(steps) if keys & set(step.inputs)), default=len(steps))
+                state.rerun_from = min(state.rerun_from, first)
+
+        reload_solv_db = self.solv_db is None or bool(changed and self.config.solv_db in changed)
+        reload_rankings = self.rankings is None or bool(changed and {self.config.men_ranking, self.config.women_ranking} & changed)
+        if reload_solv_db and self.solv_db is not None:
+            self.solv_db.close()
+            self.solv_db = None
+        if reload_rankings:
+            self.rankings = None
+        if reload_solv_db or reload_rankings:
+            solv_db, rankings = pipeline.load_shared_inputs(self.config, report, reload_solv_db, reload_rankings)
+            if reload_solv_db:
+                self.solv_db = solv_db
+            if reload_rankings:
+                self.rankings = rankings
+
+        updated = 0
+        for state in self.events:
+            steps = pipeline.event_steps(self.config, state.event, self.solv_db, self.rankings)
+            if state.rerun_from < len(steps):
+                self._run_event(state, steps, report)
+                updated += 1
+
+        if updated:
+            pipeline.finish_pipeline(self.config, [state.tables[-1] for state in self.events], report)
+        return updated
+
+    def _run_event(self, state: EventState, steps: List[EventStep], report: RunReport):
+        event = state.event
+        typer.secho(f"=== {event.name} ===", fg=typer.colors.MAGENTA)
+
+        def _stage(name: str, **kwargs):
+            return report.stage(f"{event.name}/{name}", **kwargs)
+
+        start = state.rerun_from
+        if start < 0:
+            state.tables = [pipeline.read_event(self.config, event, _stage), *([None] * len(steps))]
+            start = 0
+        else:
+            typer.echo(f"Keeping the entries before {steps[start].name}")
+
+        data = state.tables[start].copy()
+        for i in range(start, len(steps)):
+            if i > start:
+                state.tables[i] = data.copy()
+            state.rerun_from = i
+            steps[i].run(data, _stage)
+        state.tables[-1] = data
+        state.rerun_from = len(steps)
+        pipeline.write_event(event, data, _stage)
+
+    def close(self):
+        if self.solv_db is not None:
+            self.solv_db.close()
+
+
+def poll(paths: Set[Path], interval: float = POLL_INTERVAL):
+    """Yield the sets of changed files, once all the changed files are settled."""
+    stamps: Dict[Path, Optional[FileStamp]] = {path: _stamp(path) for path in paths}
+    pending: Set[Path] = set()
+    settled: Set[Path] = set()
+    while True:
+        time.sleep(interval)
+        for path in paths:
+            stamp = _stamp(path)
+            if stamp != stamps[path]:
+                stamps[path] = stamp
+                pending.add(path)
+            elif path in pending:
+                pending.discard(path)
+                if stamp is not None:
+                    settled.add(path)
+        if settled and not pending:
+            yield settled
+            settled = set()
+
+
+def main(
+    config_filename: Path=typer.Argument(..., help="JSON file describing the events and their inputs"),
+    interval: float=typer.Option(POLL_INTERVAL, help="Seconds between two checks of the input files"),
+    report_filename: Optional[Path]=REPORT_OPTION,
+    profile: Optional[str]=PROFILE_OPTION,
+    trace_memory: Optional[str]=TRACE_MEMORY_OPTION,
+    ):
+    config = pipeline.load_config(config_filename)
+    watcher = PipelineWatcher(config)
+
+    with measure_run("watch", report_filename, profile, trace_memory) as report:
+        watcher.update(report=report)
+
+    paths = watcher.paths()
+    typer.secho(f"Watching {len(paths)} input files, Ctrl-C to stop", fg=typer.colors.BLUE)
+    try:
+        for changed in poll(paths, interval):
+            typer.secho(f"Changed: {', '.join(sorted(path.name for path in changed))}", fg=typer.colors.BLUE)
+            start = time.perf_counter()
+            try:
+                with measure_run("watch", report_filename, profile, trace_memory) as report:
+                    updated = watcher.update(changed, report)
+            except Exception as e:
+                typer.secho(f"Failed: {e!r}. Waiting for the next change", fg=typer.colors.RED)
+                continue
+            typer.secho(f"Updated {updated} events in {time.perf_counter() - start:.2f} s", fg=typer.colors.GREEN)
+    except KeyboardInterrupt:
+        typer.echo("Stopped")
+    finally:
+        watcher.close()
+
+
+if __name__ == '__main__':
+    app = typer.Typer(no_args_is_help=True, add_completion=False)
+    app.command()(main)
+    app()
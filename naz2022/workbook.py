@@ -0,0 +1,159 @@
+"""
+Streaming reader and writer of the Excel workbooks.
+
+The sheets were read with pd.read_excel and walked with DataFrame.iterrows(),
+loading every sheet of the workbook in pandas and building a Series per row.
+Here only the requested sheet is parsed, row by row: openpyxl in read-only
+mode for .xlsx, xlrd (sheets loaded on demand) for .xls. Rows are plain
+tuples which can also be indexed by column name.
+
+Cell values follow what pd.read_excel returned, so the scripts behave the
+same: empty cells and the "NA"-like strings are None, integral numbers are
+int, fully empty rows are skipped, missing or repeated column names become
+"Unnamed: <n>" and "<name>.<k>".
+
+`write_sheet` writes rows as they are produced, with openpyxl in write-only
+mode, instead of building a DataFrame for to_excel.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple, Type
+
+
+# Default na_values of pandas.read_csv / read_excel
+NA_VALUES = frozenset((
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+))
+
+
+class SheetRow(tuple):
+    """Row of a sheet, indexed by position or by column name."""
+    __slots__ = ()
+    header: Sequence[str] = ()
+    _pos: Dict[str, int] = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._pos[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default=None):
+        pos = self._pos.get(key)
+        return default if pos is None else tuple.__getitem__(self, pos)
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.header, self))
+
+    def __reduce__(self):
+        # The row types are made per header, rebuilt from it when unpickled (e.g. sent by a worker process)
+        return _sheet_row, (self.header, tuple(self))
+
+
+@lru_cache(maxsize=None)
+def _row_type(header: Tuple[str, ...]) -> Type[SheetRow]:
+    return type("SheetRow", (SheetRow,), {"__slots__": (), "header": header, "_pos": {k: i for i, k in enumerate(header)}})
+
+
+def _sheet_row(header: Tuple[str, ...], values: tuple) -> SheetRow:
+    return _row_type(header)(values)
+
+
+def _header(values: Sequence) -> list:
+    header = []
+    seen: Dict[str, int] = {}
+    for i, value in enumerate(values):
+        name = f"Unnamed: {i}" if value is None or value == "" else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        header.append(name)
+    return header
+
+
+def _value(value):
+    if isinstance(value, str):
+        return None if value in NA_VALUES else value
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def _xlsx_rows(filename: Path, sheet_name: Optional[str]) -> Iterator[tuple]:
+    import openpyxl
+
+    wb = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name is not None else wb.worksheets[0]
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _xls_rows(filename: Path, sheet_name: Optional[str]) -> Iterator[tuple]:
+    import xlrd
+
+    book = xlrd.open_workbook(filename, on_demand=True)
+    try:
+        sheet = book.sheet_by_name(sheet_name) if sheet_name is not None else book.sheet_by_index(0)
+        for r in range(sheet.nrows):
+            values = []
+            for cell in sheet.row(r):
+                if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+                    values.append(None)
+                elif cell.ctype == xlrd.XL_CELL_DATE:
+                    values.append(xlrd.xldate_as_datetime(cell.value, book.datemode))
+                elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                    values.append(bool(cell.value))
+                else:
+                    values.append(cell.value)
+            yield tuple(values)
+    finally:
+        book.release_resources()
+
+
+def iter_sheet(filename: Path, sheet_name: Optional[str] = None, skiprows: int = 0) -> Iterator[SheetRow]:
+    """
+    Rows of a sheet (the first one by default), the header being the first
+    row after `skiprows`. Values are normalized as described above.
+    """
+    rows = _xls_rows(filename, sheet_name) if Path(filename).suffix.lower() == ".xls" else _xlsx_rows(filename, sheet_name)
+    row_type = None
+    width = 0
+    for n, values in enumerate(rows):
+        if n < skiprows:
+            continue
+        if row_type is None:
+            header = _header(values)
+            # Trailing empty header cells of read-only sheets
+            while header and header[-1].startswith("Unnamed: ") and values[len(header) - 1] is None:
+                header.pop()
+            row_type, width = _row_type(tuple(header)), len(header)
+            continue
+        values = [_value(v) for v in values[:width]]
+        if all(v is None for v in values):
+            continue
+        values.extend([None] * (width - len(values)))
+        yield row_type(values)
+
+
+def write_sheet(filename: Path, header: Sequence[str], rows: Iterable[Sequence], sheet_name: str = "Sheet1") -> int:
+    """Write a single sheet .xlsx file. Returns the number of rows written."""
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.append(list(header))
+
+    count = 0
+    for row in rows:
+        ws.append(row)
+        count += 1
+    wb.save(filename)
+    return count